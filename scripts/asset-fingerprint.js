@@ -0,0 +1,100 @@
+"use strict";
+
+// Content-hashed asset names, so a deploy never serves new pages with stale subresources. On
+// GitHub Pages every response carries max-age=600, hashed or not; long-lived caching needs a CDN
+// in front that marks the hashed names immutable.
+
+const crypto = require("crypto");
+const path = require("path");
+
+const ASSET_MANIFEST = "asset-manifest.json";
+const HASH_LENGTH = 8;
+// Subresources only. Pages, the web app manifest, robots/sitemap and the CV PDF keep their
+// public URLs; fingerprinted copies sit next to the originals, so old links keep working. JSON
+// data is looked up by scripts at runtime through asset-manifest.json.
+const FINGERPRINTED = /\.(?:css|js|json|svg|png|jpe?g|webp|avif|gif|ico|woff2?)$/i;
+const HTML_URL_ATTRIBUTE = /(\s(?:href|src|srcset|poster)\s*=\s*)(["'])([^"']*)\2/gi;
+const STYLE_BLOCK = /(<style\b[^>]*>)([\s\S]*?)(<\/style\s*>)/gi;
+const CSS_URL = /url\(\s*(["']?)([^"')]+)\1\s*\)/g;
+
+function fingerprintName(file, contents) {
+  const hash = crypto.createHash("sha256").update(contents).digest("hex").slice(0, HASH_LENGTH);
+  const extension = path.posix.extname(file);
+  return file.slice(0, file.length - extension.length) + "." + hash + extension;
+}
+
+function createUrlRewriter(manifest) {
+  return (fromFile, url) => {
+    if (/^(?:[a-z][\w+.-]*:|\/\/|#)/i.test(url)) {
+      return url;
+    }
+    const [, target, suffix] = /^([^?#]*)(.*)$/.exec(url);
+    const rootRelative = target.startsWith("/");
+    const file = path.posix.normalize(rootRelative ? target.slice(1) : path.posix.join(path.posix.dirname(fromFile), target));
+    if (!manifest[file]) {
+      return url;
+    }
+    return (rootRelative ? "/" + manifest[file] : path.posix.relative(path.posix.dirname(fromFile), manifest[file])) + suffix;
+  };
+}
+
+function rewriteCss(css, fromFile, rewriteUrl) {
+  return css.replace(CSS_URL, (match, quote, url) => "url(" + quote + rewriteUrl(fromFile, url) + quote + ")");
+}
+
+function rewriteHtml(html, fromFile, rewriteUrl) {
+  return html
+    .replace(HTML_URL_ATTRIBUTE, (match, prefix, quote, value) => {
+      const rewritten = /srcset\s*=\s*$/i.test(prefix)
+        ? value.split(",").map((candidate) => candidate.replace(/^(\s*)(\S+)/, (all, space, url) => space + rewriteUrl(fromFile, url))).join(",")
+        : rewriteUrl(fromFile, value);
+      return prefix + quote + rewritten + quote;
+    })
+    .replace(STYLE_BLOCK, (match, open, css, close) => open + rewriteCss(css, fromFile, rewriteUrl) + close);
+}
+
+function fingerprintStage() {
+  return {
+    name: "fingerprint",
+    run(site) {
+      const manifest = {};
+      const rewriteUrl = createUrlRewriter(manifest);
+      const assets = [...site.files.keys()].filter((file) => FINGERPRINTED.test(file)).sort();
+
+      // Stylesheets can point at fonts and images, so they are hashed after those references are
+      // rewritten: a changed font or icon also gives every stylesheet using it a new name.
+      const stylesheets = assets.filter((file) => file.endsWith(".css"));
+      for (const file of assets.filter((asset) => !asset.endsWith(".css"))) {
+        manifest[file] = fingerprintName(file, site.readBuffer(file));
+      }
+      for (const file of stylesheets) {
+        const css = rewriteCss(site.read(file), file, rewriteUrl);
+        site.write(file, css);
+        manifest[file] = fingerprintName(file, css);
+      }
+      for (const [file, hashed] of Object.entries(manifest)) {
+        site.write(hashed, site.readBuffer(file));
+      }
+
+      for (const file of site.htmlFiles()) {
+        site.write(file, rewriteHtml(site.read(file), file, rewriteUrl));
+      }
+      for (const file of [...site.files.keys()].filter((name) => name.endsWith(".webmanifest"))) {
+        const webManifest = JSON.parse(site.read(file));
+        for (const icon of webManifest.icons || []) {
+          icon.src = rewriteUrl(file, icon.src);
+        }
+        site.write(file, JSON.stringify(webManifest, null, 2) + "\n");
+      }
+
+      site.write(ASSET_MANIFEST, JSON.stringify(manifest, null, 2) + "\n");
+      console.log("Fingerprinted " + assets.length + " assets; wrote " + ASSET_MANIFEST + ".");
+    },
+  };
+}
+
+module.exports = {
+  ASSET_MANIFEST,
+  fingerprintName,
+  fingerprintStage,
+};
@@ -1,180 +1,840 @@
 #!/usr/bin/env node
 
+const crypto = require("crypto");
 const fs = require("fs");
 const path = require("path");
+const { once } = require("events");
+const { requireSlots, renderTemplate, loadTemplate, isTemplateCurrent, rememberTemplate } = require("./page-template");
+const {
+  DEFAULT_PAGE_SIZE,
+  DEFAULT_FIRST_PAGE_BYTES,
+  planPublicationShards,
+  removeStaleShards,
+  syncSitemap,
+} = require("./publication-shards");
+const { buildDist } = require("./site-dist");
+const { minifyStage } = require("./html-minify");
+const { criticalCssStage } = require("./critical-css");
+const { responsiveImagesStage } = require("./responsive-images");
+const { fingerprintStage } = require("./asset-fingerprint");
+const { DEFAULT_MAX_BYTES: DEFAULT_INLINE_SVG_BYTES, inlineSvgStage } = require("./inline-svg");
+const { joinCitations } = require("./citation-match");
+const { historySeries, readHistory } = require("./citation-history");
+const {
+  escapeHtml,
+  requireArray,
+  renderSkill,
+  renderProject,
+  renderNewsItem,
+  renderPublication,
+  renderCitations,
+} = require("./entry-renderers");
 
 const ROOT = path.resolve(__dirname, "..");
 const INDEX_PATH = path.join(ROOT, "index.html");
 const PUBS_PATH = path.join(ROOT, "publications", "index.html");
 const CV_PATH = path.join(ROOT, "cv", "index.html");
+// Lists the publication shard pages while --paginate builds them.
+const SITEMAP_PATH = path.join(ROOT, "sitemap.xml");
 const SITE_DATA_PATH = path.join(ROOT, "content", "site.json");
 const CITATIONS_PATH = path.join(ROOT, "content", "citations.json");
+const CITATION_HISTORY_PATH = path.join(ROOT, "content", "citations-history.ndjson");
+// Content files loadSite() reads; watch mode rebuilds when any of them changes.
+const DATA_PATHS = [SITE_DATA_PATH, CITATIONS_PATH, CITATION_HISTORY_PATH];
+const CACHE_DIR = path.join(ROOT, ".cache", "build-site");
+const FRAGMENT_CACHE_PATH = path.join(CACHE_DIR, "fragments.json");
+const MANIFEST_PATH = path.join(CACHE_DIR, "manifest.json");
+const DIST_DIR = path.join(ROOT, "_site");
+const WATCH_DEBOUNCE_MS = 15;
+const STREAM_CHUNK_CHARS = 64 * 1024;
+// Bump whenever the markup produced by a render* function changes, so cached fragments are discarded.
+const RENDERER_VERSION = 3;
 
 function readJson(filePath) {
   return JSON.parse(fs.readFileSync(filePath, "utf8"));
 }
 
-function escapeHtml(value) {
-  return String(value)
-    .replaceAll("&", "&amp;")
-    .replaceAll("<", "&lt;")
-    .replaceAll(">", "&gt;")
-    .replaceAll('"', "&quot;")
-    .replaceAll("'", "&#39;");
+function readCitationData() {
+  return {
+    citations: fs.existsSync(CITATIONS_PATH) ? readJson(CITATIONS_PATH) : null,
+    history: readHistory(CITATION_HISTORY_PATH),
+  };
 }
 
-function requireArray(value, field) {
-  if (!Array.isArray(value) || value.length === 0) {
-    throw new Error(field + " must be a non-empty array.");
+function siteFromContent(content, { citations, history }) {
+  // Per-article counts written by update-scholar-citations.js are joined onto the publications
+  // here, so they take part in section hashing and fragment caching like any other field.
+  const site = { ...content };
+  if (citations && Array.isArray(citations.articles) && Array.isArray(site.publications)) {
+    // Matched publications are new objects; they also carry the provider named in citations.json.
+    const { publications } = joinCitations(site.publications, citations.articles);
+    site.publications = publications.map((publication, index) =>
+      (publication === site.publications[index] || !citations.articlesSource ? publication : { ...publication, citationSource: citations.articlesSource }));
   }
-  return value;
+  if (citations && "totalCitations" in citations) {
+    // One entry, so the metric goes through the same block, cache and hashing paths as lists.
+    // Without a profile total (a fresh clone before the first Scholar refresh, or only DOI-provider
+    // article counts) there is no entry and the optional CITATIONS block renders empty.
+    const { articles, ...summary } = citations;
+    site.citations = [{ ...summary, history: historySeries(history) }];
+  }
+  return site;
 }
 
-function replaceGeneratedBlock(html, name, renderedContent) {
-  const start = "<!-- CONTENT:" + name + ":START -->";
-  const end = "<!-- CONTENT:" + name + ":END -->";
-  const startIndex = html.indexOf(start);
-  const endIndex = html.indexOf(end);
-  if (startIndex === -1 || endIndex === -1 || endIndex <= startIndex) {
-    throw new Error("Missing or invalid " + name + " content markers in index.html.");
-  }
-  const contentStart = startIndex + start.length;
-  return html.slice(0, contentStart) + "\n" + renderedContent + "\n        " + html.slice(endIndex);
-}
-
-/* ---------- SKILLS (dense label + items) ---------- */
-function renderSkills(skills) {
-  return requireArray(skills, "skills")
-    .map((skill) => {
-      requireArray(skill.items, "skills." + skill.title + ".items");
-      return [
-        '        <div class="skill">',
-        '          <span class="skill-label">' + escapeHtml(skill.title) + "</span>",
-        '          <span class="skill-items">' + skill.items.map(escapeHtml).join(" · ") + "</span>",
-        "        </div>",
-      ].join("\n");
-    })
-    .join("\n");
-}
-
-/* ---------- PROJECTS (title + tag + link + desc) ---------- */
-function renderProjects(projects) {
-  return requireArray(projects, "projects")
-    .map((p) => {
-      const tag = p.tag ? ' <span class="tag">' + escapeHtml(p.tag) + "</span>" : "";
-      const link = p.url
-        ? '<a class="work-link" href="' + escapeHtml(p.url) + '" target="_blank" rel="noopener noreferrer">' +
-          escapeHtml(p.url.replace(/^https?:\/\/(www\.)?/, "").replace(/\/$/, "")) + "</a>"
-        : "";
-      return [
-        '        <article class="work-item">',
-        '          <div class="work-head">',
-        '            <span class="work-title">' + escapeHtml(p.title) + tag + "</span>",
-        "            " + link,
-        "          </div>",
-        '          <p class="work-desc">' + escapeHtml(p.description) + "</p>",
-        "        </article>",
-      ].join("\n");
-    })
-    .join("\n");
-}
-
-/* ---------- NEWS (date + text, optional link) ---------- */
-function renderNews(news) {
-  return requireArray(news, "news")
-    .map((n) => {
-      const text = escapeHtml(n.text);
-      const body = n.href
-        ? '<a class="ext" href="' + escapeHtml(n.href) + '" target="_blank" rel="noopener noreferrer">' + text + "</a>"
-        : text;
-      return [
-        '        <div class="news-item">',
-        '          <span class="news-date">' + escapeHtml(n.date) + "</span>",
-        '          <span class="news-text">' + body + "</span>",
-        "        </div>",
-      ].join("\n");
-    })
-    .join("\n");
-}
-
-/* ---------- PUBLICATIONS (dense typographic) ---------- */
-function renderPublications(publications) {
-  return requireArray(publications, "publications")
-    .map((pub) => {
-      const year = Number(pub.year);
-      if (!Number.isInteger(year) || year < 1900 || year > 2100) {
-        throw new Error('Invalid publication year for "' + pub.title + '".');
-      }
-      const venue = escapeHtml(pub.venuePrefix || "") +
-        "<b>" + escapeHtml(pub.venue) + "</b>" + escapeHtml(pub.details || ".");
-      return [
-        '      <article class="pub">',
-        '        <div class="pub-head">',
-        '          <a class="pub-title ext" href="' + escapeHtml(pub.url) +
-          '" target="_blank" rel="noopener noreferrer">' + escapeHtml(pub.title) + "</a>",
-        '          <span class="pub-year">' + year + "</span>",
-        "        </div>",
-        '        <div class="pub-authors">' + escapeHtml(pub.authors) + "</div>",
-        '        <div class="pub-venue">' + venue + "</div>",
-        "      </article>",
-      ].join("\n");
-    })
-    .join("\n");
-}
-
-function formatDate(dateString) {
-  const date = new Date(dateString + "T00:00:00Z");
-  if (Number.isNaN(date.getTime())) {
-    throw new Error("citations.updatedAt must use YYYY-MM-DD format.");
-  }
-  return new Intl.DateTimeFormat("en-GB", { day: "numeric", month: "short", year: "numeric", timeZone: "UTC" }).format(date);
-}
-
-/* ---------- CITATIONS (compact metric) ---------- */
-function renderCitations(citations) {
-  const total = Number(citations.totalCitations);
-  if (!Number.isInteger(total) || total < 0) {
-    throw new Error("citations.totalCitations must be a non-negative integer.");
-  }
-  const updated = formatDate(citations.updatedAt);
-  const formattedTotal = total.toLocaleString("en-GB");
-  return [
-    '        <a class="metric" href="' + escapeHtml(citations.profileUrl) + '"',
-    '           target="_blank" rel="noopener noreferrer"',
-    '           aria-label="' + formattedTotal + " total Google Scholar citations, updated " + updated + '">',
-    "          <b>" + formattedTotal + "</b> citations · Google Scholar<br>updated " + updated,
-    "        </a>",
-  ].join("\n");
-}
-
-function writeIfChanged(filePath, label, transform) {
-  const previous = fs.readFileSync(filePath, "utf8").replaceAll("\r\n", "\n");
-  let html = transform(previous);
-  if (!html.endsWith("\n")) html += "\n";
-  if (html !== previous) {
-    fs.writeFileSync(filePath, html, "utf8");
-    console.log("Updated " + label + " from content data.");
+function loadSite() {
+  return siteFromContent(readJson(SITE_DATA_PATH), readCitationData());
+}
+
+function blockEntries(site, block) {
+  return block.optional && site[block.section] === undefined ? [] : requireArray(site[block.section], block.section);
+}
+
+// Optional post-processing for the deploy tree written by --dist, in the order the stages run.
+const DIST_STAGES = [
+  { flag: "--inline-svg", create: (args) => inlineSvgStage({ maxBytes: integerOption(args, "--inline-svg-bytes", DEFAULT_INLINE_SVG_BYTES) }) },
+  { flag: "--responsive-images", create: () => responsiveImagesStage({ cacheDir: path.join(CACHE_DIR, "images") }) },
+  { flag: "--critical-css", create: criticalCssStage },
+  { flag: "--fingerprint", create: fingerprintStage },
+  { flag: "--minify", create: minifyStage },
+];
+
+// Dependency graph: each generated page depends on its own template file and on the
+// content sections rendered into its CONTENT blocks. A page is rebuilt only when one of them changed.
+const PAGES = [
+  {
+    label: "index.html",
+    path: INDEX_PATH,
+    blocks: [
+      { name: "PROJECTS", section: "projects", render: renderProjects, renderEntry: renderProject },
+      { name: "NEWS", section: "news", render: renderNews, renderEntry: renderNewsItem },
+    ],
+  },
+  {
+    label: "publications/index.html",
+    path: PUBS_PATH,
+    blocks: [
+      { name: "CITATIONS", section: "citations", optional: true, render: renderCitationsBlock, renderEntry: renderCitations },
+      { name: "PUBLICATIONS", section: "publications", render: renderPublications, renderEntry: renderPublication },
+    ],
+  },
+  {
+    label: "cv/index.html",
+    path: CV_PATH,
+    blocks: [{ name: "SKILLS", section: "skills", render: renderSkills, renderEntry: renderSkill }],
+  },
+];
+
+/* ---------- FRAGMENT CACHE (one rendered fragment per entry) ---------- */
+function fragmentKey(section, entry) {
+  return crypto.createHash("sha256")
+    .update(RENDERER_VERSION + "\0" + section + "\0" + JSON.stringify(entry))
+    .digest("hex");
+}
+
+function loadFragmentCache(filePath) {
+  let stored = {};
+  try {
+    stored = readJson(filePath).sections || {};
+  } catch (_) {
+    // A missing or unreadable cache only means every entry is rendered again.
+  }
+  return { filePath, stored, used: {}, hits: 0, misses: 0 };
+}
+
+function renderCached(cache, section, entry, renderEntry) {
+  const key = fragmentKey(section, entry);
+  const used = cache.used[section] || (cache.used[section] = {});
+  const stored = cache.stored[section] || {};
+  let html = Object.hasOwn(used, key) ? used[key] : stored[key];
+  if (html === undefined) {
+    html = renderEntry(entry);
+    cache.misses += 1;
   } else {
-    console.log(label + " is already in sync.");
+    cache.hits += 1;
   }
+  used[key] = html;
+  return html;
 }
 
-function main() {
-  const site = readJson(SITE_DATA_PATH);
+function advanceFragmentCache(cache) {
+  // Long-running builds carry this run's fragments forward as the stored set for the next run.
+  cache.stored = { ...cache.stored, ...cache.used };
+  cache.used = {};
+  cache.hits = 0;
+  cache.misses = 0;
+}
 
-  writeIfChanged(INDEX_PATH, "index.html", (html) => {
-    html = replaceGeneratedBlock(html, "PROJECTS", renderProjects(site.projects));
-    html = replaceGeneratedBlock(html, "NEWS", renderNews(site.news));
-    return html;
-  });
+function saveFragmentCache(cache) {
+  if (cache.misses === 0 && Object.keys(cache.used).every((section) =>
+    Object.keys(cache.used[section]).length === Object.keys(cache.stored[section] || {}).length)) {
+    return;
+  }
+  // Rendered sections keep only the fragments this build used, so deleted or edited entries
+  // do not accumulate; sections that were not rendered keep their stored fragments.
+  const sections = { ...cache.stored, ...cache.used };
+  fs.mkdirSync(path.dirname(cache.filePath), { recursive: true });
+  fs.writeFileSync(cache.filePath, JSON.stringify({ sections }) + "\n", "utf8");
+}
+
+function renderFragments(entries, section, renderEntry, cache) {
+  return requireArray(entries, section)
+    .map((entry) => (cache ? renderCached(cache, section, entry, renderEntry) : renderEntry(entry)));
+}
+
+function renderEntries(entries, section, renderEntry, cache) {
+  return renderFragments(entries, section, renderEntry, cache).join("\n");
+}
+
+/* ---------- BUILD MANIFEST (section hashes + template stats) ---------- */
+function hashSection(value) {
+  return crypto.createHash("sha256").update(JSON.stringify(value === undefined ? null : value)).digest("hex");
+}
+
+function templateStamp(filePath) {
+  const stat = fs.statSync(filePath);
+  return { size: stat.size, mtimeMs: stat.mtimeMs };
+}
+
+function emptyManifest() {
+  return { rendererVersion: RENDERER_VERSION, options: null, sections: {}, templates: {} };
+}
+
+function loadManifest(filePath) {
+  try {
+    const manifest = readJson(filePath);
+    if (manifest.rendererVersion === RENDERER_VERSION) {
+      return manifest;
+    }
+  } catch (_) {
+    // Without a manifest every page counts as changed.
+  }
+  return emptyManifest();
+}
+
+function saveManifest(filePath, manifest) {
+  fs.mkdirSync(path.dirname(filePath), { recursive: true });
+  fs.writeFileSync(filePath, JSON.stringify(manifest, null, 2) + "\n", "utf8");
+}
+
+function pageIsStale(page, manifest, sectionHashes) {
+  if (page.blocks.some((block) => manifest.sections[block.section] !== sectionHashes[block.section])) {
+    return true;
+  }
+  const stamp = manifest.templates[page.label];
+  if (!stamp || !fs.existsSync(page.path)) {
+    return true;
+  }
+  const current = templateStamp(page.path);
+  return current.size !== stamp.size || current.mtimeMs !== stamp.mtimeMs;
+}
+
+/* ---------- CONTENT BLOCKS (entries from entry-renderers.js, joined in order) ---------- */
+function renderSkills(skills, cache) {
+  return renderEntries(skills, "skills", renderSkill, cache);
+}
+
+function renderProjects(projects, cache) {
+  return renderEntries(projects, "projects", renderProject, cache);
+}
+
+function renderNews(news, cache) {
+  return renderEntries(news, "news", renderNewsItem, cache);
+}
+
+function renderPublications(publications, cache) {
+  return renderEntries(publications, "publications", renderPublication, cache);
+}
+
+function renderCitationsBlock(citations, cache) {
+  return renderEntries(citations, "citations", renderCitations, cache);
+}
+
+function renderPage(compiled, page, renderedBlocks) {
+  requireSlots(compiled, page.blocks.map((block) => block.name));
+  const values = {};
+  for (const block of page.blocks) {
+    values[block.name] = renderedBlocks[block.name];
+  }
+  return renderTemplate(compiled, values);
+}
+
+function writePage(page, renderedBlocks) {
+  const template = loadTemplate(page.path, page.label);
+  return savePage(page, template, renderPage(template.compiled, page, renderedBlocks));
+}
+
+function savePage(page, template, html) {
+  if (html === template.html) {
+    return false;
+  }
+  fs.writeFileSync(page.path, html, "utf8");
+  rememberTemplate(page.path, template.compiled, html);
+  return true;
+}
+
+function sectionHashesFor(site) {
+  const hashes = {};
+  for (const page of PAGES) {
+    for (const block of page.blocks) {
+      hashes[block.section] = hashSection(site[block.section]);
+    }
+  }
+  return hashes;
+}
+
+function renderBlocks(page, site, cache) {
+  const rendered = {};
+  for (const block of page.blocks) {
+    const entries = blockEntries(site, block);
+    rendered[block.name] = entries.length === 0 ? "" : block.render(entries, cache);
+  }
+  return rendered;
+}
+
+/* ---------- IN-PROCESS BUILD (content editor publishing) ---------- */
+let buildCache = null;
+
+function build(content, options = {}) {
+  // Renders every generated page from a content object without writing anything, returning
+  // { "index.html": html, ... }. Compiled templates and rendered fragments stay in memory between
+  // calls, so a later build in the same process only renders the entries that changed.
+  const site = siteFromContent(content, options.data || readCitationData());
+  const cache = options.cache || (buildCache ||= loadFragmentCache(FRAGMENT_CACHE_PATH));
+  const outputs = {};
+  for (const page of PAGES) {
+    const template = loadTemplate(page.path, page.label);
+    outputs[page.label] = renderPage(template.compiled, page, renderBlocks(page, site, cache));
+  }
+  advanceFragmentCache(cache);
+  return outputs;
+}
+
+function writeBuild(outputs) {
+  // Writes the pages returned by build() that differ from disk and returns their labels.
+  return PAGES
+    .filter((page) => Object.hasOwn(outputs, page.label) && savePage(page, loadTemplate(page.path, page.label), outputs[page.label]))
+    .map((page) => page.label);
+}
+
+/* ---------- STREAMING (bounded-memory page output) ---------- */
+function* renderEntryStream(entries, renderEntry) {
+  for (let index = 0; index < entries.length; index += 1) {
+    yield (index === 0 ? "" : "\n") + renderEntry(entries[index]);
+  }
+}
+
+function createStreamWriter(filePath) {
+  // Small writes are batched, the hash covers exactly the bytes written, and backpressure is honoured.
+  const output = fs.createWriteStream(filePath, { encoding: "utf8" });
+  const hash = crypto.createHash("sha256");
+  let pending = "";
+  let lastChar = "";
+
+  async function flush() {
+    if (!pending) {
+      return;
+    }
+    const chunk = pending;
+    pending = "";
+    hash.update(chunk);
+    if (!output.write(chunk)) {
+      await once(output, "drain");
+    }
+  }
+
+  return {
+    async write(text) {
+      if (!text) {
+        return;
+      }
+      pending += text;
+      lastChar = text[text.length - 1];
+      if (pending.length >= STREAM_CHUNK_CHARS) {
+        await flush();
+      }
+    },
+    async close() {
+      if (lastChar !== "\n") {
+        pending += "\n";
+      }
+      await flush();
+      output.end();
+      await once(output, "close");
+      return hash.digest("hex");
+    },
+    destroy() {
+      output.destroy();
+    },
+  };
+}
+
+async function hashFile(filePath) {
+  const hash = crypto.createHash("sha256");
+  for await (const chunk of fs.createReadStream(filePath)) {
+    hash.update(chunk);
+  }
+  return hash.digest("hex");
+}
+
+async function spliceTemplateStream(sourcePath, blocks, writer) {
+  // Copies the template to `writer` chunk by chunk, replacing the body of each CONTENT block
+  // with its fragment stream. The unprocessed tail is held back so markers split across read
+  // chunks are still found.
+  const markers = blocks.map((block) => ({
+    block,
+    start: "<!-- CONTENT:" + block.name + ":START -->",
+    end: "<!-- CONTENT:" + block.name + ":END -->",
+  }));
+  const holdBack = Math.max(...markers.map((marker) => Math.max(marker.start.length, marker.end.length)));
+  const remaining = new Set(markers);
+  let inside = null;
+  let carry = "";
+
+  async function consume(final) {
+    for (;;) {
+      if (inside) {
+        const endIndex = carry.indexOf(inside.end);
+        if (endIndex === -1) {
+          carry = final ? carry : carry.slice(Math.max(0, carry.length - holdBack));
+          return;
+        }
+        await writer.write("\n");
+        for (const fragment of inside.block.fragments()) {
+          await writer.write(fragment);
+        }
+        await writer.write("\n        ");
+        carry = carry.slice(endIndex);
+        inside = null;
+        continue;
+      }
+      let next = null;
+      let nextIndex = -1;
+      for (const marker of remaining) {
+        const index = carry.indexOf(marker.start);
+        if (index !== -1 && (nextIndex === -1 || index < nextIndex)) {
+          next = marker;
+          nextIndex = index;
+        }
+      }
+      if (!next) {
+        const keep = final ? 0 : Math.min(carry.length, holdBack);
+        await writer.write(carry.slice(0, carry.length - keep));
+        carry = carry.slice(carry.length - keep);
+        return;
+      }
+      const contentStart = nextIndex + next.start.length;
+      await writer.write(carry.slice(0, contentStart));
+      carry = carry.slice(contentStart);
+      remaining.delete(next);
+      inside = next;
+    }
+  }
+
+  for await (const chunk of fs.createReadStream(sourcePath, { encoding: "utf8" })) {
+    carry = (carry + chunk).replaceAll("\r\n", "\n");
+    await consume(false);
+  }
+  await consume(true);
+
+  if (inside || remaining.size > 0) {
+    const missing = inside ? inside.block.name : [...remaining][0].block.name;
+    throw new Error("Missing or invalid " + missing + " content markers in " + path.basename(sourcePath) + ".");
+  }
+}
+
+async function streamPage(page, site) {
+  // Entries are rendered one at a time into a temp file next to the page, which then replaces
+  // the page atomically, so neither the full block nor the full page is ever held in memory.
+  const tempPath = path.join(path.dirname(page.path), "." + path.basename(page.path) + "." + process.pid + ".tmp");
+  const writer = createStreamWriter(tempPath);
+  const blocks = page.blocks.map((block) => ({
+    name: block.name,
+    fragments: () => renderEntryStream(blockEntries(site, block), block.renderEntry),
+  }));
+  try {
+    await spliceTemplateStream(page.path, blocks, writer);
+    const nextHash = await writer.close();
+    if (nextHash === await hashFile(page.path)) {
+      fs.unlinkSync(tempPath);
+      console.log(page.label + " is already in sync.");
+      return false;
+    }
+    fs.renameSync(tempPath, page.path);
+    console.log("Updated " + page.label + " from content data (streamed).");
+    return true;
+  } catch (error) {
+    writer.destroy();
+    fs.rmSync(tempPath, { force: true });
+    throw error;
+  }
+}
+
+/* ---------- PUBLICATION SHARDS (year pages + numbered pages) ---------- */
+function integerOption(args, name, fallback) {
+  const arg = args.find((candidate) => candidate.startsWith(name + "="));
+  if (!arg) {
+    return fallback;
+  }
+  const value = Number(arg.slice(name.length + 1));
+  if (!Number.isInteger(value) || value < 1) {
+    throw new Error(name + " must be a positive integer.");
+  }
+  return value;
+}
+
+function shardOptions(args) {
+  return {
+    paginate: args.includes("--paginate"),
+    pageSize: integerOption(args, "--page-size", DEFAULT_PAGE_SIZE),
+    firstPageBytes: integerOption(args, "--first-page-bytes", DEFAULT_FIRST_PAGE_BYTES),
+  };
+}
+
+function writePublicationShards(page, publications, fragments, options, blocks) {
+  // `blocks` holds the page's other rendered CONTENT blocks, repeated on every shard.
+  const template = loadTemplate(page.path, page.label);
+  requireSlots(template.compiled, page.blocks.map((block) => block.name));
+  const shards = planPublicationShards(template.compiled, publications, fragments, options, blocks);
+  const written = new Set();
+  let updated = 0;
+  for (const shard of shards) {
+    const filePath = path.join(path.dirname(page.path), shard.dir, "index.html");
+    written.add(filePath);
+    const previous = shard.dir ? (fs.existsSync(filePath) ? fs.readFileSync(filePath, "utf8") : null) : template.html;
+    if (shard.html === previous) {
+      continue;
+    }
+    fs.mkdirSync(path.dirname(filePath), { recursive: true });
+    fs.writeFileSync(filePath, shard.html, "utf8");
+    if (!shard.dir) {
+      rememberTemplate(filePath, template.compiled, shard.html);
+    }
+    updated += 1;
+  }
+  const removed = removeStaleShards(path.dirname(page.path), written);
+  syncSitemap(SITEMAP_PATH, shards.filter((shard) => shard.dir).map((shard) => shard.dir));
+  return { shards: shards.length, updated, removed: removed.length, firstPageBytes: Buffer.byteLength(shards[0].html) };
+}
 
-  writeIfChanged(PUBS_PATH, "publications/index.html", (html) =>
-    replaceGeneratedBlock(html, "PUBLICATIONS", renderPublications(site.publications))
+function reportShards(label, result, options) {
+  console.log(
+    label + ": " + result.shards + " publication pages (" + result.updated + " updated, " + result.removed +
+    " removed); first page " + result.firstPageBytes + " bytes" +
+    (result.firstPageBytes > options.firstPageBytes ? ", over the " + options.firstPageBytes + "-byte cap even with one entry." : ".")
   );
+}
+
+/* ---------- DEPLOY TREE (--dist) ---------- */
+function distOptions(args) {
+  const stages = DIST_STAGES.filter((stage) => args.includes(stage.flag));
+  const distArg = args.find((arg) => arg === "--dist" || arg.startsWith("--dist="));
+  if (!distArg && stages.length === 0) {
+    return null;
+  }
+  const outDir = distArg && distArg.includes("=") ? path.resolve(ROOT, distArg.slice("--dist=".length)) : DIST_DIR;
+  if (outDir === ROOT || !outDir.startsWith(ROOT + path.sep)) {
+    throw new Error("--dist must name a directory inside the repository, such as _site.");
+  }
+  return { root: ROOT, outDir, stages: stages.map((stage) => stage.create(args)) };
+}
 
-  writeIfChanged(CV_PATH, "cv/index.html", (html) =>
-    replaceGeneratedBlock(html, "SKILLS", renderSkills(site.skills))
+/* ---------- PARALLEL RENDERING (worker_threads) ---------- */
+async function renderPagesInParallel(pages, site) {
+  // Returns null when the pool would cost more than it saves; the caller then renders serially.
+  const { PARALLEL_MIN_ENTRIES, poolPaysOff, renderSectionsInParallel } = require("./render-pool");
+  const blocks = pages.flatMap((page) => page.blocks.map((block) => ({ page, block })));
+  const sections = blocks.map(({ block }) => ({
+    section: block.section,
+    entries: blockEntries(site, block),
+  }));
+  if (!poolPaysOff(sections)) {
+    console.log(
+      "Parallel render skipped: fewer than " + PARALLEL_MIN_ENTRIES + " stale entries or a single core, " +
+      "so starting workers would cost more than it saves."
+    );
+    return null;
+  }
+  const { html, stats } = await renderSectionsInParallel(sections);
+
+  // The same sections rendered on the main thread, so the log reports a real speedup.
+  const serialStarted = process.hrtime.bigint();
+  blocks.forEach(({ block }, index) => {
+    if (sections[index].entries.length > 0) {
+      block.render(sections[index].entries, null);
+    }
+  });
+  const serialMs = Number(process.hrtime.bigint() - serialStarted) / 1e6;
+
+  const rendered = new Map(pages.map((page) => [page.label, {}]));
+  blocks.forEach(({ page, block }, index) => {
+    rendered.get(page.label)[block.name] = html[index];
+  });
+  console.log(
+    "Parallel render: " + stats.workers + " workers, " + stats.tasks + " tasks, " +
+    stats.wallMs.toFixed(1) + " ms wall against " + serialMs.toFixed(1) + " ms serial (" +
+    (serialMs / stats.wallMs).toFixed(2) + "x speedup)."
   );
+  return rendered;
+}
+
+async function main(args) {
+  const dist = distOptions(args);
+  if (args.includes("--no-render")) {
+    // Packages the committed pages as they are. The deploy does this, so a citations-only commit
+    // changes content/citations.json on the live site and leaves the pre-rendered count to lag.
+    if (!dist) {
+      throw new Error("--no-render only applies with --dist or a deploy-tree stage.");
+    }
+    await buildDist(dist);
+    return;
+  }
+  const site = loadSite();
+  const streaming = args.includes("--stream");
+  const parallel = args.includes("--parallel") && !streaming;
+  const options = shardOptions(args);
+  let manifest = args.includes("--force") ? emptyManifest() : loadManifest(MANIFEST_PATH);
+  if (JSON.stringify(manifest.options) !== JSON.stringify(options)) {
+    manifest = emptyManifest();
+  }
+  const sectionHashes = sectionHashesFor(site);
+
+  const templates = {};
+  const stalePages = [];
+  for (const page of PAGES) {
+    if (pageIsStale(page, manifest, sectionHashes)) {
+      stalePages.push(page);
+    } else {
+      templates[page.label] = manifest.templates[page.label];
+      console.log(page.label + " skipped; its content sections and template are unchanged.");
+    }
+  }
+
+  // Paginated publications are small pages built from per-entry fragments, never streamed or pooled.
+  const shardedPage = options.paginate ? stalePages.find((page) => page.path === PUBS_PATH) : null;
+  const pooledPages = stalePages.filter((page) => page !== shardedPage);
+  const rendered = parallel && pooledPages.length > 0 ? await renderPagesInParallel(pooledPages, site) : null;
+  // Streaming and pooled builds render every entry of a stale page; the fragment cache would
+  // hold every fragment in memory and hash every entry on the main thread.
+  const cache = args.includes("--no-cache") || streaming || rendered ? null : loadFragmentCache(FRAGMENT_CACHE_PATH);
+  for (const page of stalePages) {
+    if (page === shardedPage) {
+      const fragments = renderFragments(site.publications, "publications", renderPublication, cache);
+      const others = renderBlocks({ blocks: page.blocks.filter((block) => block.section !== "publications") }, site, cache);
+      reportShards(page.label, writePublicationShards(page, site.publications, fragments, options, others), options);
+    } else if (streaming) {
+      await streamPage(page, site);
+    } else {
+      const updated = writePage(page, rendered ? rendered.get(page.label) : renderBlocks(page, site, cache));
+      console.log(updated ? "Updated " + page.label + " from content data." : page.label + " is already in sync.");
+    }
+    if (page.path === PUBS_PATH && page !== shardedPage) {
+      removeStaleShards(path.dirname(PUBS_PATH), new Set());
+      syncSitemap(SITEMAP_PATH, []);
+    }
+    templates[page.label] = templateStamp(page.path);
+  }
+
+  saveManifest(MANIFEST_PATH, { rendererVersion: RENDERER_VERSION, options, sections: sectionHashes, templates });
+
+  if (cache) {
+    saveFragmentCache(cache);
+    console.log("Fragment cache: " + cache.hits + " hits, " + cache.misses + " misses.");
+  }
+
+  if (dist) {
+    await buildDist(dist);
+  }
+}
+
+/* ---------- WATCH MODE (warm incremental rebuilds) ---------- */
+function createWatchState(cache, options) {
+  // Everything a rebuild needs stays in memory between saves: the last parsed content, the
+  // rendered fragment of every entry and each CONTENT block. Compiled page templates are kept
+  // by page-template.js, keyed by the file stamp of the last read or write.
+  return { cache, options, site: null, fragments: {}, blocks: {}, pages: new Set() };
+}
+
+function sameEntry(a, b) {
+  if (a === b) {
+    return true;
+  }
+  if (!a || !b || typeof a !== "object" || typeof b !== "object" || Array.isArray(a) !== Array.isArray(b)) {
+    return false;
+  }
+  const keys = Object.keys(a);
+  return keys.length === Object.keys(b).length && keys.every((key) => Object.hasOwn(b, key) && sameEntry(a[key], b[key]));
+}
+
+function rerenderSection(state, block, entries) {
+  // Edits, inserts and deletions touch a contiguous run of entries, so only the entries between
+  // the unchanged prefix and the unchanged suffix are rendered again.
+  const previous = (state.site && state.site[block.section]) || [];
+  const fragments = state.fragments[block.section] || [];
+  let prefix = 0;
+  while (prefix < previous.length && prefix < entries.length && sameEntry(previous[prefix], entries[prefix])) {
+    prefix += 1;
+  }
+  if (prefix === previous.length && prefix === entries.length && fragments.length === entries.length) {
+    return false;
+  }
+  let suffix = 0;
+  while (
+    suffix < previous.length - prefix && suffix < entries.length - prefix &&
+    sameEntry(previous[previous.length - 1 - suffix], entries[entries.length - 1 - suffix])
+  ) {
+    suffix += 1;
+  }
+  const middle = entries.slice(prefix, entries.length - suffix).map((entry) =>
+    (state.cache ? renderCached(state.cache, block.section, entry, block.renderEntry) : block.renderEntry(entry)));
+  state.fragments[block.section] = [
+    ...fragments.slice(0, prefix),
+    ...middle,
+    ...fragments.slice(fragments.length - suffix),
+  ];
+  return true;
+}
+
+function rebuildChanged(state, site, changedTemplates) {
+  const changedBlocks = new Set();
+  for (const page of PAGES) {
+    for (const block of page.blocks) {
+      const entries = blockEntries(site, block);
+      if (rerenderSection(state, block, entries)) {
+        state.blocks[block.name] = state.fragments[block.section].join("\n");
+        changedBlocks.add(block.name);
+      }
+    }
+  }
+
+  const updated = [];
+  for (const page of PAGES) {
+    const templateChanged = changedTemplates.has(page.label) || !state.pages.has(page.label);
+    if (!templateChanged && !page.blocks.some((block) => changedBlocks.has(block.name))) {
+      continue;
+    }
+    if (state.options.paginate && page.path === PUBS_PATH) {
+      const result = writePublicationShards(page, site.publications, state.fragments.publications, state.options, state.blocks);
+      if (result.updated + result.removed > 0) {
+        updated.push(page.label + " (" + result.shards + " publication pages)");
+      }
+    } else if (writePage(page, state.blocks)) {
+      updated.push(page.label);
+    }
+    state.pages.add(page.label);
+  }
+
+  state.site = site;
+  return { changedBlocks: [...changedBlocks], updated };
+}
+
+function saveWatchState(state) {
+  const templates = {};
+  for (const page of PAGES) {
+    templates[page.label] = templateStamp(page.path);
+  }
+  saveManifest(MANIFEST_PATH, {
+    rendererVersion: RENDERER_VERSION,
+    options: state.options,
+    sections: sectionHashesFor(state.site),
+    templates,
+  });
+  if (state.cache) {
+    saveFragmentCache(state.cache);
+    advanceFragmentCache(state.cache);
+  }
+}
+
+function watch(args) {
+  const state = createWatchState(args.includes("--no-cache") ? null : loadFragmentCache(FRAGMENT_CACHE_PATH), shardOptions(args));
+  const pagesByPath = new Map(PAGES.map((page) => [page.path, page]));
+  const pending = new Set();
+  let timer = null;
+
+  function flush() {
+    timer = null;
+    const changedFiles = [...pending];
+    pending.clear();
+    const started = process.hrtime.bigint();
+    try {
+      const changedTemplates = new Set();
+      for (const filePath of changedFiles) {
+        const page = pagesByPath.get(filePath);
+        // Ignore the change events caused by this process writing the page.
+        if (page && !isTemplateCurrent(filePath)) {
+          changedTemplates.add(page.label);
+        }
+      }
+      if (!changedFiles.some((filePath) => DATA_PATHS.includes(filePath)) && changedTemplates.size === 0) {
+        return;
+      }
+      const result = rebuildChanged(state, loadSite(), changedTemplates);
+      const elapsed = Number(process.hrtime.bigint() - started) / 1e6;
+      console.log(
+        "Rebuilt in " + elapsed.toFixed(1) + " ms; blocks: " + (result.changedBlocks.join(", ") || "none") +
+        "; updated: " + (result.updated.join(", ") || "none") + "."
+      );
+      saveWatchState(state);
+    } catch (error) {
+      console.error("Build failed: " + error.message);
+    }
+  }
+
+  function schedule(filePath) {
+    pending.add(filePath);
+    clearTimeout(timer);
+    timer = setTimeout(flush, WATCH_DEBOUNCE_MS);
+  }
+
+  // Watch directories rather than files, so editors that save by replacing the file are still seen.
+  const watchedFiles = [...DATA_PATHS, ...pagesByPath.keys()];
+  for (const directory of new Set(watchedFiles.map((filePath) => path.dirname(filePath)))) {
+    fs.watch(directory, (eventType, fileName) => {
+      const filePath = fileName && path.join(directory, fileName.toString());
+      if (watchedFiles.includes(filePath)) {
+        schedule(filePath);
+      }
+    });
+  }
+
+  const result = rebuildChanged(state, loadSite(), new Set());
+  console.log("Initial build updated: " + (result.updated.join(", ") || "none") + ".");
+  saveWatchState(state);
+  console.log("Watching content/site.json, content/citations.json and the page templates. Press Ctrl+C to stop.");
+}
+
+if (require.main === module) {
+  const args = process.argv.slice(2);
+  if (args.includes("--watch")) {
+    watch(args);
+  } else {
+    main(args).catch((error) => {
+      console.error(error.message);
+      process.exit(1);
+    });
+  }
 }
 
-main();
+module.exports = {
+  PAGES,
+  build,
+  writeBuild,
+  escapeHtml,
+  loadFragmentCache,
+  saveFragmentCache,
+  advanceFragmentCache,
+  hashSection,
+  templateStamp,
+  pageIsStale,
+  createWatchState,
+  rerenderSection,
+  streamPage,
+  renderPage,
+  renderPagesInParallel,
+  renderSkills,
+  renderProjects,
+  renderNews,
+  renderPublication,
+  renderPublications,
+  renderCitations,
+  loadSite,
+};
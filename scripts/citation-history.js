@@ -0,0 +1,148 @@
+"use strict";
+
+// Citation totals over time, kept as an append-only NDJSON file (one {date,total} line per refresh
+// that changed something; later lines win). Old points are thinned out as they age: daily for the
+// last DAILY_DAYS, then one point per week up to WEEKLY_DAYS, then one per month, so years of daily
+// cron runs stay a few hundred lines long.
+
+const fs = require("fs");
+const path = require("path");
+const { escapeXml, themedStyle } = require("./generate-gh-contribs");
+
+const DAY_MS = 24 * 60 * 60 * 1000;
+const DAILY_DAYS = 60;
+const WEEKLY_DAYS = 365;
+const SPARK_WIDTH = 160;
+const SPARK_HEIGHT = 32;
+const SPARK_PAD = 3;
+
+function dayTime(date) {
+  const time = Date.parse(date + "T00:00:00Z");
+  if (!/^\d{4}-\d{2}-\d{2}$/.test(date) || Number.isNaN(time)) {
+    throw new Error("Citation history dates must use YYYY-MM-DD format, not " + JSON.stringify(date) + ".");
+  }
+  return time;
+}
+
+function readHistory(file) {
+  const points = new Map();
+  let lines = 0;
+  if (fs.existsSync(file)) {
+    for (const line of fs.readFileSync(file, "utf8").split("\n")) {
+      if (!line.trim()) continue;
+      const { date, total } = JSON.parse(line);
+      dayTime(date);
+      if (!Number.isInteger(total) || total < 0) {
+        throw new Error("Citation history total for " + date + " must be a non-negative integer.");
+      }
+      points.set(date, total);
+      lines += 1;
+    }
+  }
+  return { file, points, lines };
+}
+
+function latestPoint(history) {
+  let latest = null;
+  for (const [date, total] of history.points) {
+    if (!latest || date > latest.date) latest = { date, total };
+  }
+  return latest;
+}
+
+function bucketKey(date, asOf) {
+  // Points in the same bucket collapse to the latest of them.
+  const time = dayTime(date);
+  const age = (asOf - time) / DAY_MS;
+  if (age <= DAILY_DAYS) return date;
+  if (age <= WEEKLY_DAYS) return "w" + new Date(time - new Date(time).getUTCDay() * DAY_MS).toISOString().slice(0, 10);
+  return "m" + date.slice(0, 7);
+}
+
+function compactPoints(points, asOfDate) {
+  // Sorted [{date,total}] with daily, weekly and monthly buckets measured back from asOfDate.
+  const asOf = dayTime(asOfDate);
+  const buckets = new Map();
+  for (const [date, total] of [...points].sort(([a], [b]) => (a < b ? -1 : 1))) {
+    buckets.set(bucketKey(date, asOf), { date, total });
+  }
+  return [...buckets.values()];
+}
+
+function historySeries(history) {
+  // Compacted relative to the latest point rather than today, so the series (and the page it is
+  // drawn on) only changes when the history file does.
+  const latest = latestPoint(history);
+  return latest ? compactPoints(history.points, latest.date) : [];
+}
+
+function appendToHistory(history, date, total) {
+  // Returns "unchanged", "appended" or "compacted"; the file is rewritten only when superseded or
+  // thinned-out lines outnumber the points that survive compaction.
+  if (history.points.get(date) === total) {
+    return "unchanged";
+  }
+  history.points.set(date, total);
+  fs.mkdirSync(path.dirname(history.file), { recursive: true });
+  const compacted = compactPoints(history.points, latestPoint(history).date);
+  if (history.lines + 1 > 2 * compacted.length) {
+    history.points = new Map(compacted.map((point) => [point.date, point.total]));
+    history.lines = compacted.length;
+    fs.writeFileSync(history.file, compacted.map((point) => JSON.stringify(point) + "\n").join(""), "utf8");
+    return "compacted";
+  }
+  history.lines += 1;
+  fs.appendFileSync(history.file, JSON.stringify({ date, total }) + "\n", "utf8");
+  return "appended";
+}
+
+function sparkNumber(value) {
+  return String(Math.round(value * 10) / 10);
+}
+
+function drawSparklineSVG(points, options = {}) {
+  // An inline sparkline of totals against time (x is proportional to the date, not the index, so
+  // compacted stretches are not stretched). Uses the activity calendar's palette and theme rules.
+  if (points.length < 2) {
+    return "";
+  }
+  const width = options.width || SPARK_WIDTH;
+  const height = options.height || SPARK_HEIGHT;
+  const first = dayTime(points[0].date);
+  const span = dayTime(points[points.length - 1].date) - first || 1;
+  const totals = points.map((point) => point.total);
+  const low = Math.min(...totals);
+  const range = Math.max(...totals) - low;
+  const coords = points.map((point) => [
+    SPARK_PAD + ((dayTime(point.date) - first) / span) * (width - 2 * SPARK_PAD),
+    range ? SPARK_PAD + (1 - (point.total - low) / range) * (height - 2 * SPARK_PAD) : height / 2,
+  ]);
+  const line = coords.map(([x, y], index) => (index ? "L" : "M") + sparkNumber(x) + " " + sparkNumber(y)).join("");
+  const [endX, endY] = coords[coords.length - 1];
+  const style = [
+    ...themedStyle(".cite-spark", (theme) => `--sp-line:${theme.levels[4]};--sp-fill:${theme.levels[1]}`),
+    ".cite-spark .area{fill:var(--sp-fill);opacity:.45}",
+    ".cite-spark .line{fill:none;stroke:var(--sp-line);stroke-width:1.5;stroke-linejoin:round;stroke-linecap:round}",
+    ".cite-spark .end{fill:var(--sp-line)}",
+  ].join("");
+  const label = options.label ? ` role="img" aria-label="${escapeXml(options.label)}"` : ' aria-hidden="true"';
+  return [
+    `<svg xmlns="http://www.w3.org/2000/svg" class="cite-spark" width="${width}" height="${height}" viewBox="0 0 ${width} ${height}"${label}>`,
+    `<style>${style}</style>`,
+    `<path class="area" d="${line}V${height}H${sparkNumber(coords[0][0])}Z"/>`,
+    `<path class="line" d="${line}"/>`,
+    `<circle class="end" cx="${sparkNumber(endX)}" cy="${sparkNumber(endY)}" r="2"/>`,
+    "</svg>",
+  ].join("");
+}
+
+module.exports = {
+  DAILY_DAYS,
+  WEEKLY_DAYS,
+  appendToHistory,
+  compactPoints,
+  drawSparklineSVG,
+  historySeries,
+  latestPoint,
+  readHistory,
+};
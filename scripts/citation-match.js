@@ -0,0 +1,148 @@
+"use strict";
+
+// Joins per-article citation counts (from Scholar or SerpApi) to site.json publications. Articles
+// are indexed once by DOI, normalised title and title trigrams, so each publication is matched by
+// a few map lookups plus a walk over the postings of its own trigrams, never by comparing it
+// against every article.
+
+// Minimum Dice similarity of title trigram sets for a fuzzy match.
+const MIN_SIMILARITY = 0.8;
+// Trigrams carried by more than this share of the articles ("the", "ion", ...) are skipped when
+// collecting candidates; they still count towards the similarity of a candidate found otherwise.
+const COMMON_TRIGRAM_SHARE = 0.25;
+// Candidates sharing the most rare trigrams are scored exactly against the full trigram sets.
+const CANDIDATES_SCORED = 16;
+const DOI_PATTERN = /\b(10\.\d{4,9}\/[^\s"'<>]+)/i;
+
+function normalizeTitle(title) {
+  return String(title || "")
+    .normalize("NFKD")
+    .replace(/[\u0300-\u036f]/g, "")
+    .toLowerCase()
+    .replace(/&amp;/g, "and")
+    .replace(/[^a-z0-9]+/g, " ")
+    .trim();
+}
+
+function extractDoi(value) {
+  let text = String(value || "");
+  try {
+    text = decodeURIComponent(text);
+  } catch (_) {
+    // A stray "%" only means the value is matched as written.
+  }
+  const match = DOI_PATTERN.exec(text);
+  // bioRxiv/medRxiv page URLs append a version and a view ("v1.abstract", "v2.full.pdf").
+  return match ? match[1].replace(/[.,;)\]]+$/, "").replace(/^(10\.1101\/[\d.]+)v\d+.*$/i, "$1").toLowerCase() : null;
+}
+
+function trigrams(normalized) {
+  const padded = " " + normalized + " ";
+  const grams = new Set();
+  for (let index = 0; index + 3 <= padded.length; index += 1) {
+    grams.add(padded.slice(index, index + 3));
+  }
+  return grams;
+}
+
+function buildArticleIndex(articles) {
+  const byDoi = new Map();
+  const byTitle = new Map();
+  const postings = new Map();
+  const gramSets = new Array(articles.length);
+  articles.forEach((article, id) => {
+    const doi = extractDoi(article.doi) || extractDoi(article.url);
+    if (doi && !byDoi.has(doi)) {
+      byDoi.set(doi, id);
+    }
+    const title = normalizeTitle(article.title);
+    if (!byTitle.has(title)) {
+      byTitle.set(title, id);
+    }
+    const grams = trigrams(title);
+    gramSets[id] = grams;
+    for (const gram of grams) {
+      const list = postings.get(gram);
+      if (list) {
+        list.push(id);
+      } else {
+        postings.set(gram, [id]);
+      }
+    }
+  });
+  return { articles, byDoi, byTitle, postings, gramSets, shared: new Int32Array(articles.length) };
+}
+
+function matchPublication(publication, index) {
+  // DOI first, then the exact normalised title, then the most similar title by trigram overlap.
+  const doi = extractDoi(publication.doi) || extractDoi(publication.url);
+  if (doi && index.byDoi.has(doi)) {
+    return { article: index.articles[index.byDoi.get(doi)], by: "doi", similarity: 1 };
+  }
+  const title = normalizeTitle(publication.title);
+  if (index.byTitle.has(title)) {
+    return { article: index.articles[index.byTitle.get(title)], by: "title", similarity: 1 };
+  }
+
+  const grams = trigrams(title);
+  const commonLimit = Math.max(1, index.articles.length * COMMON_TRIGRAM_SHARE);
+  const { shared, gramSets } = index;
+  const touched = [];
+  // Rare trigrams nominate candidates, counting how many each shares.
+  for (const gram of grams) {
+    const list = index.postings.get(gram);
+    if (list && list.length <= commonLimit) {
+      for (const id of list) {
+        if (shared[id] === 0) {
+          touched.push(id);
+        }
+        shared[id] += 1;
+      }
+    }
+  }
+  touched.sort((a, b) => shared[b] - shared[a]);
+  const candidates = touched.slice(0, CANDIDATES_SCORED);
+  for (const id of touched) {
+    shared[id] = 0;
+  }
+  let best = null;
+  let bestScore = 0;
+  for (const id of candidates) {
+    let common = 0;
+    for (const gram of grams) {
+      if (gramSets[id].has(gram)) {
+        common += 1;
+      }
+    }
+    const score = (2 * common) / (grams.size + gramSets[id].size);
+    if (score > bestScore) {
+      best = id;
+      bestScore = score;
+    }
+  }
+  return bestScore >= MIN_SIMILARITY ? { article: index.articles[best], by: "trigram", similarity: bestScore } : null;
+}
+
+function joinCitations(publications, articles) {
+  // Returns copies of the publications; matched ones gain an integer `citations`.
+  const index = buildArticleIndex(articles || []);
+  let matched = 0;
+  const joined = publications.map((publication) => {
+    const match = index.articles.length ? matchPublication(publication, index) : null;
+    if (!match || !Number.isInteger(match.article.citations)) {
+      return publication;
+    }
+    matched += 1;
+    return { ...publication, citations: match.article.citations };
+  });
+  return { publications: joined, matched };
+}
+
+module.exports = {
+  MIN_SIMILARITY,
+  buildArticleIndex,
+  extractDoi,
+  joinCitations,
+  matchPublication,
+  normalizeTitle,
+};
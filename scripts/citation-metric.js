@@ -0,0 +1,73 @@
+(() => {
+  // The citation total is pre-rendered into the page at build time. Once the page has loaded and
+  // the browser is idle, this refreshes it from content/citations.json, so a daily count change
+  // only needs that file redeployed. In a fingerprinted deploy the current hashed name is looked
+  // up in asset-manifest.json, so the page itself does not change with the count.
+  const metric = document.querySelector(".metric");
+  const script = document.currentScript;
+  if (!metric || !script || !window.fetch) {
+    return;
+  }
+  // Shard pages sit deeper than publications/, so paths are resolved against this script's URL.
+  const siteRoot = new URL("../", script.src);
+  const CITATIONS = "content/citations.json";
+  const formatDate = new Intl.DateTimeFormat("en-GB", { day: "numeric", month: "short", year: "numeric", timeZone: "UTC" });
+
+  function fetchJson(url, init) {
+    return fetch(url, init).then((response) => {
+      if (!response.ok) {
+        throw new Error(response.status + " for " + url);
+      }
+      return response.json();
+    });
+  }
+
+  function citationsUrl() {
+    return fetchJson(new URL("asset-manifest.json", siteRoot), { cache: "no-cache" })
+      .then((manifest) => (manifest[CITATIONS] ? { url: new URL(manifest[CITATIONS], siteRoot) } : null))
+      .catch(() => null)
+      .then((hashed) => hashed || { url: new URL(CITATIONS, siteRoot), init: { cache: "no-cache" } });
+  }
+
+  function render(citations) {
+    const total = citations.totalCitations;
+    const updated = new Date(citations.updatedAt + "T00:00:00Z");
+    const count = metric.querySelector("b");
+    const time = metric.querySelector("time");
+    if (!Number.isInteger(total) || Number.isNaN(updated.getTime()) || !count || !time) {
+      return;
+    }
+    if (time.dateTime === citations.updatedAt && count.textContent === total.toLocaleString("en-GB")) {
+      return;
+    }
+    count.textContent = total.toLocaleString("en-GB");
+    time.dateTime = citations.updatedAt;
+    time.textContent = formatDate.format(updated);
+    // The build-time label may end with the history trend ("; 180 on 1 Jan 2025"); keep it.
+    const trend = (metric.getAttribute("aria-label") || "").split(";").slice(1).join(";");
+    metric.setAttribute("aria-label", count.textContent + " total citations, updated " + time.textContent + (trend ? ";" + trend : ""));
+  }
+
+  function refresh() {
+    citationsUrl()
+      .then(({ url, init }) => fetchJson(url, init))
+      .then(render)
+      .catch(() => {
+        // The pre-rendered count stays in place.
+      });
+  }
+
+  function whenIdle() {
+    if (window.requestIdleCallback) {
+      window.requestIdleCallback(refresh, { timeout: 2000 });
+    } else {
+      setTimeout(refresh, 0);
+    }
+  }
+
+  if (document.readyState === "complete") {
+    whenIdle();
+  } else {
+    window.addEventListener("load", whenIdle, { once: true });
+  }
+})();
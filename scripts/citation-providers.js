@@ -0,0 +1,291 @@
+"use strict";
+
+// Open-metadata citation providers. Instead of one profile total, these resolve a count for every
+// site.json publication with a DOI (from a `doi` field, the URL, or an arXiv abs/pdf URL), in
+// batches, against OpenAlex, Crossref and Semantic Scholar. Batches from every selected provider
+// run concurrently over keep-alive agents with a cap on requests in flight, and the counts are
+// merged per publication (the highest count any provider reports).
+//
+// Env:
+//   CITATION_CONCURRENCY      requests in flight across all providers (default 4)
+//   OPENALEX_MAILTO           contact address for OpenAlex's polite pool
+//   CROSSREF_MAILTO           contact address for Crossref's polite pool
+//   SEMANTIC_SCHOLAR_API_KEY  optional Semantic Scholar API key
+//   CITATION_RECORD           directory to save responses in, for createFixtureServer to replay
+
+const crypto = require("crypto");
+const fs = require("fs");
+const http = require("http");
+const https = require("https");
+const path = require("path");
+const { extractDoi } = require("./citation-match");
+
+const DEFAULT_CONCURRENCY = Number(process.env.CITATION_CONCURRENCY || 4);
+const MAX_RETRIES = 3;
+const BASE_DELAY_MS = 1000;
+const MAX_WAIT_MS = 60 * 1000;
+const REQUEST_TIMEOUT_MS = 20000;
+const RETRY_STATUSES = new Set([429, 500, 502, 503, 504]);
+const USER_AGENT = "emnikolados.dev citation tracker (+https://emnikolados.dev/)";
+const ARXIV_URL = /arxiv\.org\/(?:abs|pdf)\/(\d{4}\.\d{4,5})/i;
+
+// Each provider turns a batch of DOIs into one request (a path relative to its API root) and
+// reads [doi, count] pairs back out of the response body.
+const DOI_PROVIDERS = {
+  openalex: {
+    label: "OpenAlex",
+    api: "https://api.openalex.org",
+    batchSize: 50,
+    request: (dois) => ({
+      method: "GET",
+      path: "/works?filter=doi:" + dois.map(encodeURIComponent).join("|") + "&per-page=" + dois.length +
+        "&select=doi,cited_by_count" + (process.env.OPENALEX_MAILTO ? "&mailto=" + encodeURIComponent(process.env.OPENALEX_MAILTO) : ""),
+    }),
+    counts: (body) => (body.results || []).map((work) => [extractDoi(work.doi), work.cited_by_count]),
+  },
+  crossref: {
+    label: "Crossref",
+    api: "https://api.crossref.org",
+    batchSize: 20,
+    request: (dois) => ({
+      method: "GET",
+      path: "/works?filter=" + dois.map((doi) => "doi:" + encodeURIComponent(doi)).join(",") + "&rows=" + dois.length +
+        "&select=DOI,is-referenced-by-count" + (process.env.CROSSREF_MAILTO ? "&mailto=" + encodeURIComponent(process.env.CROSSREF_MAILTO) : ""),
+    }),
+    counts: (body) => ((body.message && body.message.items) || []).map((item) => [extractDoi(item.DOI), item["is-referenced-by-count"]]),
+  },
+  semanticscholar: {
+    label: "Semantic Scholar",
+    api: "https://api.semanticscholar.org",
+    batchSize: 100,
+    headers: () => (process.env.SEMANTIC_SCHOLAR_API_KEY ? { "x-api-key": process.env.SEMANTIC_SCHOLAR_API_KEY } : {}),
+    request: (dois) => ({
+      method: "POST",
+      path: "/graph/v1/paper/batch?fields=citationCount",
+      body: JSON.stringify({ ids: dois.map((doi) => "DOI:" + doi) }),
+    }),
+    // One entry per requested id, in order, with null for papers it does not know.
+    counts: (body, dois) => (Array.isArray(body) ? body : []).map((paper, index) => [dois[index], paper && paper.citationCount]),
+  },
+};
+
+function publicationDoi(publication) {
+  const doi = extractDoi(publication.doi) || extractDoi(publication.url);
+  if (doi) {
+    return doi;
+  }
+  const arxiv = ARXIV_URL.exec(String(publication.url || ""));
+  return arxiv ? "10.48550/arxiv." + arxiv[1] : null;
+}
+
+function parseProviderNames(value) {
+  const names = String(value).split(/[,+]/).map((name) => name.trim()).filter(Boolean);
+  return names.length > 0 && names.every((name) => Object.hasOwn(DOI_PROVIDERS, name)) ? [...new Set(names)] : null;
+}
+
+function fixtureName(provider, request) {
+  const key = crypto.createHash("sha256").update(request.method + " " + request.path + "\n" + (request.body || "")).digest("hex");
+  return provider + "-" + key.slice(0, 16) + ".json";
+}
+
+function retryDelay(response, attempt) {
+  const retryAfter = Number(response.headers["retry-after"]);
+  return Number.isFinite(retryAfter) ? retryAfter * 1000 : BASE_DELAY_MS * 2 ** attempt;
+}
+
+function createJsonClient(options = {}) {
+  // One keep-alive agent per protocol for the whole run, so every batch to a provider reuses a
+  // few connections, and at most `concurrency` requests are in flight across all providers.
+  const concurrency = options.concurrency || DEFAULT_CONCURRENCY;
+  const agents = {
+    "http:": new http.Agent({ keepAlive: true, maxSockets: concurrency }),
+    "https:": new https.Agent({ keepAlive: true, maxSockets: concurrency }),
+  };
+  const sleep = options.sleep || ((ms) => new Promise((resolve) => setTimeout(resolve, ms)));
+  const maxRetries = options.maxRetries ?? MAX_RETRIES;
+  const timeoutMs = options.timeoutMs || REQUEST_TIMEOUT_MS;
+  const stats = { requests: 0, retries: 0 };
+  const queue = [];
+  let active = 0;
+
+  const acquire = () => (active < concurrency ? (active++, Promise.resolve()) : new Promise((resolve) => queue.push(resolve)));
+  const release = () => (queue.length ? queue.shift()() : active--);
+
+  const send = (url, { method, body, headers }) =>
+    new Promise((resolve, reject) => {
+      const transport = url.protocol === "http:" ? http : https;
+      const request = transport.request(url, {
+        method,
+        agent: agents[url.protocol],
+        headers: {
+          "Accept": "application/json",
+          "User-Agent": USER_AGENT,
+          ...(body ? { "Content-Type": "application/json", "Content-Length": Buffer.byteLength(body) } : {}),
+          ...headers,
+        },
+      }, (response) => {
+        const chunks = [];
+        response.on("data", (chunk) => chunks.push(chunk));
+        response.on("end", () => resolve({ status: response.statusCode, headers: response.headers, text: Buffer.concat(chunks).toString("utf8") }));
+        response.on("error", reject);
+      });
+      request.setTimeout(timeoutMs, () => request.destroy(new Error("timed out after " + timeoutMs + " ms")));
+      request.on("error", reject);
+      request.end(body);
+    });
+
+  async function request(url, init = {}) {
+    await acquire();
+    try {
+      for (let attempt = 0; ; attempt += 1) {
+        stats.requests += 1;
+        const response = await send(new URL(url), { method: init.method || "GET", body: init.body, headers: init.headers });
+        if (response.status >= 200 && response.status < 300) {
+          try {
+            return { status: response.status, body: JSON.parse(response.text) };
+          } catch (_) {
+            throw new Error(new URL(url).host + " returned non-JSON response with HTTP " + response.status + ".");
+          }
+        }
+        const delay = RETRY_STATUSES.has(response.status) ? retryDelay(response, attempt) : null;
+        if (delay === null || attempt >= maxRetries || delay > MAX_WAIT_MS) {
+          throw new Error(new URL(url).host + " returned HTTP " + response.status + ": " + response.text.slice(0, 200));
+        }
+        stats.retries += 1;
+        await sleep(delay);
+      }
+    } finally {
+      release();
+    }
+  }
+
+  return { request, stats, close: () => Object.values(agents).forEach((agent) => agent.destroy()) };
+}
+
+function batches(items, size) {
+  const result = [];
+  for (let index = 0; index < items.length; index += size) {
+    result.push(items.slice(index, index + size));
+  }
+  return result;
+}
+
+async function fetchDoiCitations(names, publications, options = {}) {
+  // Returns the raw payload: the DOI list and every provider's batch responses. A provider that
+  // fails is recorded and skipped as long as another one answered.
+  const entries = [];
+  const seen = new Set();
+  for (const publication of publications) {
+    const doi = publicationDoi(publication);
+    if (doi && !seen.has(doi)) {
+      seen.add(doi);
+      entries.push({ doi, title: publication.title, year: Number(publication.year) || null });
+    }
+  }
+  if (entries.length === 0) {
+    throw new Error("No publication in site.json has a DOI (a doi field, a DOI in its url, or an arXiv URL).");
+  }
+  const client = options.client || createJsonClient(options);
+  const record = options.record ?? process.env.CITATION_RECORD;
+  const endpoints = options.endpoints || {};
+  const answered = {};
+  const errors = {};
+  try {
+    await Promise.all(names.map(async (name) => {
+      const provider = DOI_PROVIDERS[name];
+      const api = endpoints[name] || provider.api;
+      try {
+        answered[name] = await Promise.all(batches(entries.map((entry) => entry.doi), provider.batchSize).map(async (dois) => {
+          const request = provider.request(dois);
+          const { body } = await client.request(api + request.path, { ...request, headers: provider.headers ? provider.headers() : {} });
+          if (record) {
+            fs.mkdirSync(record, { recursive: true });
+            fs.writeFileSync(path.join(record, fixtureName(name, request)), JSON.stringify({ request, body }, null, 2) + "\n", "utf8");
+          }
+          return { dois, body };
+        }));
+      } catch (error) {
+        errors[name] = error.message;
+      }
+    }));
+  } finally {
+    if (!options.client) {
+      client.close();
+    }
+  }
+  // Keyed in the order the providers were named, whichever answered first.
+  const responses = Object.fromEntries(names.filter((name) => answered[name]).map((name) => [name, answered[name]]));
+  if (Object.keys(responses).length === 0) {
+    throw new Error("Every citation provider failed: " + names.map((name) => name + ": " + errors[name]).join(" | "));
+  }
+  return { providers: names, publications: entries, responses, errors };
+}
+
+function parseDoiCitations(payload) {
+  // Merges the providers' counts per publication; publications no provider knows are left out.
+  const counts = new Map();
+  for (const [name, pages] of Object.entries(payload.responses)) {
+    for (const { dois, body } of pages) {
+      for (const [doi, count] of DOI_PROVIDERS[name].counts(body, dois)) {
+        if (doi && Number.isInteger(count) && count >= 0) {
+          const merged = counts.get(doi) || { citations: 0, sources: [] };
+          merged.citations = Math.max(merged.citations, count);
+          merged.sources.push(name);
+          counts.set(doi, merged);
+        }
+      }
+    }
+  }
+  const articles = payload.publications
+    .filter((entry) => counts.has(entry.doi))
+    .map((entry) => ({ title: entry.title, doi: entry.doi, citations: counts.get(entry.doi).citations, year: entry.year }));
+  const failed = Object.keys(payload.errors || {});
+  // No totalCitations: a sum over the publications with a DOI is not the profile total.
+  return {
+    source: Object.keys(payload.responses).join("+") + ":" + articles.length + "/" + payload.publications.length + " DOIs" +
+      (failed.length ? " (" + failed.join(", ") + " failed)" : ""),
+    articles,
+  };
+}
+
+function doiProvider(names, loadPublications) {
+  // Plugs into update-scholar-citations.js' PROVIDERS: fetch returns the parsed result with its
+  // payload, parse re-reads a cached or fixture payload.
+  return {
+    async fetch(options = {}) {
+      const payload = await fetchDoiCitations(names, options.publications || loadPublications(), options);
+      return { ...parseDoiCitations(payload), payload };
+    },
+    parse: parseDoiCitations,
+  };
+}
+
+function createFixtureServer(dir) {
+  // A local stand-in for every provider: /<provider>/<path> answers with the response recorded
+  // for that provider, method, path and body (see CITATION_RECORD), so lookups run offline.
+  return http.createServer((request, reply) => {
+    let body = "";
+    request.on("data", (chunk) => (body += chunk));
+    request.on("end", () => {
+      const [, provider, rest] = /^\/([^/]+)(\/.*)$/.exec(request.url) || [];
+      const file = provider ? path.join(dir, fixtureName(provider, { method: request.method, path: rest, body: body || undefined })) : null;
+      if (!file || !fs.existsSync(file)) {
+        reply.writeHead(404, { "content-type": "application/json" }).end(JSON.stringify({ error: "No recorded response for " + request.method + " " + request.url }));
+        return;
+      }
+      reply.writeHead(200, { "content-type": "application/json" }).end(JSON.stringify(JSON.parse(fs.readFileSync(file, "utf8")).body));
+    });
+  });
+}
+
+module.exports = {
+  DOI_PROVIDERS,
+  createFixtureServer,
+  createJsonClient,
+  doiProvider,
+  fetchDoiCitations,
+  fixtureName,
+  parseDoiCitations,
+  parseProviderNames,
+  publicationDoi,
+};
@@ -5,8 +5,10 @@ const crypto = require("crypto");
 const fs = require("fs");
 const http = require("http");
 const path = require("path");
-const { spawnSync } = require("child_process");
 const renderEditorPage = require("./content-editor-page");
+const { build, writeBuild } = require("./build-site");
+const { check } = require("./check-site");
+const { createGitSession } = require("./editor-git");
 
 const ROOT = path.resolve(__dirname, "..");
 const HOST = "127.0.0.1";
@@ -16,7 +18,6 @@ const PREFIX = "/" + TOKEN;
 const CONTENT_PATH = path.join(ROOT, "content", "site.json");
 // HTML pages regenerated from content/site.json by build-site.js.
 const GENERATED_FILES = ["index.html", "publications/index.html", "cv/index.html"];
-const GENERATED_PATHS = GENERATED_FILES.map((relativePath) => path.join(ROOT, relativePath));
 const MAX_BODY_BYTES = 1024 * 1024;
 let publishing = false;
 
@@ -150,116 +151,11 @@ function validateContent(content) {
   });
 }
 
-function currentBranch() {
-  const head = fs.readFileSync(path.join(ROOT, ".git", "HEAD"), "utf8").trim();
-  const prefix = "ref: refs/heads/";
-  return head.startsWith(prefix) ? head.slice(prefix.length) : "detached HEAD";
-}
-
-function run(command, args) {
-  const result = spawnSync(command, args, {
-    cwd: ROOT,
-    encoding: "utf8",
-    maxBuffer: 10 * 1024 * 1024,
-    windowsHide: true,
-  });
-  if (result.error) {
-    throw result.error;
-  }
-  if (result.status !== 0) {
-    const detail = (result.stderr || result.stdout || "").trim();
-    throw new Error(command + " " + args.join(" ") + " failed" + (detail ? ": " + detail : "."));
-  }
-  return (result.stdout || "").trim();
-}
-
-function gitStatePath(name) {
-  return path.join(ROOT, ".git", name);
-}
-
-function hasUnfinishedGitOperation() {
-  return fs.existsSync(gitStatePath("MERGE_HEAD"))
-    || fs.existsSync(gitStatePath("REBASE_HEAD"))
-    || fs.existsSync(gitStatePath("rebase-apply"))
-    || fs.existsSync(gitStatePath("rebase-merge"));
-}
-
-function ensureGitCanSync() {
-  if (hasUnfinishedGitOperation()) {
-    throw new Error("Git has an unfinished merge or rebase. Resolve it before publishing from the editor.");
-  }
-
-  const status = run("git", ["status", "--porcelain"]);
-  if (status) {
-    throw new Error("Cannot update from GitHub because the working tree has uncommitted changes. Commit, stash, or discard those changes before publishing from the editor.");
-  }
-}
-
-function abortRebaseIfNeeded() {
-  if (!fs.existsSync(gitStatePath("rebase-apply")) && !fs.existsSync(gitStatePath("rebase-merge"))) {
-    return;
-  }
-
-  const result = spawnSync("git", ["rebase", "--abort"], {
-    cwd: ROOT,
-    encoding: "utf8",
-    maxBuffer: 10 * 1024 * 1024,
-    windowsHide: true,
-  });
-  if (result.error || result.status !== 0) {
-    const detail = result.error ? result.error.message : (result.stderr || result.stdout || "").trim();
-    throw new Error("Automatic rebase failed, and the editor could not abort it. " + detail);
-  }
-}
-
-function syncWithOrigin() {
-  ensureGitCanSync();
-  run("git", ["fetch", "origin", "main"]);
-
-  const local = run("git", ["rev-parse", "HEAD"]);
-  const remote = run("git", ["rev-parse", "origin/main"]);
-  if (local === remote) {
-    return "up-to-date";
-  }
-
-  const base = run("git", ["merge-base", "HEAD", "origin/main"]);
-  if (base === local) {
-    run("git", ["merge", "--ff-only", "origin/main"]);
-    return "fast-forwarded";
-  }
-  if (base === remote) {
-    return "ahead";
-  }
-
-  try {
-    run("git", ["rebase", "origin/main"]);
-    return "rebased";
-  } catch (error) {
-    abortRebaseIfNeeded();
-    throw new Error("GitHub has new commits, and the editor could not automatically rebase your local commits. Resolve the conflict manually, then publish again. " + error.message);
-  }
-}
-
-function pushToOrigin(commit) {
-  syncWithOrigin();
-  try {
-    run("git", ["push", "origin", "main"]);
-  } catch (error) {
-    syncWithOrigin();
-    try {
-      run("git", ["push", "origin", "main"]);
-    } catch (retryError) {
-      throw new Error("The update was committed locally as " + commit + ", but GitHub rejected the push after an automatic sync. " + retryError.message);
-    }
-  }
-}
-
-function runChecks() {
-  run(process.execPath, ["scripts/build-site.js"]);
-  run(process.execPath, ["scripts/check-site.js"]);
-  run(process.execPath, ["--check", "scripts/content-editor.js"]);
-  run(process.execPath, ["--check", "scripts/content-editor-page.js"]);
-  run(process.execPath, ["--check", "scripts/content-editor-server.js"]);
+function runChecks(content, text) {
+  // Builds and checks the pages in memory, so nothing on disk changes unless they pass.
+  const outputs = build(content);
+  check({ ...outputs, "content/site.json": text });
+  return outputs;
 }
 
 function readRequestBody(req) {
@@ -280,6 +176,16 @@ function readRequestBody(req) {
   });
 }
 
+function openEventStream(res) {
+  // Publishing progress is streamed as Server-Sent Events on the POST response itself.
+  res.writeHead(200, securityHeaders("text/event-stream; charset=utf-8"));
+  return (event, data) => {
+    if (!res.writableEnded) {
+      res.write("event: " + event + "\ndata: " + JSON.stringify(data) + "\n\n");
+    }
+  };
+}
+
 async function publish(req, res) {
   if (publishing) {
     sendJson(res, 409, { error: "A publish is already running." });
@@ -287,70 +193,74 @@ async function publish(req, res) {
   }
 
   publishing = true;
-  let contentBackup = null;
-  let generatedBackup = null;
-  let filesWritten = false;
+  const emit = openEventStream(res);
+  const git = createGitSession(ROOT, (progress) => emit("progress", progress));
+  let fetched = Promise.resolve();
 
   try {
-    const branch = currentBranch();
+    const branch = git.currentBranch();
     if (branch !== "main") {
       throw new Error("Publishing is allowed only from the main branch. Current branch: " + (branch || "detached HEAD"));
     }
 
-    syncWithOrigin();
+    // The fetch runs on the network while the edit is validated and built in memory.
+    fetched = git.ensureGitCanSync().then(() => git.fetchOrigin());
+    fetched.catch(() => {});
 
     const payload = JSON.parse(await readRequestBody(req));
     validateContent(payload.content);
+    const nextText = JSON.stringify(payload.content, null, 2) + "\n";
+    const validate = () => {
+      emit("progress", { phase: "validate", message: "Building and checking the pages..." });
+      try {
+        return runChecks(payload.content, nextText);
+      } catch (error) {
+        throw new Error("Validation failed; no files were changed. " + error.message);
+      }
+    };
+    let outputs = validate();
 
+    await fetched;
+    const synced = await git.integrateOrigin();
     const current = readContent();
     if (payload.revision !== current.revision) {
-      sendJson(res, 409, { error: "content/site.json changed after this page was loaded. Reload before publishing." });
-      return;
+      throw new Error("content/site.json changed after this page was loaded. Reload before publishing.");
+    }
+    if (synced === "fast-forwarded" || synced === "rebased") {
+      // Templates or citation data may have changed with the new commits.
+      outputs = validate();
     }
 
-    contentBackup = current.text;
-    generatedBackup = GENERATED_PATHS.map((filePath) => fs.readFileSync(filePath, "utf8"));
-    const nextText = JSON.stringify(payload.content, null, 2) + "\n";
     fs.writeFileSync(CONTENT_PATH, nextText, "utf8");
-    filesWritten = true;
-
-    try {
-      runChecks();
-    } catch (error) {
-      fs.writeFileSync(CONTENT_PATH, contentBackup, "utf8");
-      GENERATED_PATHS.forEach((filePath, index) => fs.writeFileSync(filePath, generatedBackup[index], "utf8"));
-      filesWritten = false;
-      throw new Error("Validation failed; no files were changed. " + error.message);
-    }
+    writeBuild(outputs);
 
     const trackedFiles = ["content/site.json", ...GENERATED_FILES];
-    const changed = spawnSync("git", ["diff", "--quiet", "--", ...trackedFiles], {
-      cwd: ROOT,
-      windowsHide: true,
-    }).status !== 0;
+    const changed = await git.hasChanges(trackedFiles);
 
-    let commit = run("git", ["rev-parse", "--short", "HEAD"]);
+    let commit = await git.run("git", ["rev-parse", "--short", "HEAD"]);
     if (changed) {
-      run("git", ["add", "--", ...trackedFiles]);
-      run("git", ["commit", "--only", "-m", "content: update portfolio", "--", ...trackedFiles]);
-      commit = run("git", ["rev-parse", "--short", "HEAD"]);
+      emit("progress", { phase: "commit", message: "Committing the update..." });
+      await git.run("git", ["add", "--", ...trackedFiles]);
+      await git.run("git", ["commit", "--only", "-m", "content: update portfolio", "--", ...trackedFiles]);
+      commit = await git.run("git", ["rev-parse", "--short", "HEAD"]);
     }
 
-    pushToOrigin(commit);
+    await git.pushToOrigin(commit);
 
     const saved = readContent();
-    sendJson(res, 200, {
+    emit("done", {
       message: changed
         ? "Published commit " + commit + ". GitHub Pages will update after the workflow finishes."
         : "No content changes were needed. Existing local commits were pushed.",
       revision: saved.revision,
     });
   } catch (error) {
-    if (filesWritten && contentBackup !== null && !fs.existsSync(path.join(ROOT, ".git", "MERGE_HEAD"))) {
-      // Keep successfully validated content and any local commit so a failed push can be retried.
-    }
-    sendJson(res, 500, { error: error.message });
+    // Validated content and any local commit are kept, so a failed push can be retried.
+    emit("error", { error: error.message });
   } finally {
+    res.end();
+    // A validation error can come back before the fetch does; the next publish waits for it.
+    await fetched.catch(() => {});
     publishing = false;
   }
 }
@@ -382,7 +292,7 @@ const server = http.createServer(async (req, res) => {
 
   if (req.method === "GET" && route === "/api/content") {
     try {
-      const branch = currentBranch();
+      const branch = createGitSession(ROOT).currentBranch();
       const current = readContent();
       validateContent(current.content);
       sendJson(res, 200, { content: current.content, revision: current.revision, branch });
@@ -384,18 +384,53 @@
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ content, revision: sourceRevision }),
       });
-      const payload = await response.json();
-      if (!response.ok) {
+      if (!(response.headers.get("Content-Type") || "").startsWith("text/event-stream")) {
+        const payload = await response.json();
         throw new Error(payload.error || "Publishing failed.");
       }
-      sourceRevision = payload.revision;
+      let result = null;
+      await readEvents(response, (event, data) => {
+        if (event === "progress") {
+          setStatus(data.message);
+        } else if (event === "error") {
+          throw new Error(data.error || "Publishing failed.");
+        } else if (event === "done") {
+          result = data;
+        }
+      });
+      if (!result) {
+        throw new Error("The editor server stopped before publishing finished.");
+      }
+      sourceRevision = result.revision;
       dirty = false;
-      setStatus(payload.message, "success");
+      setStatus(result.message, "success");
     } finally {
       publishButton.disabled = false;
     }
   }
 
+  async function readEvents(response, onEvent) {
+    // Server-Sent Events from a POST response: "event:" and "data:" lines, one blank line apart.
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = "";
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) {
+        return;
+      }
+      buffer += value;
+      let end = buffer.indexOf("\n\n");
+      while (end !== -1) {
+        const lines = buffer.slice(0, end).split("\n");
+        buffer = buffer.slice(end + 2);
+        const event = (lines.find((line) => line.startsWith("event: ")) || "event: message").slice(7);
+        const data = lines.filter((line) => line.startsWith("data: ")).map((line) => line.slice(6)).join("\n");
+        onEvent(event, JSON.parse(data));
+        end = buffer.indexOf("\n\n");
+      }
+    }
+  }
+
   document.querySelectorAll("[data-add]").forEach((button) => {
     button.addEventListener("click", () => {
       const kind = button.dataset.add;
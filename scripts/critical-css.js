@@ -0,0 +1,554 @@
+"use strict";
+
+const path = require("path");
+
+// Characters of visible body text treated as the first viewport. Elements opened before this much
+// text has been seen (sidebar, page heading, opening section) get their rules inlined.
+const DEFAULT_FOLD_TEXT_CHARS = 1500;
+const PRUNED_CSS_DIR = "css";
+
+const VOID_ELEMENTS = new Set([
+  "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr",
+]);
+const RAW_TEXT_ELEMENTS = new Set(["script", "style", "textarea", "title"]);
+const TAG_PATTERN = /<!--[\s\S]*?-->|<!(?:[^>"']|"[^"]*"|'[^']*')*>|<(\/?)([a-zA-Z][\w-]*)((?:[^>"']|"[^"]*"|'[^']*')*)>/g;
+const ATTRIBUTE_PATTERN = /([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?/g;
+const STYLESHEET_LINK_PATTERN = /([ \t]*)(<link\b(?:[^>"']|"[^"]*"|'[^']*')*\brel=["']?stylesheet["']?(?:[^>"']|"[^"]*"|'[^']*')*>)/gi;
+
+// Attributes scripts set at runtime (theme.js and the inline theme bootstrap); selectors on them
+// must survive pruning whatever the static markup says.
+const DYNAMIC_ATTRIBUTES = new Set(["data-theme", "aria-pressed"]);
+// State the first paint never shows. Selectors needing it stay out of the inline block but are
+// kept in the pruned stylesheet.
+const INTERACTION_PSEUDOS = new Set(["hover", "focus", "focus-visible", "focus-within", "active", "visited", "target"]);
+const LEGACY_PSEUDO_ELEMENTS = new Set(["before", "after", "first-line", "first-letter"]);
+const GROUPING_AT_RULES = new Set(["media", "supports", "layer", "container"]);
+
+function parseAttributes(source) {
+  const attributes = new Map();
+  for (const match of source.matchAll(ATTRIBUTE_PATTERN)) {
+    attributes.set(match[1].toLowerCase(), match[2] ?? match[3] ?? match[4] ?? "");
+  }
+  return attributes;
+}
+
+function visibleTextLength(text) {
+  return text.replace(/&[#\w]+;/g, " ").replace(/\s+/g, " ").trim().length;
+}
+
+function parseHtml(html, foldTextChars = DEFAULT_FOLD_TEXT_CHARS) {
+  // A forgiving element tree: enough structure (parents, sibling order, attributes) for selector
+  // matching, and an inFold flag from the amount of body text seen before each element opens.
+  const elements = [];
+  const roots = [];
+  const stack = [];
+  let inBody = false;
+  let textSeen = 0;
+  let cursor = 0;
+  TAG_PATTERN.lastIndex = 0;
+
+  const open = (tag, attributeSource) => {
+    const attributes = parseAttributes(attributeSource);
+    const parent = stack[stack.length - 1] || null;
+    const siblings = parent ? parent.children : roots;
+    const element = {
+      tag,
+      attributes,
+      id: attributes.get("id") || null,
+      classes: new Set((attributes.get("class") || "").split(/\s+/).filter(Boolean)),
+      parent,
+      children: [],
+      index: siblings.length,
+      inFold: !inBody || textSeen < foldTextChars,
+    };
+    siblings.push(element);
+    elements.push(element);
+    return element;
+  };
+
+  let match;
+  while ((match = TAG_PATTERN.exec(html))) {
+    if (inBody) {
+      textSeen += visibleTextLength(html.slice(cursor, match.index));
+    }
+    cursor = TAG_PATTERN.lastIndex;
+    if (!match[2]) {
+      continue;
+    }
+    const tag = match[2].toLowerCase();
+    if (match[1]) {
+      const openIndex = stack.map((element) => element.tag).lastIndexOf(tag);
+      if (openIndex !== -1) {
+        stack.length = openIndex;
+      }
+      continue;
+    }
+    if (tag === "body") {
+      inBody = true;
+    }
+    const element = open(tag, match[3]);
+    if (RAW_TEXT_ELEMENTS.has(tag)) {
+      const closeIndex = html.toLowerCase().indexOf("</" + tag, TAG_PATTERN.lastIndex);
+      TAG_PATTERN.lastIndex = closeIndex === -1 ? html.length : html.indexOf(">", closeIndex) + 1 || html.length;
+      cursor = TAG_PATTERN.lastIndex;
+    } else if (!VOID_ELEMENTS.has(tag) && !/\/\s*$/.test(match[3])) {
+      stack.push(element);
+    }
+  }
+  return { elements };
+}
+
+function skipString(text, index) {
+  const quote = text[index];
+  let cursor = index + 1;
+  while (cursor < text.length && text[cursor] !== quote) {
+    cursor += text[cursor] === "\\" ? 2 : 1;
+  }
+  return cursor + 1;
+}
+
+function stripCssComments(css) {
+  let output = "";
+  let cursor = 0;
+  while (cursor < css.length) {
+    const char = css[cursor];
+    if (char === '"' || char === "'") {
+      const end = skipString(css, cursor);
+      output += css.slice(cursor, end);
+      cursor = end;
+    } else if (char === "/" && css[cursor + 1] === "*") {
+      const end = css.indexOf("*/", cursor + 2);
+      cursor = end === -1 ? css.length : end + 2;
+    } else {
+      output += char;
+      cursor += 1;
+    }
+  }
+  return output;
+}
+
+function findOutside(text, index, targets) {
+  // Next position of any target character outside strings and parentheses.
+  let depth = 0;
+  for (let cursor = index; cursor < text.length; cursor += 1) {
+    const char = text[cursor];
+    if (depth === 0 && targets.includes(char)) {
+      return cursor;
+    } else if (char === '"' || char === "'") {
+      cursor = skipString(text, cursor) - 1;
+    } else if (char === "(") {
+      depth += 1;
+    } else if (char === ")") {
+      depth = Math.max(0, depth - 1);
+    }
+  }
+  return -1;
+}
+
+function matchingBrace(text, openIndex) {
+  let depth = 0;
+  for (let cursor = openIndex; cursor < text.length; cursor += 1) {
+    const char = text[cursor];
+    if (char === '"' || char === "'") {
+      cursor = skipString(text, cursor) - 1;
+    } else if (char === "{") {
+      depth += 1;
+    } else if (char === "}" && --depth === 0) {
+      return cursor;
+    }
+  }
+  throw new Error("Unbalanced braces in stylesheet.");
+}
+
+function splitTopLevel(text, separator) {
+  const parts = [];
+  let start = 0;
+  let index;
+  while ((index = findOutside(text, start, [separator])) !== -1) {
+    parts.push(text.slice(start, index));
+    start = index + 1;
+  }
+  parts.push(text.slice(start));
+  return parts.map((part) => part.trim()).filter(Boolean);
+}
+
+function parseRules(css) {
+  const nodes = [];
+  let cursor = 0;
+  while (cursor < css.length) {
+    const end = findOutside(css, cursor, ["{", ";"]);
+    if (end === -1) {
+      break;
+    }
+    const prelude = css.slice(cursor, end).trim().replace(/\s+/g, " ");
+    if (css[end] === ";") {
+      if (prelude) {
+        nodes.push({ type: "raw", text: prelude + ";" });
+      }
+      cursor = end + 1;
+      continue;
+    }
+    const close = matchingBrace(css, end);
+    const body = css.slice(end + 1, close);
+    const atName = prelude.startsWith("@") ? prelude.slice(1).split(/[\s(]/)[0].toLowerCase() : null;
+    if (atName && GROUPING_AT_RULES.has(atName)) {
+      nodes.push({ type: "group", prelude, children: parseRules(body) });
+    } else if (atName) {
+      nodes.push({ type: "raw", text: prelude + "{" + compactCss(body) + "}" });
+    } else {
+      nodes.push({
+        type: "rule",
+        selectors: splitTopLevel(prelude, ",").map((text) => ({ text, parts: parseSelector(text) })),
+        body: compactCss(body),
+      });
+    }
+    cursor = close + 1;
+  }
+  return nodes;
+}
+
+function parseStylesheet(css) {
+  return parseRules(stripCssComments(css));
+}
+
+function compactCss(text) {
+  // Whitespace collapses to one space and disappears around punctuation; strings are kept intact.
+  let output = "";
+  let cursor = 0;
+  while (cursor < text.length) {
+    const char = text[cursor];
+    if (char === '"' || char === "'") {
+      const end = skipString(text, cursor);
+      output += text.slice(cursor, end);
+      cursor = end;
+    } else if (/\s/.test(char)) {
+      while (cursor < text.length && /\s/.test(text[cursor])) {
+        cursor += 1;
+      }
+      if (output && !/[{};:,]$/.test(output) && !/^[{};:,]/.test(text[cursor] || ";")) {
+        output += " ";
+      }
+    } else {
+      output += char;
+      cursor += 1;
+    }
+  }
+  return output.replace(/;+$/, "");
+}
+
+function readIdentifier(text, index) {
+  const match = /^(?:\\.|[\w-]|[^\x00-\x7f])+/.exec(text.slice(index));
+  return match ? match[0] : "";
+}
+
+function unescapeIdentifier(identifier) {
+  return identifier.replace(/\\(.)/g, "$1");
+}
+
+function parseSelector(text) {
+  // Left-to-right list of compounds; each carries the combinator joining it to the previous one.
+  const parts = [];
+  let compound = null;
+  let combinator = null;
+  let cursor = 0;
+  const current = () => compound || (compound = { tag: null, ids: [], classes: [], attributes: [], pseudos: [] });
+
+  while (cursor < text.length) {
+    const char = text[cursor];
+    if (/[\s>+~]/.test(char)) {
+      let symbol = " ";
+      while (cursor < text.length && /[\s>+~]/.test(text[cursor])) {
+        symbol = /\s/.test(text[cursor]) ? symbol : text[cursor];
+        cursor += 1;
+      }
+      if (compound) {
+        parts.push({ combinator, compound });
+        compound = null;
+      }
+      combinator = symbol;
+    } else if (char === "." || char === "#") {
+      const name = readIdentifier(text, cursor + 1);
+      current()[char === "." ? "classes" : "ids"].push(unescapeIdentifier(name));
+      cursor += 1 + name.length;
+    } else if (char === "[") {
+      const end = findOutside(text, cursor, ["]"]);
+      const inner = text.slice(cursor + 1, end === -1 ? text.length : end);
+      const match = /^\s*([\w-]+)\s*(?:([~|^$*]?=)\s*(?:"([^"]*)"|'([^']*)'|([^\s]+))\s*(i)?)?\s*$/i.exec(inner);
+      if (!match) {
+        throw new Error("Unsupported attribute selector: " + text);
+      }
+      current().attributes.push({
+        name: match[1].toLowerCase(),
+        operator: match[2] || null,
+        value: match[3] ?? match[4] ?? match[5] ?? null,
+      });
+      cursor = end === -1 ? text.length : end + 1;
+    } else if (char === ":") {
+      const element = text[cursor + 1] === ":";
+      const start = cursor + (element ? 2 : 1);
+      const name = readIdentifier(text, start).toLowerCase();
+      cursor = start + name.length;
+      let argument = null;
+      if (text[cursor] === "(") {
+        const close = findOutside(text, cursor + 1, [")"]);
+        argument = text.slice(cursor + 1, close);
+        cursor = close + 1;
+      }
+      current().pseudos.push({ name, argument, element: element || LEGACY_PSEUDO_ELEMENTS.has(name) });
+    } else if (char === "*") {
+      current().tag = "*";
+      cursor += 1;
+    } else {
+      const name = readIdentifier(text, cursor);
+      if (!name) {
+        throw new Error("Unsupported selector: " + text);
+      }
+      current().tag = name.toLowerCase();
+      cursor += name.length;
+    }
+  }
+  if (compound) {
+    parts.push({ combinator, compound });
+  }
+  return parts;
+}
+
+function matchesAttribute(selector, element) {
+  if (DYNAMIC_ATTRIBUTES.has(selector.name)) {
+    return true;
+  }
+  if (!element.attributes.has(selector.name)) {
+    return false;
+  }
+  const actual = element.attributes.get(selector.name);
+  const expected = selector.value;
+  switch (selector.operator) {
+    case null: return true;
+    case "=": return actual === expected;
+    case "~=": return actual.split(/\s+/).includes(expected);
+    case "|=": return actual === expected || actual.startsWith(expected + "-");
+    case "^=": return Boolean(expected) && actual.startsWith(expected);
+    case "$=": return Boolean(expected) && actual.endsWith(expected);
+    case "*=": return Boolean(expected) && actual.includes(expected);
+    default: return true;
+  }
+}
+
+function matchesPseudo(pseudo, element) {
+  if (pseudo.element || INTERACTION_PSEUDOS.has(pseudo.name)) {
+    return true;
+  }
+  const siblings = element.parent ? element.parent.children : [element];
+  const sameType = siblings.filter((sibling) => sibling.tag === element.tag);
+  switch (pseudo.name) {
+    case "root": return element.parent === null && element.tag === "html";
+    case "first-child": return siblings[0] === element;
+    case "last-child": return siblings[siblings.length - 1] === element;
+    case "only-child": return siblings.length === 1;
+    case "first-of-type": return sameType[0] === element;
+    case "last-of-type": return sameType[sameType.length - 1] === element;
+    case "only-of-type": return sameType.length === 1;
+    case "not": return !splitTopLevel(pseudo.argument || "", ",").some((text) => matchesSelector(parseSelector(text), element));
+    case "is":
+    case "where":
+    case "matches": return splitTopLevel(pseudo.argument || "", ",").some((text) => matchesSelector(parseSelector(text), element));
+    // nth-*, :empty, form state and anything unknown are kept rather than risk dropping a rule.
+    default: return true;
+  }
+}
+
+function matchesCompound(compound, element) {
+  return (
+    (!compound.tag || compound.tag === "*" || compound.tag === element.tag) &&
+    compound.ids.every((id) => element.id === id) &&
+    compound.classes.every((name) => element.classes.has(name)) &&
+    compound.attributes.every((attribute) => matchesAttribute(attribute, element)) &&
+    compound.pseudos.every((pseudo) => matchesPseudo(pseudo, element))
+  );
+}
+
+function matchesFrom(parts, index, element) {
+  if (!matchesCompound(parts[index].compound, element)) {
+    return false;
+  }
+  if (index === 0) {
+    return true;
+  }
+  const siblings = element.parent ? element.parent.children : [];
+  switch (parts[index].combinator) {
+    case ">":
+      return Boolean(element.parent) && matchesFrom(parts, index - 1, element.parent);
+    case "+":
+      return element.index > 0 && Boolean(siblings[element.index - 1]) && matchesFrom(parts, index - 1, siblings[element.index - 1]);
+    case "~":
+      return siblings.slice(0, element.index).some((sibling) => matchesFrom(parts, index - 1, sibling));
+    default:
+      for (let ancestor = element.parent; ancestor; ancestor = ancestor.parent) {
+        if (matchesFrom(parts, index - 1, ancestor)) {
+          return true;
+        }
+      }
+      return false;
+  }
+}
+
+function matchesSelector(parts, element) {
+  return parts.length > 0 && matchesFrom(parts, parts.length - 1, element);
+}
+
+function isInteractive(parts) {
+  return parts.some((part) => part.compound.pseudos.some((pseudo) => !pseudo.element && INTERACTION_PSEUDOS.has(pseudo.name)));
+}
+
+function selectRules(nodes, document) {
+  // Returns [pruned, critical] rule trees. A selector is used when it matches any element, and
+  // critical when it matches an element above the fold without needing interaction state.
+  const pruned = [];
+  const critical = [];
+  for (const node of nodes) {
+    if (node.type === "raw") {
+      pruned.push(node);
+      if (!node.text.startsWith("@import")) {
+        critical.push(node);
+      }
+    } else if (node.type === "group") {
+      const [groupPruned, groupCritical] = selectRules(node.children, document);
+      if (groupPruned.length) {
+        pruned.push({ ...node, children: groupPruned });
+      }
+      if (groupCritical.length) {
+        critical.push({ ...node, children: groupCritical });
+      }
+    } else {
+      const used = [];
+      const fold = [];
+      for (const selector of node.selectors) {
+        const matches = document.elements.filter((element) => matchesSelector(selector.parts, element));
+        if (matches.length) {
+          used.push(selector);
+          if (!isInteractive(selector.parts) && matches.some((element) => element.inFold)) {
+            fold.push(selector);
+          }
+        }
+      }
+      if (used.length) {
+        pruned.push({ ...node, selectors: used });
+      }
+      if (fold.length) {
+        critical.push({ ...node, selectors: fold });
+      }
+    }
+  }
+  return [pruned, critical];
+}
+
+function serializeRules(nodes) {
+  return nodes
+    .map((node) => {
+      if (node.type === "raw") {
+        return node.text;
+      }
+      if (node.type === "group") {
+        return node.prelude + "{" + serializeRules(node.children) + "}";
+      }
+      return node.selectors.map((selector) => selector.text.replace(/\s+/g, " ")).join(",") + "{" + node.body + "}";
+    })
+    .join("");
+}
+
+function rebaseUrls(css, fromFile, toFile) {
+  // Relative url() references are resolved against the original stylesheet and rewritten for the
+  // file the rules now live in (a pruned stylesheet elsewhere, or the page for inlined rules).
+  return css.replace(/url\(\s*(["']?)([^"')]+)\1\s*\)/g, (match, quote, url) => {
+    if (/^(?:[a-z][\w+.-]*:|\/|#)/i.test(url)) {
+      return match;
+    }
+    const target = path.posix.normalize(path.posix.join(path.posix.dirname(fromFile), url));
+    const rebased = path.posix.relative(path.posix.dirname(toFile), target) || path.posix.basename(target);
+    return "url(" + quote + rebased + quote + ")";
+  });
+}
+
+function extractCriticalCss(html, css, options = {}) {
+  const document = parseHtml(html, options.foldTextChars);
+  const [pruned, critical] = selectRules(typeof css === "string" ? parseStylesheet(css) : css, document);
+  return {
+    pruned: serializeRules(pruned) + "\n",
+    critical: serializeRules(critical),
+  };
+}
+
+function prunedSheetPath(htmlFile) {
+  const slug = htmlFile.replace(/(?:^|\/)index\.html$/, "").replace(/\.html$/, "").replace(/\//g, "-") || "index";
+  return PRUNED_CSS_DIR + "/" + slug + ".css";
+}
+
+function relativeHref(fromFile, toFile) {
+  return path.posix.relative(path.posix.dirname(fromFile), toFile);
+}
+
+function localStylesheet(tag, page, site) {
+  // The deploy-tree path of a <link rel="stylesheet"> tag's local stylesheet, or null.
+  const href = parseAttributes(tag.slice(5, -1)).get("href") || "";
+  if (/^(?:[a-z][\w+.-]*:|\/\/)/i.test(href)) {
+    return null;
+  }
+  const cssFile = path.posix.normalize(href.startsWith("/") ? href.slice(1) : path.posix.join(path.posix.dirname(page), href));
+  return site.has(cssFile) ? cssFile : null;
+}
+
+function pageStylesheets(html, page, site) {
+  return [...html.matchAll(STYLESHEET_LINK_PATTERN)].map((match) => localStylesheet(match[2], page, site)).filter(Boolean);
+}
+
+function criticalCssStage(options = {}) {
+  return {
+    name: "critical-css",
+    run(site) {
+      const stylesheets = new Map();
+      const emitted = new Map();
+      for (const file of site.htmlFiles()) {
+        const html = site.read(file);
+        const output = html.replace(STYLESHEET_LINK_PATTERN, (link, indent, tag) => {
+          const cssFile = localStylesheet(tag, file, site);
+          if (!cssFile) {
+            return link;
+          }
+          if (!stylesheets.has(cssFile)) {
+            stylesheets.set(cssFile, parseStylesheet(site.read(cssFile)));
+          }
+          const { pruned, critical } = extractCriticalCss(html, stylesheets.get(cssFile), options);
+
+          // Pages with the same selector usage (publication shards) share one pruned stylesheet.
+          const rebased = rebaseUrls(pruned, cssFile, prunedSheetPath(file));
+          const sheet = emitted.get(rebased) || prunedSheetPath(file);
+          if (!emitted.has(rebased)) {
+            emitted.set(rebased, sheet);
+            site.write(sheet, rebased);
+          }
+          const sheetHref = relativeHref(file, sheet);
+          const inline = rebaseUrls(critical, cssFile, file).replace(/<\//g, "<\\/");
+          const before = site.readBuffer(cssFile).length;
+          site.reportBytes("Render-blocking CSS for", file, before, Buffer.byteLength(inline));
+          site.reportBytes("Pruned " + cssFile + " for", file, before, Buffer.byteLength(rebased));
+          return (
+            indent + "<style>" + inline + "</style>\n" +
+            indent + '<link rel="preload" href="' + sheetHref + '" as="style" onload="this.onload=null;this.rel=\'stylesheet\'" />\n' +
+            indent + '<noscript><link rel="stylesheet" href="' + sheetHref + '" /></noscript>'
+          );
+        });
+        site.write(file, output);
+      }
+    },
+  };
+}
+
+module.exports = {
+  pageStylesheets,
+  parseHtml,
+  parseStylesheet,
+  parseSelector,
+  matchesSelector,
+  extractCriticalCss,
+  criticalCssStage,
+};
@@ -0,0 +1,172 @@
+"use strict";
+
+// The content editor's Git steps. Commands run as child processes without blocking the editor's
+// HTTP server, and each one reports its phase and Git's progress lines through `report`, which
+// the server forwards to the browser as Server-Sent Events.
+
+const fs = require("fs");
+const path = require("path");
+const { spawn } = require("child_process");
+
+const MAX_OUTPUT_BYTES = 10 * 1024 * 1024;
+
+function outputLines(text) {
+  // Git redraws progress in place with "\r"; each redraw counts as a line.
+  return text.split(/[\r\n]+/).map((line) => line.trim()).filter(Boolean);
+}
+
+function createGitSession(root, report = () => {}) {
+  function spawnCommand(command, args, phase) {
+    return new Promise((resolve, reject) => {
+      const child = spawn(command, args, { cwd: root, windowsHide: true });
+      const stdout = [];
+      let stdoutBytes = 0;
+      let stderr = "";
+      child.stdout.on("data", (chunk) => {
+        stdoutBytes += chunk.length;
+        if (stdoutBytes > MAX_OUTPUT_BYTES) {
+          child.kill();
+          reject(new Error(command + " " + args.join(" ") + " produced too much output."));
+          return;
+        }
+        stdout.push(chunk);
+      });
+      child.stderr.setEncoding("utf8");
+      child.stderr.on("data", (chunk) => {
+        stderr += chunk;
+        if (phase) {
+          outputLines(chunk).forEach((message) => report({ phase, message }));
+        }
+      });
+      child.on("error", reject);
+      child.on("close", (code) => resolve({ code, stdout: Buffer.concat(stdout).toString("utf8"), stderr }));
+    });
+  }
+
+  async function run(command, args, options = {}) {
+    // Git only reports transfer progress to a terminal unless asked with --progress.
+    const finalArgs = options.progress ? [args[0], "--progress", ...args.slice(1)] : args;
+    const result = await spawnCommand(command, finalArgs, options.phase);
+    if (result.code !== 0) {
+      const detail = outputLines(result.stderr).filter((line) => !/^(remote: )?[\w ]+: +\d+% /.test(line)).join("\n") || result.stdout.trim();
+      throw new Error(command + " " + args.join(" ") + " failed" + (detail ? ": " + detail : "."));
+    }
+    return result.stdout.trim();
+  }
+
+  function gitStatePath(name) {
+    return path.join(root, ".git", name);
+  }
+
+  function currentBranch() {
+    const head = fs.readFileSync(gitStatePath("HEAD"), "utf8").trim();
+    const prefix = "ref: refs/heads/";
+    return head.startsWith(prefix) ? head.slice(prefix.length) : "detached HEAD";
+  }
+
+  function hasUnfinishedGitOperation() {
+    return fs.existsSync(gitStatePath("MERGE_HEAD"))
+      || fs.existsSync(gitStatePath("REBASE_HEAD"))
+      || fs.existsSync(gitStatePath("rebase-apply"))
+      || fs.existsSync(gitStatePath("rebase-merge"));
+  }
+
+  async function ensureGitCanSync() {
+    if (hasUnfinishedGitOperation()) {
+      throw new Error("Git has an unfinished merge or rebase. Resolve it before publishing from the editor.");
+    }
+
+    const status = await run("git", ["status", "--porcelain"]);
+    if (status) {
+      throw new Error("Cannot update from GitHub because the working tree has uncommitted changes. Commit, stash, or discard those changes before publishing from the editor.");
+    }
+  }
+
+  async function abortRebaseIfNeeded() {
+    if (!fs.existsSync(gitStatePath("rebase-apply")) && !fs.existsSync(gitStatePath("rebase-merge"))) {
+      return;
+    }
+
+    const result = await spawnCommand("git", ["rebase", "--abort"]).catch((error) => ({ code: null, stderr: error.message, stdout: "" }));
+    if (result.code !== 0) {
+      throw new Error("Automatic rebase failed, and the editor could not abort it. " + (result.stderr || result.stdout).trim());
+    }
+  }
+
+  async function fetchOrigin() {
+    report({ phase: "fetch", message: "Fetching origin/main..." });
+    await run("git", ["fetch", "origin", "main"], { phase: "fetch", progress: true });
+  }
+
+  async function integrateOrigin() {
+    // Brings local main up to date with the last fetched origin/main.
+    const local = await run("git", ["rev-parse", "HEAD"]);
+    const remote = await run("git", ["rev-parse", "origin/main"]);
+    if (local === remote) {
+      return "up-to-date";
+    }
+
+    const base = await run("git", ["merge-base", "HEAD", "origin/main"]);
+    if (base === local) {
+      report({ phase: "sync", message: "Fast-forwarding to origin/main..." });
+      await run("git", ["merge", "--ff-only", "origin/main"]);
+      return "fast-forwarded";
+    }
+    if (base === remote) {
+      return "ahead";
+    }
+
+    try {
+      report({ phase: "sync", message: "Rebasing local commits onto origin/main..." });
+      await run("git", ["rebase", "origin/main"]);
+      return "rebased";
+    } catch (error) {
+      await abortRebaseIfNeeded();
+      throw new Error("GitHub has new commits, and the editor could not automatically rebase your local commits. Resolve the conflict manually, then publish again. " + error.message);
+    }
+  }
+
+  async function syncWithOrigin() {
+    await ensureGitCanSync();
+    await fetchOrigin();
+    return integrateOrigin();
+  }
+
+  async function hasChanges(files) {
+    const result = await spawnCommand("git", ["diff", "--quiet", "--", ...files]);
+    return result.code !== 0;
+  }
+
+  async function push() {
+    report({ phase: "push", message: "Pushing to origin/main..." });
+    await run("git", ["push", "origin", "main"], { phase: "push", progress: true });
+  }
+
+  async function pushToOrigin(commit) {
+    // Pushes on top of the fetch the publish started with; only a rejected push fetches again.
+    try {
+      await push();
+    } catch (error) {
+      report({ phase: "push", message: "GitHub rejected the push; syncing and retrying..." });
+      await syncWithOrigin();
+      try {
+        await push();
+      } catch (retryError) {
+        throw new Error("The update was committed locally as " + commit + ", but GitHub rejected the push after an automatic sync. " + retryError.message);
+      }
+    }
+  }
+
+  return {
+    run,
+    currentBranch,
+    ensureGitCanSync,
+    fetchOrigin,
+    integrateOrigin,
+    syncWithOrigin,
+    hasChanges,
+    pushToOrigin,
+  };
+}
+
+module.exports = { createGitSession };
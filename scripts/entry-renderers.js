@@ -0,0 +1,141 @@
+"use strict";
+
+// Renders one content entry to HTML. build-site.js joins these into CONTENT blocks and caches them
+// per entry; render-pool.js workers load only this module, not the whole build.
+
+const { drawSparklineSVG } = require("./citation-history");
+
+function escapeHtml(value) {
+  return String(value)
+    .replaceAll("&", "&amp;")
+    .replaceAll("<", "&lt;")
+    .replaceAll(">", "&gt;")
+    .replaceAll('"', "&quot;")
+    .replaceAll("'", "&#39;");
+}
+
+function requireArray(value, field) {
+  if (!Array.isArray(value) || value.length === 0) {
+    throw new Error(field + " must be a non-empty array.");
+  }
+  return value;
+}
+
+function formatDate(dateString) {
+  const date = new Date(dateString + "T00:00:00Z");
+  if (Number.isNaN(date.getTime())) {
+    throw new Error("citations.updatedAt must use YYYY-MM-DD format.");
+  }
+  return new Intl.DateTimeFormat("en-GB", { day: "numeric", month: "short", year: "numeric", timeZone: "UTC" }).format(date);
+}
+
+/* ---------- SKILLS (dense label + items) ---------- */
+function renderSkill(skill) {
+  requireArray(skill.items, "skills." + skill.title + ".items");
+  return [
+    '        <div class="skill">',
+    '          <span class="skill-label">' + escapeHtml(skill.title) + "</span>",
+    '          <span class="skill-items">' + skill.items.map(escapeHtml).join(" · ") + "</span>",
+    "        </div>",
+  ].join("\n");
+}
+
+/* ---------- PROJECTS (title + tag + link + desc) ---------- */
+function renderProject(p) {
+  const tag = p.tag ? ' <span class="tag">' + escapeHtml(p.tag) + "</span>" : "";
+  const link = p.url
+    ? '<a class="work-link" href="' + escapeHtml(p.url) + '" target="_blank" rel="noopener noreferrer">' +
+      escapeHtml(p.url.replace(/^https?:\/\/(www\.)?/, "").replace(/\/$/, "")) + "</a>"
+    : "";
+  return [
+    '        <article class="work-item">',
+    '          <div class="work-head">',
+    '            <span class="work-title">' + escapeHtml(p.title) + tag + "</span>",
+    "            " + link,
+    "          </div>",
+    '          <p class="work-desc">' + escapeHtml(p.description) + "</p>",
+    "        </article>",
+  ].join("\n");
+}
+
+/* ---------- NEWS (date + text, optional link) ---------- */
+function renderNewsItem(n) {
+  const text = escapeHtml(n.text);
+  const body = n.href
+    ? '<a class="ext" href="' + escapeHtml(n.href) + '" target="_blank" rel="noopener noreferrer">' + text + "</a>"
+    : text;
+  return [
+    '        <div class="news-item">',
+    '          <span class="news-date">' + escapeHtml(n.date) + "</span>",
+    '          <span class="news-text">' + body + "</span>",
+    "        </div>",
+  ].join("\n");
+}
+
+/* ---------- PUBLICATIONS (dense typographic) ---------- */
+function renderPublication(pub) {
+  const year = Number(pub.year);
+  if (!Number.isInteger(year) || year < 1900 || year > 2100) {
+    throw new Error('Invalid publication year for "' + pub.title + '".');
+  }
+  const cited = Number.isInteger(pub.citations) && pub.citations > 0
+    ? ' <span class="pub-cites" title="' + (pub.citationSource ? escapeHtml(pub.citationSource) + " citations" : "Citation count") + '">cited by ' +
+      pub.citations.toLocaleString("en-GB") + "</span>"
+    : "";
+  const venue = escapeHtml(pub.venuePrefix || "") +
+    "<b>" + escapeHtml(pub.venue) + "</b>" + escapeHtml(pub.details || ".") + cited;
+  return [
+    '      <article class="pub">',
+    '        <div class="pub-head">',
+    '          <a class="pub-title ext" href="' + escapeHtml(pub.url) +
+      '" target="_blank" rel="noopener noreferrer">' + escapeHtml(pub.title) + "</a>",
+    '          <span class="pub-year">' + year + "</span>",
+    "        </div>",
+    '        <div class="pub-authors">' + escapeHtml(pub.authors) + "</div>",
+    '        <div class="pub-venue">' + venue + "</div>",
+    "      </article>",
+  ].join("\n");
+}
+
+/* ---------- CITATIONS (compact metric + history sparkline) ---------- */
+function renderCitations(citations) {
+  const total = Number(citations.totalCitations);
+  if (!Number.isInteger(total) || total < 0) {
+    throw new Error("citations.totalCitations must be a non-negative integer.");
+  }
+  const updated = formatDate(citations.updatedAt);
+  const formattedTotal = total.toLocaleString("en-GB");
+  const history = citations.history || [];
+  const sparkline = drawSparklineSVG(history);
+  const trend = sparkline
+    ? "; " + history[0].total.toLocaleString("en-GB") + " on " + formatDate(history[0].date)
+    : "";
+  return [
+    '        <a class="metric" href="' + escapeHtml(citations.profileUrl) + '"',
+    '           target="_blank" rel="noopener noreferrer"',
+    '           aria-label="' + formattedTotal + " total citations, updated " + updated + escapeHtml(trend) + '">',
+    "          <b>" + formattedTotal + '</b> citations · Google Scholar<br>updated <time datetime="' + escapeHtml(citations.updatedAt) + '">' + updated + "</time>",
+    ...(sparkline ? ["          " + sparkline] : []),
+    "        </a>",
+  ].join("\n");
+}
+
+// The entry renderer for each content section, keyed as PAGES blocks name their sections.
+const ENTRY_RENDERERS = {
+  skills: renderSkill,
+  projects: renderProject,
+  news: renderNewsItem,
+  publications: renderPublication,
+  citations: renderCitations,
+};
+
+module.exports = {
+  ENTRY_RENDERERS,
+  escapeHtml,
+  requireArray,
+  renderSkill,
+  renderProject,
+  renderNewsItem,
+  renderPublication,
+  renderCitations,
+};
@@ -1,31 +1,59 @@
 #!/usr/bin/env node
 /**
- * Generate GitHub contributions calendar SVGs (light & dark)
- * - Adds month labels & weekday hints
- * - Improved light/dark palettes with better low-activity contrast
- * - Subtle background tint + rounded corners
- * - Caption (bottom-right)
- * - <title> on each day cell for tooltips
+ * Generate the GitHub contributions calendar SVG
+ * - One file for both themes: palettes are CSS custom properties, switched by
+ *   prefers-color-scheme, or by the page's data-theme when the SVG is inlined
+ * - Each contribution level is drawn as one merged path
+ * - Month labels & weekday hints, rounded card, caption (bottom-right)
+ * - Optional compact tooltip layer (<title> per active day)
+ * - Daily counts are kept in an append-only NDJSON store; only days since the
+ *   last stored one (and always the trailing week) are queried, and the SVG is
+ *   only rewritten when it changes
+ * - Batch mode: several accounts and/or calendar years in one run, over a
+ *   keep-alive connection pool with capped in-flight queries and rate-limit backoff
+ *
+ * Args (override the env):
+ *   --login a,b      one or more GitHub usernames (repeatable)
+ *   --years 2024,25  render these calendar years instead of the rolling past year
+ *   --out DIR        output dir
+ *   --store PATH     contribution store; with several logins, "-<login>" is added per account
+ *   --title TEXT     accessible name of the SVG (the year is appended for --years)
+ *   --concurrency N  queries in flight at once (default 4)
+ *
+ * Output: github-activity[-<login> if several][-<year> with --years].svg
  *
  * Env:
- *   GH_TOKEN  (required) GitHub token with public read
- *   LOGIN     (required) GitHub username (e.g., "evanniko1")
- *   OUT_DIR   (optional) output dir, default: "images"
+ *   GH_TOKEN    (required unless replaying fixtures) GitHub token with public read
+ *   LOGIN       (required) GitHub username (e.g., "evanniko1")
+ *   OUT_DIR     (optional) output dir, default: "images"
+ *   STORE_PATH  (optional) contribution store, default: "content/gh-contributions.ndjson"
+ *   TOOLTIPS    (optional) "1" to add per-day tooltips (only shown when inlined)
+ *   GH_FIXTURES (optional) directory of recorded API responses to replay instead of the network
+ *   GH_RECORD   (optional) directory to save API responses in, for later replay
+ *   GH_API      (optional) GraphQL endpoint, default: "https://api.github.com/graphql"
  */
 
+const crypto = require("crypto");
 const fs = require("fs");
+const http = require("http");
+const https = require("https");
 const path = require("path");
 
 const GH_TOKEN = process.env.GH_TOKEN;
 const LOGIN = process.env.LOGIN;
 const OUT_DIR = process.env.OUT_DIR || "images";
+const STORE_PATH = process.env.STORE_PATH || path.join("content", "gh-contributions.ndjson");
+const TOOLTIPS = process.env.TOOLTIPS === "1";
+const GH_FIXTURES = process.env.GH_FIXTURES;
+const GH_RECORD = process.env.GH_RECORD;
+const OUT_NAME = "github-activity.svg";
 
-if (!GH_TOKEN || !LOGIN) {
-  console.error("Missing GH_TOKEN or LOGIN in env.");
-  process.exit(1);
-}
-
-const API = "https://api.github.com/graphql";
+const API = process.env.GH_API || "https://api.github.com/graphql";
+const DEFAULT_CONCURRENCY = 4;
+const MAX_RETRIES = 5;
+const BASE_DELAY_MS = 1000;      // first backoff step when GitHub gives no hint
+const MAX_WAIT_MS = 15 * 60 * 1000; // give up rather than wait longer than this for a reset
+const RETRY_STATUSES = new Set([429, 502, 503, 504]);
 const WIDTH_WEEKS = 53; // GitHub returns up to 53 columns
 const CELL = 12;        // cell size
 const GAP = 2;          // gap between cells
@@ -33,41 +61,41 @@ const PAD_LEFT = 28;    // room for weekday labels
 const PAD_TOP = 24;     // room for month labels
 const PAD_RIGHT = 14;
 const PAD_BOTTOM = 28;  // room for caption
-const RADIUS = 3;
 
 const THEMES = {
   light: {
-    name: "light",
     bg: "#F7FAF9",
     card: "#FFFFFF",
     cardBorder: "#E5EFEA",
-    text: "#1F2D2A",
     textMuted: "#4C615D",
     // more neutral “0” bucket for definition
     levels: ["#DCE7E5", "#A9DDD4", "#6FC8BE", "#35B1A1", "#00897B"],
-    gridDot: "rgba(0,0,0,0.08)",
   },
   dark: {
-    name: "dark",
     bg: "#0D1117",
     card: "#0B1514",
     cardBorder: "#16302C",
-    text: "#E6F2EF",
     textMuted: "#9FB6B1",
     levels: ["#19332F", "#0D5D54", "#0E8B7E", "#21B7A8", "#4FE2D2"],
-    gridDot: "rgba(255,255,255,0.08)",
   },
 };
+const FONT = "ui-sans-serif,system-ui,-apple-system,Segoe UI,Roboto,Ubuntu,Cantarell,Noto Sans,Helvetica Neue,Arial";
+
+const DAY_MS = 24 * 60 * 60 * 1000;
+// contributionsCollection spans at most one year; an older store falls back to the default window.
+const MAX_INCREMENTAL_DAYS = 360;
+// GitHub can credit contributions days late (pushed history, newly linked emails, repositories
+// made public), so the trailing days are queried again on every run.
+const REFRESH_DAYS = 7;
 
-// GraphQL pulls last 52 weeks of contributions (plus partial current)
+// GraphQL pulls daily counts from $from (last stored day, or Jan 1 of a requested year) to $to or
+// now; without $from, the past year.
 const GQL = `
-query($login:String!){
+query($login:String!,$from:DateTime,$to:DateTime){
   user(login:$login){
-    contributionsCollection{
+    contributionsCollection(from:$from,to:$to){
       contributionCalendar{
-        totalContributions
         weeks{
-          firstDay
           contributionDays{
             date
             contributionCount
@@ -79,27 +107,207 @@ query($login:String!){
 }
 `;
 
-async function ghQuery(query, variables) {
-  const res = await fetch(API, {
-    method: "POST",
-    headers: {
-      "Authorization": `Bearer ${GH_TOKEN}`,
-      "Content-Type": "application/json",
-      "User-Agent": "gh-contribs-svg"
-    },
-    body: JSON.stringify({ query, variables }),
-  });
-  if (!res.ok) {
-    const text = await res.text();
-    throw new Error(`GitHub API error ${res.status}: ${text}`);
-  }
-  const json = await res.json();
+function responseData(json) {
   if (json.errors) {
     throw new Error("GraphQL errors: " + JSON.stringify(json.errors));
   }
   return json.data;
 }
 
+function fixtureName(variables) {
+  const window = variables.from ? variables.from.slice(0, 10) + (variables.to ? "-" + variables.to.slice(0, 10) : "") : "year";
+  return `${variables.login}-${window}.json`;
+}
+
+function retryDelay(response, attempt, now) {
+  // Secondary limits send retry-after; an exhausted primary limit sends remaining=0 and the reset
+  // time (epoch seconds). Anything else retryable backs off exponentially.
+  if (response.headers["retry-after"] !== undefined) {
+    return Number(response.headers["retry-after"]) * 1000;
+  }
+  if (response.headers["x-ratelimit-remaining"] === "0" && response.headers["x-ratelimit-reset"]) {
+    return Math.max(0, Number(response.headers["x-ratelimit-reset"]) * 1000 - now);
+  }
+  return BASE_DELAY_MS * 2 ** attempt;
+}
+
+function createClient(options = {}) {
+  // One keep-alive agent per run, so batch queries reuse a few TLS connections; at most
+  // `concurrency` queries are in flight, and a drained rate limit pauses all of them.
+  const endpoint = new URL(options.api || API);
+  const transport = endpoint.protocol === "http:" ? http : https;
+  const concurrency = options.concurrency || DEFAULT_CONCURRENCY;
+  const agent = new transport.Agent({ keepAlive: true, maxSockets: concurrency });
+  const sleep = options.sleep || ((ms) => new Promise((resolve) => setTimeout(resolve, ms)));
+  const maxRetries = options.maxRetries ?? MAX_RETRIES;
+  const maxWaitMs = options.maxWaitMs ?? MAX_WAIT_MS;
+  const stats = { requests: 0, retries: 0, waitedMs: 0 };
+  const queue = [];
+  let active = 0;
+  let pausedUntil = 0;
+
+  const acquire = () => (active < concurrency ? (active++, Promise.resolve()) : new Promise((resolve) => queue.push(resolve)));
+  const release = () => (queue.length ? queue.shift()() : active--);
+  const wait = async (ms) => {
+    stats.waitedMs += ms;
+    await sleep(ms);
+  };
+
+  const post = (body) =>
+    new Promise((resolve, reject) => {
+      const request = transport.request(endpoint, {
+        method: "POST",
+        agent,
+        headers: {
+          "Authorization": `Bearer ${options.token}`,
+          "Content-Type": "application/json",
+          "Content-Length": Buffer.byteLength(body),
+          "User-Agent": "gh-contribs-svg",
+        },
+      }, (response) => {
+        const chunks = [];
+        response.on("data", (chunk) => chunks.push(chunk));
+        response.on("end", () => resolve({ status: response.statusCode, headers: response.headers, text: Buffer.concat(chunks).toString("utf8") }));
+        response.on("error", reject);
+      });
+      request.on("error", reject);
+      request.end(body);
+    });
+
+  async function query(gql, variables) {
+    await acquire();
+    try {
+      for (let attempt = 0; ; attempt++) {
+        if (pausedUntil > Date.now()) {
+          await wait(pausedUntil - Date.now());
+        }
+        stats.requests += 1;
+        const response = await post(JSON.stringify({ query: gql, variables }));
+        const json = response.status === 200 ? JSON.parse(response.text) : null;
+        // A 403 is only retried when it is a rate limit, not a permissions problem.
+        const limited = json
+          ? (json.errors || []).some((error) => error.type === "RATE_LIMITED")
+          : RETRY_STATUSES.has(response.status) ||
+            (response.status === 403 && (response.headers["retry-after"] !== undefined || response.headers["x-ratelimit-remaining"] === "0"));
+        if (json && !limited) {
+          if (response.headers["x-ratelimit-remaining"] === "0") {
+            pausedUntil = Math.max(pausedUntil, Number(response.headers["x-ratelimit-reset"]) * 1000);
+          }
+          if (options.record) {
+            fs.mkdirSync(options.record, { recursive: true });
+            fs.writeFileSync(path.join(options.record, fixtureName(variables)), JSON.stringify(json, null, 2) + "\n", "utf8");
+          }
+          return responseData(json);
+        }
+        const delay = limited ? retryDelay(response, attempt, Date.now()) : null;
+        if (delay === null || attempt >= maxRetries || delay > maxWaitMs) {
+          const reason = delay > maxWaitMs ? ` (rate limit resets in ${Math.ceil(delay / 1000)}s)` : "";
+          throw new Error(`GitHub API error ${response.status}${reason}: ${response.text}`);
+        }
+        stats.retries += 1;
+        pausedUntil = Math.max(pausedUntil, Date.now() + delay);
+        await wait(delay);
+      }
+    } finally {
+      release();
+    }
+  }
+
+  return { query, stats, close: () => agent.destroy() };
+}
+
+function fixtureQuery(dir) {
+  // Replays responses saved by GH_RECORD, keyed by login and query window.
+  return async (query, variables) => {
+    const file = path.join(dir, fixtureName(variables));
+    if (!fs.existsSync(file)) {
+      throw new Error(`No recorded response for ${variables.login} from ${variables.from || "the past year"}: ${file}`);
+    }
+    return responseData(JSON.parse(fs.readFileSync(file, "utf8")));
+  };
+}
+
+/* ---------- CONTRIBUTION STORE (append-only NDJSON, one {date,count} per line) ---------- */
+function readStore(file) {
+  // Later lines win, so a day whose count changed is simply appended again.
+  const days = new Map();
+  let lines = 0;
+  if (fs.existsSync(file)) {
+    for (const line of fs.readFileSync(file, "utf8").split("\n")) {
+      if (!line.trim()) continue;
+      const { date, count } = JSON.parse(line);
+      days.set(date, count);
+      lines += 1;
+    }
+  }
+  return { file, days, lines };
+}
+
+function mergeIntoStore(store, fetchedDays) {
+  // Days without contributions are not stored (a missing day reads as 0), so a quiet day leaves
+  // the store, and therefore the repository, untouched.
+  const changed = fetchedDays.filter(({ date, contributionCount }) => (store.days.get(date) || 0) !== contributionCount);
+  if (changed.length === 0) {
+    return 0;
+  }
+  for (const { date, contributionCount } of changed) {
+    store.days.set(date, contributionCount);
+  }
+  fs.mkdirSync(path.dirname(store.file), { recursive: true });
+  if (store.lines + changed.length > 2 * store.days.size) {
+    // Compact once superseded lines outnumber live ones.
+    const live = [...store.days].filter(([, count]) => count > 0).sort(([a], [b]) => (a < b ? -1 : 1));
+    store.days = new Map(live);
+    store.lines = live.length;
+    fs.writeFileSync(store.file, live.map(([date, count]) => JSON.stringify({ date, count }) + "\n").join(""), "utf8");
+  } else {
+    store.lines += changed.length;
+    fs.appendFileSync(store.file, changed.map(({ date, contributionCount }) => JSON.stringify({ date, count: contributionCount }) + "\n").join(""), "utf8");
+  }
+  return changed.length;
+}
+
+function lastStoredDay(store) {
+  let last = null;
+  for (const date of store.days.keys()) {
+    if (!last || date > last) last = date;
+  }
+  return last;
+}
+
+function isoDay(ms) {
+  return new Date(ms).toISOString().slice(0, 10);
+}
+
+function calendarFromStore(store, endDate, startDate) {
+  // Sunday-first weeks in the API response's shape. Without startDate: 53 weeks through the end
+  // of endDate's week, with later days drawn empty, so the image only changes when a count does
+  // (or weekly). With startDate: exactly the days from startDate to endDate (a calendar year).
+  const end = Date.parse(endDate + "T00:00:00Z");
+  const lastSaturday = end + (6 - new Date(end).getUTCDay()) * DAY_MS;
+  const start = startDate ? Date.parse(startDate + "T00:00:00Z") : null;
+  const firstSunday = startDate ? start - new Date(start).getUTCDay() * DAY_MS : lastSaturday - (WIDTH_WEEKS * 7 - 1) * DAY_MS;
+  const weeks = [];
+  let total = 0;
+  for (let week = 0; firstSunday + week * 7 * DAY_MS <= lastSaturday; week++) {
+    const contributionDays = [];
+    for (let day = 0; day < 7; day++) {
+      const time = firstSunday + (week * 7 + day) * DAY_MS;
+      if (startDate && (time < start || time > end)) continue;
+      const date = isoDay(time);
+      const contributionCount = store.days.get(date) || 0;
+      total += contributionCount;
+      contributionDays.push({ date, contributionCount });
+    }
+    weeks.push({ firstDay: contributionDays[0].date, contributionDays });
+  }
+  return { user: { contributionsCollection: { contributionCalendar: { totalContributions: total, weeks } } } };
+}
+
+function sha256(data) {
+  return crypto.createHash("sha256").update(data).digest("hex");
+}
+
 function monthShortName(dateStr) {
   const d = new Date(dateStr);
   return d.toLocaleString("en", { month: "short" });
@@ -110,6 +318,10 @@ function weekdayLetter(rowIdx) {
   return map[rowIdx] || "";
 }
 
+function escapeXml(value) {
+  return String(value).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/"/g, "&quot;");
+}
+
 function bucket(count) {
   if (count <= 0) return 0;
   if (count <= 2) return 1;
@@ -118,19 +330,67 @@ function bucket(count) {
   return 4;
 }
 
-function svgRect(x, y, w, h, rx, fill, extra = "") {
-  return `<rect x="${x}" y="${y}" width="${w}" height="${h}" rx="${rx}" fill="${fill}" ${extra}/>`;
+function themeVars(theme) {
+  const vars = [
+    `--gh-bg:${theme.bg}`,
+    `--gh-card:${theme.card}`,
+    `--gh-border:${theme.cardBorder}`,
+    `--gh-text:${theme.textMuted}`,
+    ...theme.levels.map((color, level) => `--gh-${level}:${color}`),
+  ];
+  return vars.join(";");
+}
+
+function themedStyle(selector, varsFor) {
+  // Light by default, dark under prefers-color-scheme. When the SVG is inlined into a page, the
+  // page's data-theme (set by the theme toggle) wins over the OS preference.
+  return [
+    `${selector}{${varsFor(THEMES.light)}}`,
+    `@media (prefers-color-scheme:dark){${selector}{${varsFor(THEMES.dark)}}}`,
+    `:root[data-theme="light"] ${selector}{${varsFor(THEMES.light)}}`,
+    `:root[data-theme="dark"] ${selector}{${varsFor(THEMES.dark)}}`,
+  ];
+}
+
+function calendarStyle() {
+  return [
+    ...themedStyle(".gh-cal", themeVars),
+    `.gh-cal .bg{fill:var(--gh-bg)}`,
+    `.gh-cal .card{fill:var(--gh-card);stroke:var(--gh-border)}`,
+    `.gh-cal text{fill:var(--gh-text);font-family:${FONT};font-size:10px}`,
+    `.gh-cal .wd{font-size:9px}`,
+    `.gh-cal .cap{text-anchor:end;opacity:.75}`,
+    // A CELL/2 square stroked CELL/2 wide with round joins is a CELL square with CELL/4 corners.
+    `.gh-cal .d{stroke-width:${CELL / 2};stroke-linejoin:round}`,
+    ...THEMES.light.levels.map((_, level) => `.gh-cal .l${level}{fill:var(--gh-${level});stroke:var(--gh-${level})}`),
+    `.gh-cal .tips rect{fill:transparent}`,
+  ].join("");
 }
 
-function svgText(txt, x, y, fill, size = 10, extra = "") {
-  return `<text x="${x}" y="${y}" fill="${fill}" font-family="ui-sans-serif, system-ui, -apple-system, Segoe UI, Roboto, Ubuntu, Cantarell, Noto Sans, Helvetica Neue, Arial" font-size="${size}" ${extra}>${txt}</text>`;
+function levelPath(cells) {
+  // One subpath per cell; each move is relative to the previous cell's start.
+  const inset = CELL / 4;
+  const side = CELL / 2;
+  let previous = null;
+  return cells
+    .map(({ x, y }) => {
+      const move = previous ? `m${x - previous.x} ${y - previous.y}` : `M${x + inset} ${y + inset}`;
+      previous = { x, y };
+      return `${move}h${side}v${side}h-${side}z`;
+    })
+    .join("");
 }
 
-function drawCalendarSVG(data, theme) {
+function drawCalendarSVG(data, options = {}) {
+  const login = options.login || LOGIN;
+  const tooltips = options.tooltips ?? TOOLTIPS;
+  const title = options.title || `GitHub contributions calendar for ${login}`;
+  const period = options.period || "past year";
   const weeks = data.user.contributionsCollection.contributionCalendar.weeks;
   const total = data.user.contributionsCollection.contributionCalendar.totalContributions;
 
-  const cols = Math.min(weeks.length, WIDTH_WEEKS);
+  // 53 columns, or 54 for a leap year that starts on a Saturday.
+  const cols = weeks.length;
   const rows = 7;
 
   const width = PAD_LEFT + cols * (CELL + GAP) - GAP + PAD_RIGHT;
@@ -147,92 +407,208 @@ function drawCalendarSVG(data, theme) {
     }
   }
 
-  // Background + card
-  let parts = [];
-  parts.push(
-    `<svg xmlns="http://www.w3.org/2000/svg" width="${width}" height="${height}" viewBox="0 0 ${width} ${height}" role="img" aria-label="GitHub contributions calendar for ${LOGIN}">`,
-    // outer bg (helps in dark embeds)
-    svgRect(0, 0, width, height, 10, theme.bg),
-    // card
-    svgRect(0.5, 0.5, width - 1, height - 1, 10, theme.card, `stroke="${theme.cardBorder}" stroke-width="1"`),
-  );
+  const parts = [
+    `<svg xmlns="http://www.w3.org/2000/svg" class="gh-cal" width="${width}" height="${height}" viewBox="0 0 ${width} ${height}" role="img" aria-label="${escapeXml(title)}">`,
+    `<style>${calendarStyle()}</style>`,
+    // outer bg (helps in dark embeds) + card
+    `<rect class="bg" width="${width}" height="${height}" rx="10"/>`,
+    `<rect class="card" x="0.5" y="0.5" width="${width - 1}" height="${height - 1}" rx="10"/>`,
+  ];
 
   // Month labels
   monthLabels.forEach(({ col, text }) => {
-    const x = PAD_LEFT + col * (CELL + GAP);
-    const y = PAD_TOP - 8;
-    parts.push(svgText(text, x, y, theme.textMuted, 10, 'text-rendering="geometricPrecision"'));
+    parts.push(`<text x="${PAD_LEFT + col * (CELL + GAP)}" y="${PAD_TOP - 8}">${text}</text>`);
   });
 
-  // Weekday labels (M W F)
+  // Weekday labels (M W F), vertically centred on their row
   for (let r = 0; r < rows; r++) {
     const letter = weekdayLetter(r);
-    if (!letter) continue;
-    const x = 8;
-    // vertical center of row cell
-    const y = PAD_TOP + r * (CELL + GAP) + CELL - 2;
-    parts.push(svgText(letter, x, y, theme.textMuted, 9, 'text-rendering="geometricPrecision"'));
+    if (letter) {
+      parts.push(`<text class="wd" x="8" y="${PAD_TOP + r * (CELL + GAP) + CELL - 2}">${letter}</text>`);
+    }
   }
 
-  // Grid cells
+  // Grid cells, grouped by level. Rows follow the weekday, so a partial first week lines up.
+  const levels = THEMES.light.levels.map(() => []);
+  const tips = [];
   for (let c = 0; c < cols; c++) {
-    const week = weeks[c];
-    for (let r = 0; r < rows; r++) {
-      const day = week.contributionDays[r];
-      if (!day) continue;
-      const { date, contributionCount } = day;
-      const b = bucket(contributionCount);
-      const color = theme.levels[b];
-
+    for (const { date, contributionCount } of weeks[c].contributionDays) {
       const x = PAD_LEFT + c * (CELL + GAP);
-      const y = PAD_TOP + r * (CELL + GAP);
-
-      const title = `${date}: ${contributionCount} contribution${contributionCount === 1 ? "" : "s"}`;
-      parts.push(
-        `<g>`,
-        `<title>${title}</title>`,
-        svgRect(x, y, CELL, CELL, RADIUS, color),
-        `</g>`
-      );
+      const y = PAD_TOP + new Date(date + "T00:00:00Z").getUTCDay() * (CELL + GAP);
+      levels[bucket(contributionCount)].push({ x, y });
+      if (tooltips && contributionCount > 0) {
+        tips.push(`<rect x="${x}" y="${y}" width="${CELL}" height="${CELL}"><title>${date}: ${contributionCount}</title></rect>`);
+      }
+    }
+  }
+  levels.forEach((cells, level) => {
+    if (cells.length) {
+      parts.push(`<path class="d l${level}" d="${levelPath(cells)}"/>`);
     }
+  });
+  if (tips.length) {
+    parts.push(`<g class="tips">${tips.join("")}</g>`);
   }
 
   // Caption (bottom-right)
-  const caption = `@${LOGIN} — past year total: ${total}`;
-  parts.push(
-    svgText(caption, width - PAD_RIGHT - 8, height - 10, theme.textMuted, 10, 'text-anchor="end" opacity="0.75"')
-  );
+  parts.push(`<text class="cap" x="${width - PAD_RIGHT - 8}" y="${height - 10}">@${login} — ${period} total: ${total}</text>`);
 
   parts.push(`</svg>`);
-  return parts.join("\n");
+  return parts.join("\n") + "\n";
 }
 
-async function main() {
-  const data = await ghQuery(GQL, { login: LOGIN });
+async function generate(options) {
+  const { login, outDir, year, title, tooltips, query, now = new Date() } = options;
+  const store = options.store || readStore(options.storePath);
+  const today = now.toISOString().slice(0, 10);
+  let variables;
+  if (year) {
+    variables = { login, from: `${year}-01-01T00:00:00Z`, to: `${year}-12-31T23:59:59Z` };
+  } else {
+    const last = lastStoredDay(store);
+    const incremental = last && Date.parse(today) - Date.parse(last) <= MAX_INCREMENTAL_DAYS * DAY_MS;
+    const refreshFrom = isoDay(Date.parse(today) - REFRESH_DAYS * DAY_MS);
+    variables = incremental ? { login, from: (last < refreshFrom ? last : refreshFrom) + "T00:00:00Z" } : { login };
+  }
+  const data = await query(GQL, variables);
 
   // basic sanity checks
   const weeks = data?.user?.contributionsCollection?.contributionCalendar?.weeks;
-  if (!weeks || !Array.isArray(weeks) || weeks.length < 4) {
-    throw new Error("Unexpected contributions data shape from GitHub API.");
+  if (!Array.isArray(weeks) || weeks.length === 0) {
+    throw new Error(`Unexpected contributions data shape from GitHub API for ${login}.`);
   }
+  const fetchedDays = weeks.flatMap((week) => week.contributionDays);
+  const appended = mergeIntoStore(store, fetchedDays);
+
+  let calendar;
+  if (year) {
+    calendar = calendarFromStore(store, `${year}-12-31`, `${year}-01-01`);
+  } else {
+    // GitHub dates follow the profile's time zone, so the API can already be on tomorrow.
+    const latest = fetchedDays.reduce((max, { date }) => (date > max ? date : max), today);
+    calendar = calendarFromStore(store, latest);
+  }
+  const svg = drawCalendarSVG(calendar, {
+    login,
+    tooltips,
+    title: title && (year ? `${title} (${year})` : title),
+    period: year ? String(year) : "past year",
+  });
+  const outPath = path.join(outDir, options.outName || OUT_NAME);
+  const written = !fs.existsSync(outPath) || sha256(fs.readFileSync(outPath)) !== sha256(svg);
+  if (written) {
+    fs.mkdirSync(outDir, { recursive: true });
+    fs.writeFileSync(outPath, svg, "utf8");
+  }
+  return { login, year: year || null, from: variables.from || null, fetchedDays: fetchedDays.length, appended, outPath, written };
+}
 
-  // Ensure out dir exists
-  fs.mkdirSync(OUT_DIR, { recursive: true });
+function outputName(login, year, perLogin) {
+  return "github-activity" + (perLogin ? "-" + login : "") + (year ? "-" + year : "") + ".svg";
+}
 
-  // Generate light & dark
-  const lightSvg = drawCalendarSVG(data, THEMES.light);
-  const darkSvg = drawCalendarSVG(data, THEMES.dark);
+function storePathFor(storePath, login, perLogin) {
+  return perLogin ? storePath.replace(/(\.[^./\\]+)?$/, `-${login}$1`) : storePath;
+}
 
-  const lightPath = path.join(OUT_DIR, "github-activity-light.svg");
-  const darkPath = path.join(OUT_DIR, "github-activity-dark.svg");
+async function generateAll(options) {
+  // Every (login, year) calendar is requested at once; the client caps what is actually in flight.
+  // Calendars of one login share its store, so concurrent merges never overwrite each other.
+  const { logins, years = [], storePath } = options;
+  const perLogin = logins.length > 1;
+  const stores = new Map(logins.map((login) => [login, readStore(storePathFor(storePath, login, perLogin))]));
+  const jobs = logins.flatMap((login) => (years.length ? years : [null]).map((year) => ({ login, year })));
+  return Promise.all(jobs.map(({ login, year }) =>
+    generate({ ...options, login, year, store: stores.get(login), outName: outputName(login, year, perLogin) })
+  ));
+}
 
-  fs.writeFileSync(lightPath, lightSvg, "utf8");
-  fs.writeFileSync(darkPath, darkSvg, "utf8");
+const ARGUMENTS = ["--login", "--years", "--out", "--store", "--title", "--concurrency"];
 
-  console.log(`Wrote: ${lightPath}, ${darkPath}`);
+function parseArgs(argv) {
+  const parsed = { login: [], years: [] };
+  for (let index = 0; index < argv.length; index++) {
+    const [name, inline] = argv[index].split(/=(.*)/s);
+    if (!ARGUMENTS.includes(name)) {
+      throw new Error(`Unknown argument ${argv[index]}. Expected: ${ARGUMENTS.join(", ")}.`);
+    }
+    const value = inline ?? argv[++index];
+    if (value === undefined || value === "") {
+      throw new Error(`${name} needs a value.`);
+    }
+    const key = name.slice(2);
+    if (Array.isArray(parsed[key])) {
+      parsed[key].push(...value.split(",").map((item) => item.trim()).filter(Boolean));
+    } else {
+      parsed[key] = value;
+    }
+  }
+  for (const year of parsed.years) {
+    if (!/^\d{4}$/.test(year)) {
+      throw new Error(`--years expects four-digit years, got ${year}.`);
+    }
+  }
+  if (parsed.concurrency !== undefined) {
+    parsed.concurrency = Number(parsed.concurrency);
+    if (!Number.isInteger(parsed.concurrency) || parsed.concurrency < 1) {
+      throw new Error("--concurrency must be a positive integer.");
+    }
+  }
+  return parsed;
 }
 
-main().catch((err) => {
-  console.error(err);
-  process.exit(1);
-});
+async function main() {
+  const args = parseArgs(process.argv.slice(2));
+  const logins = args.login.length ? args.login : LOGIN ? [LOGIN] : [];
+  if ((!GH_TOKEN && !GH_FIXTURES) || logins.length === 0) {
+    throw new Error("Missing GH_TOKEN or LOGIN in env.");
+  }
+  const client = GH_FIXTURES ? null : createClient({ token: GH_TOKEN, concurrency: args.concurrency, record: GH_RECORD });
+  try {
+    const results = await generateAll({
+      logins,
+      years: args.years.map(Number),
+      outDir: args.out || OUT_DIR,
+      storePath: args.store || STORE_PATH,
+      title: args.title,
+      tooltips: TOOLTIPS,
+      query: client ? client.query : fixtureQuery(GH_FIXTURES),
+    });
+    for (const result of results) {
+      const window = result.year ? String(result.year) : result.from ? "since " + result.from.slice(0, 10) : "for the past year";
+      console.log(
+        `@${result.login}: fetched ${result.fetchedDays} days ${window}; ${result.appended} stored; ` +
+        (result.written ? `wrote ${result.outPath}.` : `${result.outPath} unchanged; not rewritten.`)
+      );
+    }
+    if (client) {
+      const { requests, retries, waitedMs } = client.stats;
+      console.log(`${requests} API request(s), ${retries} retried, ${Math.round(waitedMs / 1000)}s waiting on rate limits.`);
+    }
+  } finally {
+    if (client) client.close();
+  }
+}
+
+if (require.main === module) {
+  main().catch((err) => {
+    console.error(err);
+    process.exit(1);
+  });
+}
+
+module.exports = {
+  THEMES,
+  bucket,
+  calendarFromStore,
+  createClient,
+  drawCalendarSVG,
+  escapeXml,
+  fixtureName,
+  fixtureQuery,
+  generate,
+  generateAll,
+  parseArgs,
+  readStore,
+  themedStyle,
+};
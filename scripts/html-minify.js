@@ -0,0 +1,56 @@
+"use strict";
+
+// <script> (inline, external and JSON-LD), <style>, <pre> and <textarea> bodies are copied verbatim.
+const PROTECTED_PATTERN = /<(script|style|pre|textarea)\b[^>]*>[\s\S]*?<\/\1\s*>/gi;
+// Comments are dropped except generated-block markers and conditional comments.
+const COMMENT_PATTERN = /<!--(?!\s*CONTENT:[A-Z0-9_]+:(?:START|END)\s*-->|\[if)[\s\S]*?-->/g;
+const TAG_PATTERN = /(<[^>]*>)/;
+
+function collapseWhitespace(text) {
+  // A run of whitespace becomes one newline if it crossed a line, otherwise one space, so output
+  // keeps one element per line (readable diffs) without the indentation.
+  return text.replace(/\s+/g, (run) => (run.includes("\n") ? "\n" : " "));
+}
+
+function minifyTag(tag) {
+  // Whitespace between attributes is collapsed; quoted attribute values are left untouched.
+  return tag.replace(/("[^"]*"|'[^']*')|\s+/g, (match, quoted) => quoted || " ");
+}
+
+function minifyMarkup(markup) {
+  return markup
+    .replace(COMMENT_PATTERN, "")
+    .split(TAG_PATTERN)
+    .map((part, index) => (index % 2 === 1 ? minifyTag(part) : collapseWhitespace(part)))
+    .join("");
+}
+
+function minifyHtml(html) {
+  const parts = [];
+  let cursor = 0;
+  for (const match of html.matchAll(PROTECTED_PATTERN)) {
+    parts.push(minifyMarkup(html.slice(cursor, match.index)), match[0]);
+    cursor = match.index + match[0].length;
+  }
+  parts.push(minifyMarkup(html.slice(cursor)));
+  return parts.join("").trim() + "\n";
+}
+
+function minifyStage() {
+  return {
+    name: "minify",
+    run(site) {
+      for (const file of site.htmlFiles()) {
+        const before = site.read(file);
+        const after = minifyHtml(before);
+        site.write(file, after);
+        site.reportBytes("Minified", file, Buffer.byteLength(before), Buffer.byteLength(after));
+      }
+    },
+  };
+}
+
+module.exports = {
+  minifyHtml,
+  minifyStage,
+};
@@ -0,0 +1,161 @@
+"use strict";
+
+const path = require("path");
+
+// SVGs at or under this size are inlined; larger ones stay separate (cacheable) requests unless the
+// <img> carries data-inline.
+const DEFAULT_MAX_BYTES = 10 * 1024;
+const IMG_PATTERN = /<img\b(?:[^>"']|"[^"]*"|'[^']*')*>/gi;
+const ATTRIBUTE_PATTERN = /([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?/g;
+const SVG_ROOT_PATTERN = /<svg\b((?:[^>"']|"[^"]*"|'[^']*')*)>([\s\S]*)<\/svg\s*>/i;
+// Image attributes that only make sense for a fetched resource.
+const DROPPED_IMG_ATTRIBUTES = new Set(["src", "srcset", "sizes", "alt", "loading", "decoding", "fetchpriority", "crossorigin", "data-inline"]);
+
+function parseAttributes(source) {
+  const attributes = new Map();
+  for (const match of source.matchAll(ATTRIBUTE_PATTERN)) {
+    const value = match[2] ?? match[3] ?? match[4];
+    attributes.set(match[1], value === undefined ? null : value);
+  }
+  return attributes;
+}
+
+function serializeAttributes(attributes) {
+  return [...attributes]
+    .map(([name, value]) => " " + (value === null ? name : name + '="' + String(value).replace(/"/g, "&quot;") + '"'))
+    .join("");
+}
+
+function parseSvg(source, file) {
+  const cleaned = source.replace(/<\?xml[\s\S]*?\?>|<!DOCTYPE[^>]*>|<!--[\s\S]*?-->/gi, "");
+  const match = SVG_ROOT_PATTERN.exec(cleaned);
+  if (!match || /<script\b|<foreignObject\b/i.test(cleaned)) {
+    return null;
+  }
+  const attributes = parseAttributes(match[1]);
+  if (!attributes.has("viewBox") && attributes.has("width") && attributes.has("height")) {
+    attributes.set("viewBox", "0 0 " + parseFloat(attributes.get("width")) + " " + parseFloat(attributes.get("height")));
+  }
+  return { file, attributes, body: match[2].trim() };
+}
+
+function scopeIds(body, prefix) {
+  // ids inside an inlined SVG share the page's id space, so each file gets its own prefix.
+  const ids = [...body.matchAll(/\sid="([^"]+)"/g)].map((match) => match[1]);
+  let scoped = body;
+  for (const id of ids) {
+    const escaped = id.replace(/[.*+?^${}()|[\]\\]/g, "\\$&");
+    scoped = scoped
+      .replace(new RegExp('(\\sid=")' + escaped + '"', "g"), "$1" + prefix + "-" + id + '"')
+      .replace(new RegExp('((?:xlink:)?href="#)' + escaped + '"', "g"), "$1" + prefix + "-" + id + '"')
+      .replace(new RegExp("url\\(#" + escaped + "\\)", "g"), "url(#" + prefix + "-" + id + ")");
+  }
+  return scoped;
+}
+
+function svgSlug(file) {
+  return "svg-" + file.replace(/\.svg$/i, "").replace(/[^a-zA-Z0-9]+/g, "-").replace(/^-|-$/g, "");
+}
+
+function outerAttributes(svg, img) {
+  // The <img>'s class, size and accessible name carry over to the element that replaces it.
+  const attributes = new Map([["xmlns", "http://www.w3.org/2000/svg"]]);
+  for (const name of ["class", "width", "height", "viewBox", "preserveAspectRatio"]) {
+    if (svg.attributes.has(name)) {
+      attributes.set(name, svg.attributes.get(name));
+    }
+  }
+  for (const [name, value] of img) {
+    if (name === "class") {
+      attributes.set("class", [svg.attributes.get("class"), value].filter(Boolean).join(" "));
+    } else if (!DROPPED_IMG_ATTRIBUTES.has(name)) {
+      attributes.set(name, value);
+    }
+  }
+  const label = img.get("alt");
+  if (label) {
+    attributes.set("role", "img");
+    attributes.set("aria-label", label);
+  } else {
+    attributes.set("aria-hidden", "true");
+  }
+  return attributes;
+}
+
+function inlineSvgStage(options = {}) {
+  const maxBytes = options.maxBytes ?? DEFAULT_MAX_BYTES;
+  return {
+    name: "inline-svg",
+    run(site) {
+      const parsed = new Map();
+      const loadSvg = (file) => {
+        if (!parsed.has(file)) {
+          parsed.set(file, { bytes: site.readBuffer(file).length, svg: parseSvg(site.read(file), file) });
+        }
+        return parsed.get(file);
+      };
+
+      let requestsSaved = 0;
+      let pagesChanged = 0;
+      for (const page of site.htmlFiles()) {
+        const html = site.read(page);
+        const uses = [];
+        for (const match of html.matchAll(IMG_PATTERN)) {
+          const img = parseAttributes(match[0].slice(4).replace(/\/?>$/, ""));
+          const src = img.get("src") || "";
+          if (!/\.svg$/i.test(src) || /^(?:[a-z][\w+.-]*:|\/\/)/i.test(src)) {
+            continue;
+          }
+          const file = path.posix.normalize(src.startsWith("/") ? src.slice(1) : path.posix.join(path.posix.dirname(page), src));
+          const loaded = site.has(file) && loadSvg(file);
+          // data-inline marks SVGs that must follow the page, such as the theme-aware activity calendar.
+          const svg = loaded && (loaded.bytes <= maxBytes || img.has("data-inline")) ? loaded.svg : null;
+          if (svg) {
+            uses.push({ match, img, svg });
+          }
+        }
+        if (uses.length === 0) {
+          continue;
+        }
+
+        // A file used once is inlined in place; one used several times becomes a <symbol> in a
+        // page-level sprite, and each use a small <svg><use>.
+        const counts = new Map();
+        uses.forEach(({ svg }) => counts.set(svg.file, (counts.get(svg.file) || 0) + 1));
+        const symbols = new Map();
+        let output = html;
+        for (const { match, img, svg } of uses.reverse()) {
+          const slug = svgSlug(svg.file);
+          const attributes = outerAttributes(svg, img);
+          let markup;
+          if (counts.get(svg.file) > 1) {
+            if (!symbols.has(slug)) {
+              const viewBox = svg.attributes.get("viewBox");
+              symbols.set(slug, '<symbol id="' + slug + '"' + (viewBox ? ' viewBox="' + viewBox + '"' : "") + ">" + scopeIds(svg.body, slug) + "</symbol>");
+            }
+            markup = "<svg" + serializeAttributes(attributes) + '><use href="#' + slug + '"/></svg>';
+          } else {
+            markup = "<svg" + serializeAttributes(attributes) + ">" + scopeIds(svg.body, slug) + "</svg>";
+          }
+          output = output.slice(0, match.index) + markup + output.slice(match.index + match[0].length);
+        }
+        if (symbols.size) {
+          const sprite =
+            '\n<svg xmlns="http://www.w3.org/2000/svg" width="0" height="0" style="position:absolute" aria-hidden="true">' +
+            [...symbols.values()].join("") + "</svg>";
+          output = output.replace(/<body\b[^>]*>/i, (body) => body + sprite);
+        }
+        site.write(page, output);
+        site.reportBytes("Inlined " + uses.length + " SVG request(s) into", page, Buffer.byteLength(html), Buffer.byteLength(output));
+        requestsSaved += uses.length;
+        pagesChanged += 1;
+      }
+      console.log("SVG inlining removed " + requestsSaved + " request(s) across " + pagesChanged + " page(s) (threshold " + maxBytes + " bytes).");
+    },
+  };
+}
+
+module.exports = {
+  DEFAULT_MAX_BYTES,
+  inlineSvgStage,
+};
@@ -0,0 +1,100 @@
+"use strict";
+
+const fs = require("fs");
+
+// Generated blocks sit between <!-- CONTENT:NAME:START --> and <!-- CONTENT:NAME:END --> comments.
+const MARKER_PATTERN = /<!-- CONTENT:([A-Z0-9_]+):(START|END) -->/g;
+const BLOCK_CLOSE = "\n        ";
+const compiledTemplates = new Map();
+
+function readTemplate(filePath) {
+  return fs.readFileSync(filePath, "utf8").replaceAll("\r\n", "\n");
+}
+
+function compileTemplate(html, label) {
+  // A page is parsed once into static chunks around named slots. statics[i + 1] starts at the END
+  // marker of slots[i], and each slot keeps its current body for blocks a build does not render.
+  const statics = [];
+  const slots = [];
+  let open = null;
+  let cursor = 0;
+  for (const match of html.matchAll(MARKER_PATTERN)) {
+    const [marker, name, kind] = match;
+    if (kind === "START") {
+      if (open) {
+        throw new Error("CONTENT:" + name + " starts inside the unclosed " + open.name + " block in " + label + ".");
+      }
+      if (slots.some((slot) => slot.name === name)) {
+        throw new Error("Duplicate " + name + " content markers in " + label + ".");
+      }
+      open = { name, contentStart: match.index + marker.length };
+      statics.push(html.slice(cursor, open.contentStart));
+    } else {
+      if (!open || open.name !== name) {
+        throw new Error("Unexpected " + name + " end marker in " + label + ".");
+      }
+      slots.push({ name, body: html.slice(open.contentStart, match.index) });
+      cursor = match.index;
+      open = null;
+    }
+  }
+  if (open) {
+    throw new Error("Missing " + open.name + " end marker in " + label + ".");
+  }
+  statics.push(html.slice(cursor));
+  return { label, statics, slots };
+}
+
+function requireSlots(compiled, names) {
+  for (const name of names) {
+    if (!compiled.slots.some((slot) => slot.name === name)) {
+      throw new Error("Missing or invalid " + name + " content markers in " + compiled.label + ".");
+    }
+  }
+}
+
+function renderTemplate(compiled, values) {
+  const parts = [compiled.statics[0]];
+  compiled.slots.forEach((slot, index) => {
+    parts.push(Object.hasOwn(values, slot.name) ? "\n" + values[slot.name] + BLOCK_CLOSE : slot.body);
+    parts.push(compiled.statics[index + 1]);
+  });
+  const html = parts.join("");
+  return html.endsWith("\n") ? html : html + "\n";
+}
+
+function stampMatches(entry, stat) {
+  return entry && entry.size === stat.size && entry.mtimeMs === stat.mtimeMs;
+}
+
+function loadTemplate(filePath, label) {
+  // Compiled pages are reused for as long as the file on disk is the one last read or written,
+  // so repeated builds in one process (watch mode, the editor) never re-parse an unchanged page.
+  const cached = compiledTemplates.get(filePath);
+  if (stampMatches(cached, fs.statSync(filePath))) {
+    return cached;
+  }
+  const html = readTemplate(filePath);
+  return rememberTemplate(filePath, compileTemplate(html, label), html);
+}
+
+function isTemplateCurrent(filePath) {
+  return fs.existsSync(filePath) && stampMatches(compiledTemplates.get(filePath), fs.statSync(filePath));
+}
+
+function rememberTemplate(filePath, compiled, html) {
+  const stat = fs.statSync(filePath);
+  const entry = { compiled, html, size: stat.size, mtimeMs: stat.mtimeMs };
+  compiledTemplates.set(filePath, entry);
+  return entry;
+}
+
+module.exports = {
+  readTemplate,
+  compileTemplate,
+  requireSlots,
+  renderTemplate,
+  loadTemplate,
+  isTemplateCurrent,
+  rememberTemplate,
+};
@@ -0,0 +1,211 @@
+"use strict";
+
+const fs = require("fs");
+const path = require("path");
+const { renderTemplate } = require("./page-template");
+
+const DEFAULT_PAGE_SIZE = 25;
+const DEFAULT_FIRST_PAGE_BYTES = 48 * 1024;
+const PAGER_NEIGHBOURS = 2;
+const SHARD_MARKER = "<!-- CONTENT:PUBLICATIONS:START -->";
+// sitemap.xml <url> entries, and the locs of generated shard pages among them.
+const SITEMAP_ENTRY_PATTERN = /[ \t]*<url>[\s\S]*?<\/url>\n/g;
+const SHARD_LOC_PATTERN = /<loc>[^<]*\/publications\/(?:\d{4}\/(?:page\/\d+\/)?|page\/\d+\/)<\/loc>/;
+const SHARD_PRIORITY = "0.5";
+// Relative href/src values: anything without a URL scheme, a leading slash or a fragment.
+const RELATIVE_URL_PATTERN = /\b(href|src)="(?![a-z][a-z0-9+.-]*:|\/|#)([^"]*)"/gi;
+
+function relocateTemplate(compiled, shard) {
+  // Shard pages live deeper than publications/index.html, so relative URLs gain "../" per extra
+  // level, and the canonical URL, og:url and <title> name the shard.
+  const prefix = "../".repeat(shard.dir.split("/").filter(Boolean).length);
+  const statics = compiled.statics.map((chunk) => chunk
+    .replace(RELATIVE_URL_PATTERN, (match, attribute, url) => attribute + '="' + prefix + url + '"')
+    .replace(/(rel="canonical" href="|property="og:url" content=")([^"]*)"/g, (match, attribute, url) => attribute + url + shard.dir + '"')
+    .replace("<title>", "<title>" + shard.title + " · "));
+  return { ...compiled, statics };
+}
+
+function shardHref(fromDir, toDir) {
+  const relative = path.posix.relative("/" + fromDir, "/" + toDir);
+  return (relative ? relative + "/" : "") + "index.html";
+}
+
+function pagerWindow(current, count) {
+  // Page numbers to link from `current`: the first, the last and PAGER_NEIGHBOURS either side,
+  // with null where numbers are skipped. The nav stays the same size however many pages there are.
+  const numbers = [];
+  for (let number = 1; number <= count; number += 1) {
+    if (number === 1 || number === count || Math.abs(number - current) <= PAGER_NEIGHBOURS) {
+      numbers.push(number);
+    } else if (numbers[numbers.length - 1] !== null) {
+      numbers.push(null);
+    }
+  }
+  return numbers;
+}
+
+function pagerLinks(sequence, current, link) {
+  // `current` is 0 on a page outside the sequence: its window starts from page 1, without
+  // previous and next links.
+  const pager = pagerWindow(current || 1, sequence.length).map((number) => (number === null
+    ? '<span class="pub-pages-gap" aria-hidden="true">…</span>'
+    : link(sequence[number - 1], number, null, number === current)));
+  if (current > 1) {
+    pager.unshift(link(sequence[current - 2], "Previous", "prev"));
+  }
+  if (current && current < sequence.length) {
+    pager.push(link(sequence[current], "Next", "next"));
+  }
+  return pager;
+}
+
+function renderNav(shard, pages, years) {
+  const link = (target, text, rel, current) => '<a href="' + shardHref(shard.dir, target.dir) + '"' +
+    (rel ? ' rel="' + rel + '"' : "") + (current ? ' aria-current="page"' : "") + ">" + text + "</a>";
+  // Year pages sit outside the numbered sequence; a year with more than one page gets its own pager.
+  const year = shard.year ? years.find((candidate) => candidate.year === shard.year) : null;
+  return [
+    '        <nav class="pub-pages" aria-label="Publication pages">',
+    '          <span class="pub-pages-label">Page</span> ' + pagerLinks(pages, shard.number || 0, link).join(" "),
+    '          <span class="pub-pages-label">Year</span> ' + years.map((candidate) => link(candidate, candidate.year, null, candidate === year)).join(" "),
+    ...(year && year.pages.length > 1
+      ? ['          <span class="pub-pages-label">' + year.year + "</span> " + pagerLinks(year.pages, shard.yearNumber, link).join(" ")]
+      : []),
+    "        </nav>",
+  ].join("\n");
+}
+
+function layoutShards(publications, firstCount, pageSize) {
+  const pages = [{ dir: "", title: "Page 1", number: 1, indexes: [] }];
+  const years = new Map();
+  publications.forEach((pub, index) => {
+    const pageNumber = index < firstCount ? 1 : 2 + Math.floor((index - firstCount) / pageSize);
+    if (!pages[pageNumber - 1]) {
+      pages.push({ dir: "page/" + pageNumber + "/", title: "Page " + pageNumber, number: pageNumber, indexes: [] });
+    }
+    pages[pageNumber - 1].indexes.push(index);
+    const year = Number(pub.year);
+    if (!years.has(year)) {
+      years.set(year, { dir: year + "/", year, indexes: [], pages: [] });
+    }
+    years.get(year).indexes.push(index);
+  });
+  // Each year is cut into pages of the same size: publications/2024/, publications/2024/page/2/, …
+  for (const year of years.values()) {
+    for (let start = 0; start < year.indexes.length; start += pageSize) {
+      const yearNumber = year.pages.length + 1;
+      year.pages.push({
+        dir: year.dir + (yearNumber > 1 ? "page/" + yearNumber + "/" : ""),
+        title: year.year + (yearNumber > 1 ? " · Page " + yearNumber : ""),
+        year: year.year,
+        yearNumber,
+        indexes: year.indexes.slice(start, start + pageSize),
+      });
+    }
+  }
+  return { pages, years: [...years.values()].sort((a, b) => b.year - a.year) };
+}
+
+function renderShard(compiled, shard, layout, fragments, blocks) {
+  const list = shard.indexes.map((index) => fragments[index]).join("\n");
+  const nav = renderNav(shard, layout.pages, layout.years);
+  return renderTemplate(shard.dir ? relocateTemplate(compiled, shard) : compiled, { ...blocks, PUBLICATIONS: list + "\n" + nav });
+}
+
+function planPublicationShards(compiled, publications, fragments, options, blocks = {}) {
+  // The first page takes as many entries (up to pageSize) as fit under firstPageBytes; the rest
+  // follow on fixed-size numbered pages, and every year also gets its own pages of that size.
+  const total = publications.length;
+  const fits = (count) => {
+    const layout = layoutShards(publications, count, options.pageSize);
+    return Buffer.byteLength(renderShard(compiled, layout.pages[0], layout, fragments, blocks)) <= options.firstPageBytes;
+  };
+  let low = 1;
+  let high = Math.min(options.pageSize, total);
+  while (low < high) {
+    const middle = Math.ceil((low + high) / 2);
+    if (fits(middle)) {
+      low = middle;
+    } else {
+      high = middle - 1;
+    }
+  }
+
+  const layout = layoutShards(publications, low, options.pageSize);
+  return [...layout.pages, ...layout.years.flatMap((year) => year.pages)].map((shard) => ({
+    dir: shard.dir,
+    title: shard.title,
+    html: renderShard(compiled, shard, layout, fragments, blocks),
+  }));
+}
+
+function existingShardFiles(publicationsDir) {
+  const files = [];
+  const collect = (dir, pattern) => {
+    if (!fs.existsSync(dir)) {
+      return;
+    }
+    for (const name of fs.readdirSync(dir)) {
+      const filePath = path.join(dir, name, "index.html");
+      if (pattern.test(name) && fs.existsSync(filePath)) {
+        files.push(filePath);
+      }
+    }
+  };
+  collect(publicationsDir, /^\d{4}$/);
+  collect(path.join(publicationsDir, "page"), /^\d+$/);
+  if (fs.existsSync(publicationsDir)) {
+    for (const name of fs.readdirSync(publicationsDir).filter((candidate) => /^\d{4}$/.test(candidate))) {
+      collect(path.join(publicationsDir, name, "page"), /^\d+$/);
+    }
+  }
+  return files;
+}
+
+function removeStaleShards(publicationsDir, keep) {
+  // Only generated shard pages (they carry the PUBLICATIONS marker) are ever deleted.
+  const removed = [];
+  for (const filePath of existingShardFiles(publicationsDir)) {
+    if (keep.has(filePath) || !fs.readFileSync(filePath, "utf8").includes(SHARD_MARKER)) {
+      continue;
+    }
+    fs.rmSync(filePath);
+    for (let dir = path.dirname(filePath); dir !== publicationsDir && fs.readdirSync(dir).length === 0; dir = path.dirname(dir)) {
+      fs.rmdirSync(dir);
+    }
+    removed.push(filePath);
+  }
+  return removed;
+}
+
+function syncSitemap(sitemapPath, dirs) {
+  // Lists the shard pages (dirs relative to publications/) right after the /publications/ entry,
+  // with its lastmod and changefreq, and drops shard entries that are no longer built. Returns
+  // whether the file changed.
+  const xml = fs.readFileSync(sitemapPath, "utf8");
+  const publications = [...xml.matchAll(SITEMAP_ENTRY_PATTERN)].find((match) => /<loc>[^<]*\/publications\/<\/loc>/.test(match[0]));
+  if (!publications) {
+    throw new Error(sitemapPath + " has no /publications/ entry to list the publication pages after.");
+  }
+  const base = /<loc>([^<]*)<\/loc>/.exec(publications[0])[1];
+  const entries = dirs.map((dir) => publications[0]
+    .replace(/<loc>[^<]*<\/loc>/, "<loc>" + base + dir + "</loc>")
+    .replace(/<priority>[^<]*<\/priority>/, "<priority>" + SHARD_PRIORITY + "</priority>"));
+  const output = xml
+    .replace(SITEMAP_ENTRY_PATTERN, (entry) => (SHARD_LOC_PATTERN.test(entry) ? "" : entry))
+    .replace(publications[0], () => publications[0] + entries.join(""));
+  if (output === xml) {
+    return false;
+  }
+  fs.writeFileSync(sitemapPath, output, "utf8");
+  return true;
+}
+
+module.exports = {
+  DEFAULT_PAGE_SIZE,
+  DEFAULT_FIRST_PAGE_BYTES,
+  planPublicationShards,
+  removeStaleShards,
+  syncSitemap,
+};
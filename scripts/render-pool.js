@@ -0,0 +1,106 @@
+"use strict";
+
+const os = require("os");
+const { once } = require("events");
+const { performance } = require("perf_hooks");
+const { Worker, isMainThread, parentPort, workerData } = require("worker_threads");
+
+// Chunks smaller than this cost more to post to a worker than to render in place.
+const MIN_CHUNK_ENTRIES = 200;
+// Starting a worker and loading the renderers takes tens of milliseconds, about as long as rendering
+// ten thousand entries serially, so smaller builds render faster on the main thread.
+const PARALLEL_MIN_ENTRIES = 10000;
+
+function defaultPoolSize() {
+  return typeof os.availableParallelism === "function" ? os.availableParallelism() : os.cpus().length;
+}
+
+function countEntries(sections) {
+  return sections.reduce((sum, { entries }) => sum + entries.length, 0);
+}
+
+function poolPaysOff(sections, poolSize = defaultPoolSize()) {
+  return poolSize > 1 && countEntries(sections) >= PARALLEL_MIN_ENTRIES;
+}
+
+function splitIntoTasks(sections, poolSize) {
+  // Entries of all sections, in order, are cut into roughly one equal chunk per worker. A task
+  // holds one piece per section it spans, so small sections share a task instead of each paying
+  // for a round trip to a worker.
+  const chunkSize = Math.max(MIN_CHUNK_ENTRIES, Math.ceil(countEntries(sections) / poolSize));
+  const tasks = [];
+  let task = null;
+  let taskEntries = 0;
+  sections.forEach(({ section, entries }, sectionIndex) => {
+    for (let start = 0; start < entries.length;) {
+      if (!task || taskEntries === chunkSize) {
+        task = [];
+        taskEntries = 0;
+        tasks.push(task);
+      }
+      const end = Math.min(entries.length, start + chunkSize - taskEntries);
+      task.push({ sectionIndex, section, entries: entries.slice(start, end) });
+      taskEntries += end - start;
+      start = end;
+    }
+  });
+  return tasks;
+}
+
+async function renderSectionsInParallel(sections, poolSize = defaultPoolSize()) {
+  // Renders [{ section, entries }] on a worker pool and returns each section's HTML, joined in
+  // entry order exactly as the serial renderers join it, plus the pool size and wall time for the build log.
+  const started = performance.now();
+  const tasks = splitIntoTasks(sections, poolSize);
+  const workers = Array.from(
+    { length: Math.max(1, Math.min(poolSize, tasks.length)) },
+    () => new Worker(__filename, { workerData: { renderPool: true } })
+  );
+  const results = new Array(tasks.length);
+  let nextTask = 0;
+
+  async function drain(worker) {
+    while (nextTask < tasks.length) {
+      const index = nextTask;
+      nextTask += 1;
+      worker.postMessage(tasks[index].map(({ section, entries }) => ({ section, entries })));
+      const [reply] = await once(worker, "message");
+      if (reply.error) {
+        throw new Error(reply.error);
+      }
+      results[index] = reply.html;
+    }
+  }
+
+  try {
+    await Promise.all(workers.map(drain));
+  } finally {
+    await Promise.all(workers.map((worker) => worker.terminate()));
+  }
+
+  const parts = sections.map(() => []);
+  tasks.forEach((task, index) => task.forEach((piece, pieceIndex) => parts[piece.sectionIndex].push(results[index][pieceIndex])));
+  return {
+    html: parts.map((sectionParts) => sectionParts.join("\n")),
+    stats: { workers: workers.length, tasks: tasks.length, wallMs: performance.now() - started },
+  };
+}
+
+if (!isMainThread && workerData && workerData.renderPool) {
+  const { ENTRY_RENDERERS } = require("./entry-renderers");
+  parentPort.on("message", (pieces) => {
+    try {
+      const html = pieces.map(({ section, entries }) => entries.map((entry) => ENTRY_RENDERERS[section](entry)).join("\n"));
+      parentPort.postMessage({ html });
+    } catch (error) {
+      parentPort.postMessage({ error: error.message });
+    }
+  });
+}
+
+module.exports = {
+  PARALLEL_MIN_ENTRIES,
+  defaultPoolSize,
+  poolPaysOff,
+  renderSectionsInParallel,
+};
@@ -0,0 +1,305 @@
+"use strict";
+
+const crypto = require("crypto");
+const fs = require("fs");
+const path = require("path");
+const { pageStylesheets, parseStylesheet } = require("./critical-css");
+
+const IMAGE_PATTERN = /<picture\b[\s\S]*?<\/picture\s*>|<img\b(?:[^>"']|"[^"]*"|'[^']*')*>/gi;
+const ATTRIBUTE_PATTERN = /([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?/g;
+const RASTER_SOURCE = /^(?!(?:[a-z][\w+.-]*:|\/\/))[^?#]+\.(jpe?g|png|webp)$/i;
+// Rendered-size multiples covered by srcset (1x, 1.5x, 2x and 3x displays).
+const DENSITIES = [1, 1.5, 2, 3];
+// Used when an <img> has no width attribute to size against.
+const DEFAULT_WIDTHS = [480, 960, 1440, 1920];
+// Modern formats first; the last entry of each list is the <img> fallback.
+const FORMATS = {
+  jpeg: ["avif", "webp", "jpeg"],
+  png: ["avif", "webp", "png"],
+  webp: ["avif", "webp"],
+};
+const ENCODER_OPTIONS = {
+  avif: { quality: 50, effort: 4 },
+  webp: { quality: 75 },
+  jpeg: { quality: 78, progressive: true, mozjpeg: true },
+  png: { compressionLevel: 9, palette: true },
+};
+const EXTENSIONS = { avif: "avif", webp: "webp", jpeg: "jpg", png: "png" };
+
+function imageSize(buffer) {
+  // Header-only size detection for the raster formats the site ships, so intrinsic dimensions are
+  // available even without an encoder installed.
+  if (buffer.length > 24 && buffer.readUInt32BE(0) === 0x89504e47) {
+    return { format: "png", width: buffer.readUInt32BE(16), height: buffer.readUInt32BE(20) };
+  }
+  if (buffer.length > 30 && buffer.toString("latin1", 0, 4) === "RIFF" && buffer.toString("latin1", 8, 12) === "WEBP") {
+    const chunk = buffer.toString("latin1", 12, 16);
+    if (chunk === "VP8 ") {
+      return { format: "webp", width: buffer.readUInt16LE(26) & 0x3fff, height: buffer.readUInt16LE(28) & 0x3fff };
+    }
+    if (chunk === "VP8L") {
+      const bits = buffer.readUInt32LE(21);
+      return { format: "webp", width: (bits & 0x3fff) + 1, height: ((bits >>> 14) & 0x3fff) + 1 };
+    }
+    if (chunk === "VP8X") {
+      return { format: "webp", width: buffer.readUIntLE(24, 3) + 1, height: buffer.readUIntLE(27, 3) + 1 };
+    }
+  }
+  if (buffer.length > 4 && buffer.readUInt16BE(0) === 0xffd8) {
+    let cursor = 2;
+    while (cursor + 9 < buffer.length) {
+      if (buffer[cursor] !== 0xff) {
+        break;
+      }
+      const marker = buffer[cursor + 1];
+      if (marker === 0xff) {
+        cursor += 1;
+        continue;
+      }
+      if (marker >= 0xc0 && marker <= 0xcf && ![0xc4, 0xc8, 0xcc].includes(marker)) {
+        return { format: "jpeg", width: buffer.readUInt16BE(cursor + 7), height: buffer.readUInt16BE(cursor + 5) };
+      }
+      cursor += 2 + buffer.readUInt16BE(cursor + 2);
+    }
+  }
+  throw new Error("Unrecognised image data.");
+}
+
+function loadSharpEncoder() {
+  // sharp is an optional dependency: the deploy workflow installs it, local builds may not.
+  let sharp;
+  try {
+    sharp = require("sharp");
+  } catch (error) {
+    if (error.code === "MODULE_NOT_FOUND") {
+      return null;
+    }
+    throw error;
+  }
+  return {
+    name: "sharp",
+    encode: (input, width, format) =>
+      sharp(input).rotate().resize({ width, withoutEnlargement: true }).toFormat(format, ENCODER_OPTIONS[format]).toBuffer(),
+  };
+}
+
+function parseAttributes(source) {
+  const attributes = new Map();
+  for (const match of source.matchAll(ATTRIBUTE_PATTERN)) {
+    const value = match[2] ?? match[3] ?? match[4];
+    attributes.set(match[1].toLowerCase(), value === undefined ? null : value);
+  }
+  return attributes;
+}
+
+function serializeAttributes(attributes) {
+  return [...attributes]
+    .map(([name, value]) => (value === null ? name : name + '="' + String(value).replace(/"/g, "&quot;") + '"'))
+    .join(" ");
+}
+
+function variantWidths(size, attributes) {
+  // Widths follow the rendered box. For a box with a different aspect ratio than the image
+  // (object-fit: cover), the height decides how wide the drawn image is.
+  const boxWidth = Number(attributes.get("width"));
+  const boxHeight = Number(attributes.get("height"));
+  if (!boxWidth) {
+    const widths = DEFAULT_WIDTHS.filter((width) => width < size.width);
+    return { widths: [...widths, size.width], sizes: "100vw", base: Math.min(size.width, DEFAULT_WIDTHS[1]) };
+  }
+  const base = Math.round(Math.max(boxWidth, boxHeight ? (boxHeight * size.width) / size.height : 0));
+  const widths = [...new Set(DENSITIES.map((density) => Math.min(size.width, Math.round(base * density))))];
+  return { widths, sizes: Math.min(base, size.width) + "px", base };
+}
+
+function slotSizes(stylesheets, attributes) {
+  // The image's CSS slot widths, from px widths set on one of its classes: media-query overrides
+  // first, the later one first as in the cascade, then the unconditional width. Null without one.
+  const classes = (attributes.get("class") || "").split(/\s+/).filter(Boolean).map((name) => "." + name);
+  const conditional = [];
+  let base = null;
+  const visit = (nodes, condition) => {
+    for (const node of nodes) {
+      if (node.type === "group" && condition === null && /^@media\b/i.test(node.prelude)) {
+        visit(node.children, node.prelude.slice("@media".length).trim());
+      } else if (node.type === "rule" && node.selectors.some((selector) => classes.includes(selector.text))) {
+        const width = /(?:^|;)width:(\d+(?:\.\d+)?px)/.exec(node.body);
+        if (width && condition === null) {
+          base = width[1];
+        } else if (width) {
+          conditional.push(condition + " " + width[1]);
+        }
+      }
+    }
+  };
+  stylesheets.forEach((rules) => visit(rules, null));
+  return base ? [...conditional.reverse(), base].join(", ") : null;
+}
+
+function cacheKey(source) {
+  return crypto.createHash("sha256").update(JSON.stringify(ENCODER_OPTIONS)).update(source).digest("hex").slice(0, 20);
+}
+
+function indentBefore(html, index) {
+  const lineStart = html.lastIndexOf("\n", index - 1) + 1;
+  const prefix = html.slice(lineStart, index);
+  return /^[ \t]*$/.test(prefix) ? prefix : "";
+}
+
+function largestContentfulImage(images) {
+  // Only one image per page is worth prioritising: the one marked data-lcp, or else the first
+  // that is not lazy-loaded (the hero). Raising every eager image would just reorder the queue.
+  return images.find(({ attributes }) => attributes.has("data-lcp"))
+    || images.find(({ attributes }) => attributes.get("loading") !== "lazy")
+    || null;
+}
+
+function responsiveImagesStage(options = {}) {
+  return {
+    name: "responsive-images",
+    async run(site) {
+      const encoder = options.encoder === undefined ? loadSharpEncoder() : options.encoder;
+      const cacheDir = options.cacheDir;
+      const usedKeys = new Set();
+      const variants = new Map();
+      const stylesheets = new Map();
+      let encoded = 0;
+      let reused = 0;
+      let skipped = 0;
+
+      const variantFor = async (imageFile, source, key, width, format) => {
+        const output = imageFile.replace(/\.[^.]+$/, "") + "-" + width + "." + EXTENSIONS[format];
+        if (!site.has(output)) {
+          const cachePath = cacheDir && path.join(cacheDir, key + "-" + width + "." + EXTENSIONS[format]);
+          let data;
+          if (cachePath && fs.existsSync(cachePath)) {
+            data = fs.readFileSync(cachePath);
+            reused += 1;
+          } else {
+            data = await encoder.encode(source, width, format);
+            encoded += 1;
+            if (cachePath) {
+              fs.mkdirSync(cacheDir, { recursive: true });
+              fs.writeFileSync(cachePath, data);
+            }
+          }
+          site.write(output, data);
+        }
+        return output;
+      };
+
+      const planImage = async (imageFile, attributes) => {
+        if (variants.has(imageFile + "|" + attributes.get("width") + "x" + attributes.get("height"))) {
+          return variants.get(imageFile + "|" + attributes.get("width") + "x" + attributes.get("height"));
+        }
+        const source = site.readBuffer(imageFile);
+        const size = imageSize(source);
+        const key = cacheKey(source);
+        usedKeys.add(key);
+        const plan = { size, ...variantWidths(size, attributes), sources: null };
+        const formats = FORMATS[size.format];
+        const cached = (width, format) => cacheDir && fs.existsSync(path.join(cacheDir, key + "-" + width + "." + EXTENSIONS[format]));
+        if (encoder || plan.widths.every((width) => formats.every((format) => cached(width, format)))) {
+          plan.sources = {};
+          for (const format of formats) {
+            plan.sources[format] = [];
+            for (const width of plan.widths) {
+              plan.sources[format].push({ width, file: await variantFor(imageFile, source, key, width, format) });
+            }
+          }
+          const fallback = plan.sources[formats[formats.length - 1]];
+          const preferred = plan.sources[formats[0]];
+          const target = plan.base * 2;
+          const atTarget = (list) => list.reduce((best, item) => (Math.abs(item.width - target) < Math.abs(best.width - target) ? item : best));
+          plan.fallback = atTarget(fallback).file;
+          site.reportBytes("Responsive", imageFile + " (" + formats[0] + " at 2x)", source.length, site.readBuffer(atTarget(preferred).file).length);
+        } else {
+          skipped += 1;
+        }
+        variants.set(imageFile + "|" + attributes.get("width") + "x" + attributes.get("height"), plan);
+        return plan;
+      };
+
+      for (const file of site.htmlFiles()) {
+        const html = site.read(file);
+        const images = [...html.matchAll(IMAGE_PATTERN)]
+          .filter((match) => !/^<picture/i.test(match[0]))
+          .map((match) => ({ match, attributes: parseAttributes(match[0].replace(/^<img\b|\/?>$/gi, "")) }));
+        const lcp = largestContentfulImage(images);
+        const rules = pageStylesheets(html, file, site).map((cssFile) => {
+          if (!stylesheets.has(cssFile)) {
+            stylesheets.set(cssFile, parseStylesheet(site.read(cssFile)));
+          }
+          return stylesheets.get(cssFile);
+        });
+        const replacements = [];
+        for (const { match, attributes } of images) {
+          const src = attributes.get("src") || "";
+          if (!RASTER_SOURCE.test(src) || attributes.has("srcset")) {
+            continue;
+          }
+          const imageFile = path.posix.normalize(src.startsWith("/") ? src.slice(1) : path.posix.join(path.posix.dirname(file), src));
+          if (!site.has(imageFile)) {
+            continue;
+          }
+          const plan = await planImage(imageFile, attributes);
+          if (!plan.sources) {
+            continue;
+          }
+          const href = (variant) => path.posix.relative(path.posix.dirname(file), variant);
+          if (!attributes.has("width")) {
+            attributes.set("width", String(plan.size.width));
+            attributes.set("height", String(plan.size.height));
+          }
+          if (!attributes.has("decoding")) {
+            attributes.set("decoding", "async");
+          }
+          if (lcp && lcp.match === match && !attributes.has("fetchpriority")) {
+            attributes.set("fetchpriority", "high");
+          }
+          attributes.delete("data-lcp");
+          // sizes names the layout slot; the srcset widths still cover the box object-fit fills.
+          const sizes = slotSizes(rules, attributes) || plan.sizes;
+          const formats = Object.keys(plan.sources);
+          const srcset = (format) => plan.sources[format].map((variant) => href(variant.file) + " " + variant.width + "w").join(", ");
+          attributes.set("src", href(plan.fallback));
+          attributes.set("srcset", srcset(formats[formats.length - 1]));
+          attributes.set("sizes", sizes);
+          const indent = indentBefore(html, match.index);
+          replacements.push({
+            match,
+            markup:
+              "<picture>\n" +
+              formats.slice(0, -1).map((format) => indent + '  <source type="image/' + format + '" srcset="' + srcset(format) + '" sizes="' + sizes + '" />\n').join("") +
+              indent + "  <img " + serializeAttributes(attributes) + " />\n" +
+              indent + "</picture>",
+          });
+        }
+        let output = html;
+        for (const { match, markup } of replacements.reverse()) {
+          output = output.slice(0, match.index) + markup + output.slice(match.index + match[0].length);
+        }
+        site.write(file, output);
+      }
+
+      if (cacheDir && fs.existsSync(cacheDir)) {
+        for (const name of fs.readdirSync(cacheDir)) {
+          if (!usedKeys.has(name.split("-")[0])) {
+            fs.rmSync(path.join(cacheDir, name), { force: true });
+          }
+        }
+      }
+      if (skipped) {
+        console.log("Responsive images skipped for " + skipped + " image(s): their markup is unchanged. Install the optional sharp dependency to encode variants.");
+      }
+      if (encoded || reused) {
+        console.log("Image variants: " + encoded + " encoded, " + reused + " reused from cache.");
+      }
+    },
+  };
+}
+
+module.exports = {
+  imageSize,
+  responsiveImagesStage,
+};
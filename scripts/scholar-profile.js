@@ -0,0 +1,251 @@
+"use strict";
+
+// Incremental reader for Google Scholar profile pages. The direct provider feeds it each response
+// chunk by chunk as it arrives: only the open tag or text run under the cursor is buffered, and
+// only the values the site uses are kept (the gsc_rsb_std totals table and, per gsc_a_tr row, the
+// gsc_a_at title, gsc_a_ac count and gsc_a_h year). A page is complete, and the rest of its body
+// can be dropped, once the article table has closed and, when asked for, the totals were seen.
+
+// The start of each page is kept only to explain pages that are not profiles (captcha, consent).
+const HEAD_SAMPLE_CHARS = 32 * 1024;
+// A "<" whose ">" has not arrived within this many characters is treated as text.
+const MAX_TAG_CHARS = 16 * 1024;
+const MAX_CAPTURE_CHARS = 4 * 1024;
+const TAG_START = /^<(\/?)([a-zA-Z][\w:-]*)/;
+
+function normalizeCount(value, label) {
+  const total = Number(String(value).replaceAll(",", ""));
+  if (!Number.isInteger(total) || total < 0) {
+    throw new Error("Provider returned an invalid " + label + ".");
+  }
+  return total;
+}
+
+function decodeHtml(text) {
+  const named = { amp: "&", lt: "<", gt: ">", quot: '"', apos: "'", nbsp: " " };
+  return text
+    .replace(/<[^>]+>/g, "")
+    .replace(/&(#x[0-9a-f]+|#\d+|[a-z]+);/gi, (entity, body) => {
+      if (body[0] === "#") {
+        return String.fromCodePoint(body[1] === "x" || body[1] === "X" ? parseInt(body.slice(2), 16) : Number(body.slice(1)));
+      }
+      return named[body.toLowerCase()] ?? entity;
+    })
+    .trim();
+}
+
+function describeUnparseableScholarHtml(html) {
+  const title = (html.match(/<title>(.*?)<\/title>/i) || [])[1];
+  if (/recaptcha|captcha|unusual traffic|sorry\/index/i.test(html)) {
+    return "Scholar returned an anti-bot or unusual-traffic page" + (title ? " titled " + JSON.stringify(title) : "") + ".";
+  }
+  if (/consent\.google|Before you continue|cookies/i.test(html)) {
+    return "Scholar returned a consent page" + (title ? " titled " + JSON.stringify(title) : "") + ".";
+  }
+  return "Could not find citation counts in the Scholar profile" + (title ? " titled " + JSON.stringify(title) : "") + ".";
+}
+
+function attribute(tag, name) {
+  const match = new RegExp("\\s" + name + "\\s*=\\s*(?:\"([^\"]*)\"|'([^']*)'|([^\\s>]+))", "i").exec(tag);
+  return match ? match[1] ?? match[2] ?? match[3] : null;
+}
+
+function maybeMarkup(rest) {
+  // Whether a short unparsed tail after "<" could still become a tag or comment.
+  return rest === "</" || (rest.length < 4 && "<!--".startsWith(rest));
+}
+
+function createScholarTokenizer() {
+  const page = {
+    totals: [],          // gsc_rsb_std cells in order (null when empty): citations (all, since), h-index, i10-index
+    articles: [],        // titled gsc_a_tr rows
+    rows: 0,             // every gsc_a_tr row, for pagination
+    counted: 0,          // sum of every gsc_a_ac count, the fallback when there is no totals table
+    countsSeen: 0,
+    articleTableClosed: false,
+    moreDisabled: null,  // the "Show more" button (gsc_bpf_more), when present
+    endedEarly: false,
+    head: "",
+  };
+  let buffer = "";
+  let capture = null;
+  let row = null;
+  let skip = null;
+  let inArticleTable = false;
+
+  function addText(text) {
+    if (capture && capture.text.length < MAX_CAPTURE_CHARS) {
+      capture.text += text;
+    }
+  }
+
+  function finishRow() {
+    page.rows += 1;
+    if (row.title !== null) {
+      page.articles.push(row);
+    }
+    row = null;
+  }
+
+  function finishCapture() {
+    const value = decodeHtml(capture.text);
+    if (capture.field === "total") {
+      // An empty cell is kept as null, so the cells keep their positions and the first one only
+      // counts as the profile total when Scholar printed a number.
+      page.totals.push(/^\d[\d,]*$/.test(value) ? normalizeCount(value, "Scholar total citation count") : null);
+    } else if (capture.field === "count" && value) {
+      const count = normalizeCount(value, "article citation count");
+      page.counted += count;
+      page.countsSeen += 1;
+      if (row) {
+        row.citations = count;
+      }
+    } else if (capture.field === "title" && row) {
+      row.title = value;
+    } else if (capture.field === "year" && row && /^\d{4}$/.test(value)) {
+      row.year = Number(value);
+    }
+    capture = null;
+  }
+
+  function handleTag(tag, closing, name) {
+    if (closing) {
+      if (capture && name === capture.tag) {
+        finishCapture();
+      } else if (name === "tr" && row) {
+        finishRow();
+      } else if (name === "tbody" && inArticleTable) {
+        if (row) finishRow();
+        inArticleTable = false;
+        page.articleTableClosed = true;
+      }
+      return;
+    }
+    if (name === "script" || name === "style") {
+      skip = new RegExp("</" + name, "ig");
+      return;
+    }
+    const id = attribute(tag, "id");
+    if (name === "tbody" && id === "gsc_a_b") {
+      inArticleTable = true;
+    } else if (id === "gsc_bpf_more") {
+      page.moreDisabled = /\sdisabled\b/i.test(tag);
+    }
+    const classes = (attribute(tag, "class") || "").split(/\s+/);
+    if (name === "tr" && classes.includes("gsc_a_tr")) {
+      if (row) finishRow();
+      row = { title: null, citations: 0, year: null };
+    } else if (capture) {
+      // Tags inside a captured value (<b> in a title) only contribute their text.
+    } else if (classes.includes("gsc_rsb_std")) {
+      capture = { field: "total", tag: name, text: "" };
+    } else if (classes.includes("gsc_a_ac")) {
+      capture = { field: "count", tag: name, text: "" };
+    } else if (row && classes.includes("gsc_a_at")) {
+      capture = { field: "title", tag: name, text: "" };
+    } else if (row && classes.includes("gsc_a_h")) {
+      capture = { field: "year", tag: name, text: "" };
+    }
+  }
+
+  function drain(final) {
+    let index = 0;
+    while (index < buffer.length) {
+      if (skip) {
+        // Script and style bodies may hold "<td class=..." strings; jump to their end tag.
+        skip.lastIndex = index;
+        const end = skip.exec(buffer);
+        if (!end) {
+          index = final ? buffer.length : Math.max(index, buffer.length - 8);
+          break;
+        }
+        skip = null;
+        index = end.index;
+        continue;
+      }
+      const open = buffer.indexOf("<", index);
+      if (open === -1) {
+        addText(buffer.slice(index));
+        index = buffer.length;
+        break;
+      }
+      addText(buffer.slice(index, open));
+      index = open;
+      if (buffer.startsWith("<!--", open)) {
+        const end = buffer.indexOf("-->", open + 4);
+        if (end === -1 && !final) break;
+        index = end === -1 ? buffer.length : end + 3;
+        continue;
+      }
+      const start = TAG_START.exec(buffer.slice(open, open + 64));
+      const close = start ? buffer.indexOf(">", open) : -1;
+      if (start && close !== -1) {
+        handleTag(buffer.slice(open, close + 1), start[1] === "/", start[2].toLowerCase());
+        index = close + 1;
+      } else if (!final && (start ? buffer.length - open < MAX_TAG_CHARS : maybeMarkup(buffer.slice(open)))) {
+        break; // the tag, or enough of what follows "<" to tell, has not arrived yet
+      } else {
+        addText("<");
+        index = open + 1;
+      }
+    }
+    buffer = buffer.slice(index);
+  }
+
+  return {
+    page,
+    write(text) {
+      if (page.head.length < HEAD_SAMPLE_CHARS) {
+        page.head += text.slice(0, HEAD_SAMPLE_CHARS - page.head.length);
+      }
+      buffer += text;
+      drain(false);
+    },
+    isComplete(needTotals) {
+      return page.articleTableClosed && (!needTotals || page.totals.length > 0);
+    },
+    end() {
+      drain(true);
+      if (capture) finishCapture();
+      if (row) finishRow();
+      return page;
+    },
+  };
+}
+
+function tokenizeScholarHtml(html) {
+  const tokenizer = createScholarTokenizer();
+  tokenizer.write(html);
+  return tokenizer.end();
+}
+
+function summarizeScholarPages(pages) {
+  // The first page's totals table wins; without one, the counts of every page's rows are summed.
+  const articles = pages.flatMap((page) => page.articles);
+  if (Number.isInteger(pages[0].totals[0])) {
+    return { totalCitations: pages[0].totals[0], articles };
+  }
+  if (pages.some((page) => page.countsSeen > 0)) {
+    return { totalCitations: pages.reduce((sum, page) => sum + page.counted, 0), articles };
+  }
+  throw new Error(describeUnparseableScholarHtml(pages[0].head || ""));
+}
+
+function parseDirectScholarCitationCount(html) {
+  return summarizeScholarPages([tokenizeScholarHtml(html)]).totalCitations;
+}
+
+function parseDirectScholarArticles(html) {
+  return tokenizeScholarHtml(html).articles;
+}
+
+module.exports = {
+  createScholarTokenizer,
+  decodeHtml,
+  describeUnparseableScholarHtml,
+  normalizeCount,
+  parseDirectScholarArticles,
+  parseDirectScholarCitationCount,
+  summarizeScholarPages,
+  tokenizeScholarHtml,
+};
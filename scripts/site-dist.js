@@ -0,0 +1,95 @@
+"use strict";
+
+const fs = require("fs");
+const path = require("path");
+
+// Files GitHub Pages serves. Authoring scripts, the private editor and content/site.json stay out;
+// content/citations.json is fetched by scripts/citation-metric.js to refresh the pre-rendered total.
+const DIST_ENTRIES = [
+  "index.html",
+  "thankyou.html",
+  "cv",
+  "publications",
+  "images",
+  "main.css",
+  "scripts/theme.js",
+  "scripts/citation-metric.js",
+  "content/citations.json",
+  "site.webmanifest",
+  "robots.txt",
+  "sitemap.xml",
+  "CNAME",
+  "EvangelosMarios_Nikolados_CV.pdf",
+];
+
+function collectFiles(root, entries) {
+  const files = [];
+  const visit = (relativePath) => {
+    const absolutePath = path.join(root, relativePath);
+    if (!fs.existsSync(absolutePath)) {
+      return;
+    }
+    if (fs.statSync(absolutePath).isDirectory()) {
+      for (const name of fs.readdirSync(absolutePath).sort()) {
+        visit(path.posix.join(relativePath, name));
+      }
+    } else {
+      files.push(relativePath);
+    }
+  };
+  entries.forEach(visit);
+  return files;
+}
+
+function formatBytes(bytes) {
+  return bytes.toLocaleString("en-GB") + " bytes";
+}
+
+function createDistSite(root, entries) {
+  // The deploy tree is assembled in memory as relative path -> Buffer, so stages can rewrite,
+  // add and rename files before anything touches the output directory.
+  const files = new Map(collectFiles(root, entries).map((file) => [file, fs.readFileSync(path.join(root, file))]));
+  return {
+    root,
+    files,
+    has: (file) => files.has(file),
+    read: (file) => files.get(file).toString("utf8"),
+    readBuffer: (file) => files.get(file),
+    write: (file, contents) => files.set(file, Buffer.isBuffer(contents) ? contents : Buffer.from(contents, "utf8")),
+    remove: (file) => files.delete(file),
+    htmlFiles: () => [...files.keys()].filter((file) => file.endsWith(".html")),
+    reportBytes(action, file, before, after) {
+      const saved = before - after;
+      console.log(
+        action + " " + file + ": " + formatBytes(before) + " -> " + formatBytes(after) +
+        " (" + (saved >= 0 ? "-" : "+") + formatBytes(Math.abs(saved)) + ", " +
+        (before ? ((Math.abs(saved) / before) * 100).toFixed(1) : "0.0") + "%)."
+      );
+    },
+  };
+}
+
+function writeDist(site, outDir) {
+  fs.rmSync(outDir, { recursive: true, force: true });
+  for (const [file, contents] of site.files) {
+    const outputPath = path.join(outDir, file);
+    fs.mkdirSync(path.dirname(outputPath), { recursive: true });
+    fs.writeFileSync(outputPath, contents);
+  }
+}
+
+async function buildDist(options) {
+  const site = createDistSite(options.root, options.entries || DIST_ENTRIES);
+  for (const stage of options.stages) {
+    await stage.run(site);
+  }
+  writeDist(site, options.outDir);
+  console.log("Wrote " + site.files.size + " files to " + path.relative(options.root, options.outDir) + "/.");
+  return site;
+}
+
+module.exports = {
+  DIST_ENTRIES,
+  createDistSite,
+  buildDist,
+};
@@ -0,0 +1,405 @@
+#!/usr/bin/env node
+"use strict";
+
+const assert = require("assert");
+const fs = require("fs");
+const os = require("os");
+const path = require("path");
+const vm = require("vm");
+const {
+  PAGES,
+  build,
+  loadFragmentCache,
+  saveFragmentCache,
+  hashSection,
+  templateStamp,
+  pageIsStale,
+  createWatchState,
+  rerenderSection,
+  streamPage,
+  renderPage,
+  renderNews,
+  renderPublication,
+  renderPublications,
+  renderCitations,
+  loadSite,
+} = require("./build-site");
+const { check } = require("./check-site");
+const { readHistory } = require("./citation-history");
+const { compileTemplate, renderTemplate } = require("./page-template");
+const { PARALLEL_MIN_ENTRIES, poolPaysOff, renderSectionsInParallel } = require("./render-pool");
+const { planPublicationShards, removeStaleShards, syncSitemap } = require("./publication-shards");
+const { minifyHtml } = require("./html-minify");
+const { extractCriticalCss } = require("./critical-css");
+const { createDistSite } = require("./site-dist");
+const { imageSize, responsiveImagesStage } = require("./responsive-images");
+const { fingerprintStage } = require("./asset-fingerprint");
+const { inlineSvgStage } = require("./inline-svg");
+
+const site = JSON.parse(fs.readFileSync(path.join(__dirname, "..", "content", "site.json"), "utf8"));
+const tempDir = fs.mkdtempSync(path.join(os.tmpdir(), "build-site-test-"));
+
+async function checkCitationLoader() {
+  // Runs the client loader against a stub page: the hashed JSON named in asset-manifest.json
+  // replaces the pre-rendered total; without a manifest the plain file is fetched.
+  const run = async (files) => {
+    const count = { textContent: "251" };
+    const time = { dateTime: "2026-08-01", textContent: "1 Aug 2026" };
+    const attributes = { "aria-label": "251 total citations, updated 1 Aug 2026; 180 on 1 Jan 2025" };
+    const metric = {
+      querySelector: (selector) => (selector === "b" ? count : time),
+      getAttribute: (name) => attributes[name],
+      setAttribute: (name, value) => (attributes[name] = value),
+    };
+    const requests = [];
+    const context = {
+      URL,
+      Intl,
+      Number,
+      Date,
+      document: { readyState: "complete", currentScript: { src: "https://example.org/scripts/citation-metric.1a2b3c4d.js" }, querySelector: () => metric },
+      setTimeout,
+      fetch: async (url, init) => {
+        requests.push(String(url).replace("https://example.org/", "") + (init ? " " + init.cache : ""));
+        const body = files[String(url).replace("https://example.org/", "")];
+        return { ok: body !== undefined, status: body === undefined ? 404 : 200, json: async () => body };
+      },
+    };
+    context.window = context;
+    vm.runInNewContext(fs.readFileSync(path.join(__dirname, "citation-metric.js"), "utf8"), context);
+    await new Promise((resolve) => setTimeout(resolve, 20));
+    return { count: count.textContent, time: time.textContent, label: attributes["aria-label"], requests };
+  };
+  const citations = { totalCitations: 1302, updatedAt: "2026-10-16" };
+  const hashed = await run({ "asset-manifest.json": { "content/citations.json": "content/citations.0f0f0f0f.json" }, "content/citations.0f0f0f0f.json": citations });
+  assert.deepStrictEqual(hashed, {
+    count: "1,302",
+    time: "16 Oct 2026",
+    label: "1,302 total citations, updated 16 Oct 2026; 180 on 1 Jan 2025",
+    requests: ["asset-manifest.json no-cache", "content/citations.0f0f0f0f.json"],
+  });
+  const plain = await run({ "content/citations.json": citations });
+  assert.deepStrictEqual(plain.requests, ["asset-manifest.json no-cache", "content/citations.json no-cache"]);
+  assert.strictEqual((await run({})).count, "251", "The pre-rendered total stays when nothing loads.");
+}
+
+async function main() {
+  const cachePath = path.join(tempDir, "fragments.json");
+  const cited = renderPublication({ ...site.publications[0], citations: 1234 });
+  assert(cited.includes('<span class="pub-cites" title="Citation count">cited by 1,234</span></div>'), "Counts without a recorded source are labelled neutrally.");
+  assert(renderPublication({ ...site.publications[0], citations: 1234, citationSource: "OpenAlex + Crossref" })
+    .includes('<span class="pub-cites" title="OpenAlex + Crossref citations">cited by 1,234</span>'), "Counts name the provider recorded in citations.json.");
+  assert(!renderPublication({ ...site.publications[0], citations: 0 }).includes("pub-cites"), "Uncited publications show no count.");
+  assert.deepStrictEqual(loadSite().publications.map(({ citations, citationSource, ...publication }) => publication), site.publications,
+    "Joining citation counts only adds the citations and citationSource fields.");
+  const citationsEntry = loadSite().citations[0];
+  assert(Array.isArray(citationsEntry.history) && !("articles" in citationsEntry), "The metric entry carries the history, not the articles.");
+  const metric = { totalCitations: 30, updatedAt: "2026-02-01", profileUrl: "https://example.org/", history: [] };
+  assert(!renderCitations(metric).includes("<svg"), "A single point draws no sparkline.");
+  const trended = renderCitations({ ...metric, history: [{ date: "2025-02-01", total: 12 }, { date: "2026-02-01", total: 30 }] });
+  assert(trended.includes('class="cite-spark"') && trended.includes("updated 1 Feb 2026; 12 on 1 Feb 2025"));
+
+  // The editor's publish path: an in-memory build matches the pages on disk and is checked
+  // before anything is written.
+  const repoRoot = path.join(__dirname, "..");
+  const siteText = fs.readFileSync(path.join(repoRoot, "content", "site.json"), "utf8");
+  const outputs = build(JSON.parse(siteText));
+  assert.deepStrictEqual(Object.keys(outputs), PAGES.map((candidate) => candidate.label));
+  for (const [label, pageHtml] of Object.entries(outputs)) {
+    assert.strictEqual(pageHtml, fs.readFileSync(path.join(repoRoot, label), "utf8"), label + " must match the CLI build.");
+  }
+  check({ ...outputs, "content/site.json": siteText });
+  const renamed = { ...site, projects: [{ ...site.projects[0], title: "Renamed project" }, ...site.projects.slice(1)] };
+  const publishedFiles = [...PAGES.map((candidate) => candidate.label), "content/site.json", ".cache/build-site/fragments.json"];
+  const fileStamps = () => publishedFiles.map((file) => {
+    const filePath = path.join(repoRoot, file);
+    return fs.existsSync(filePath) ? [file, fs.statSync(filePath).mtimeMs, fs.readFileSync(filePath, "utf8")] : [file, null];
+  });
+  const stampsBefore = fileStamps();
+  const publishStarted = process.hrtime.bigint();
+  const renamedOutputs = build(renamed);
+  check({ ...renamedOutputs, "content/site.json": JSON.stringify(renamed) });
+  const publishMs = Number(process.hrtime.bigint() - publishStarted) / 1e6;
+  assert(renamedOutputs["index.html"].includes("Renamed project"), "The rebuilt page is returned in memory.");
+  assert.deepStrictEqual(fileStamps(), stampsBefore, "Building and checking an edit must not write the pages, the content or the fragment cache.");
+  console.log("In-memory publish build and check: " + publishMs.toFixed(1) + " ms.");
+  assert.throws(() => check({ ...outputs, "content/site.json": JSON.stringify({ ...site, projects: [{ title: "Missing" }] }) }), /Projects are not rendered/);
+  const editorPageSource = fs.readFileSync(path.join(repoRoot, "scripts", "content-editor-page.js"), "utf8");
+  assert.throws(() => check({ "scripts/content-editor-page.js": editorPageSource + "\n}" }), SyntaxError);
+  assert.throws(() => build({ ...site, news: [] }), /news must be a non-empty array/);
+
+  // A fresh clone has no citations.json or history yet: the metric block is left empty, the
+  // publications carry no counts, and the streamed page agrees.
+  const uncited = build(site, { data: { citations: null, history: readHistory(path.join(tempDir, "missing.ndjson")) } });
+  const uncitedPubs = uncited["publications/index.html"];
+  assert(/<!-- CONTENT:CITATIONS:START -->\s*<!-- CONTENT:CITATIONS:END -->/.test(uncitedPubs) && !uncitedPubs.includes("pub-cites"));
+  const uncitedPath = path.join(tempDir, "uncited.html");
+  fs.copyFileSync(path.join(repoRoot, "publications", "index.html"), uncitedPath);
+  await streamPage({ ...PAGES[1], path: uncitedPath }, site);
+  assert.strictEqual(fs.readFileSync(uncitedPath, "utf8"), uncitedPubs);
+  // Article counts from a DOI provider alone show per publication but add no profile total.
+  const doiOnly = build(site, { data: { citations: { articles: [{ title: site.publications[0].title, citations: 7 }] }, history: readHistory(path.join(tempDir, "missing.ndjson")) } });
+  assert(!doiOnly["publications/index.html"].includes('class="metric"') && doiOnly["publications/index.html"].includes("cited by 7"));
+
+  const uncached = renderPublications(site.publications);
+
+  const cold = loadFragmentCache(cachePath);
+  assert.strictEqual(renderPublications(site.publications, cold), uncached);
+  assert.strictEqual(cold.hits, 0);
+  assert.strictEqual(cold.misses, site.publications.length);
+  saveFragmentCache(cold);
+
+  const edited = site.publications.map((pub, index) => (index === 0 ? { ...pub, title: pub.title + " (revised)" } : pub));
+  const warm = loadFragmentCache(cachePath);
+  assert.strictEqual(renderPublications(edited, warm), renderPublications(edited));
+  assert.strictEqual(warm.hits, site.publications.length - 1);
+  assert.strictEqual(warm.misses, 1);
+
+  const mixed = loadFragmentCache(cachePath);
+  renderNews(site.news, mixed);
+  assert.strictEqual(mixed.hits, 0, "Fragments must be keyed per section.");
+
+  const templatePath = path.join(tempDir, "page.html");
+  fs.writeFileSync(templatePath, "<p></p>\n", "utf8");
+  const page = { label: "page.html", path: templatePath, blocks: [{ name: "NEWS", section: "news" }] };
+  const sectionHashes = { news: hashSection(site.news) };
+  const manifest = { sections: sectionHashes, templates: { "page.html": templateStamp(templatePath) } };
+  assert.strictEqual(pageIsStale(page, manifest, sectionHashes), false);
+  assert.strictEqual(pageIsStale(page, manifest, { news: hashSection(site.news.slice(1)) }), true);
+  assert.strictEqual(pageIsStale(page, { sections: sectionHashes, templates: {} }, sectionHashes), true);
+  fs.writeFileSync(templatePath, "<p>edited</p>\n", "utf8");
+  assert.strictEqual(pageIsStale(page, manifest, sectionHashes), true, "Template edits must trigger a rebuild.");
+
+  const publicationsBlock = PAGES.flatMap((candidate) => candidate.blocks).find((block) => block.section === "publications");
+  const watchState = createWatchState(loadFragmentCache(path.join(tempDir, "watch-fragments.json")), { paginate: false });
+  assert.strictEqual(rerenderSection(watchState, publicationsBlock, site.publications), true);
+  watchState.site = { publications: site.publications };
+  assert.strictEqual(rerenderSection(watchState, publicationsBlock, site.publications.map((pub) => ({ ...pub }))), false);
+  const inserted = [{ ...site.publications[0], title: "Inserted" }, ...site.publications];
+  const missesBefore = watchState.cache.misses;
+  assert.strictEqual(rerenderSection(watchState, publicationsBlock, inserted), true);
+  assert.strictEqual(watchState.cache.misses - missesBefore, 1, "Watch rebuilds must only render the inserted entry.");
+  assert.strictEqual(watchState.fragments.publications.join("\n"), renderPublications(inserted));
+
+  const compiled = compileTemplate("<a><!-- CONTENT:A:START -->old<!-- CONTENT:A:END --><!-- CONTENT:B:START -->kept<!-- CONTENT:B:END --></a>", "t");
+  assert.deepStrictEqual(compiled.slots.map((slot) => slot.name), ["A", "B"]);
+  assert.strictEqual(renderTemplate(compiled, { A: "new" }),
+    "<a><!-- CONTENT:A:START -->\nnew\n        <!-- CONTENT:A:END --><!-- CONTENT:B:START -->kept<!-- CONTENT:B:END --></a>\n");
+  assert.throws(() => compileTemplate("<!-- CONTENT:A:START --><!-- CONTENT:B:START -->", "t"), /inside the unclosed A block/);
+  assert.throws(() => compileTemplate("<!-- CONTENT:A:END -->", "t"), /Unexpected A end marker/);
+  assert.throws(() => compileTemplate("<!-- CONTENT:A:START -->", "t"), /Missing A end marker/);
+  assert.throws(() => compileTemplate("<!-- CONTENT:A:START --><!-- CONTENT:A:END --><!-- CONTENT:A:START --><!-- CONTENT:A:END -->", "t"), /Duplicate A/);
+
+  // Padding puts the START marker across the 64 KiB boundary between read-stream chunks.
+  const streamedPath = path.join(tempDir, "streamed.html");
+  const template = "<main>" + " ".repeat(65536 - 20) + "\n        <!-- CONTENT:PUBLICATIONS:START -->\n" +
+    "stale\n        <!-- CONTENT:PUBLICATIONS:END -->\n</main>\n";
+  fs.writeFileSync(streamedPath, template, "utf8");
+  const streamedPage = { label: "streamed.html", path: streamedPath, blocks: [publicationsBlock] };
+  const expected = renderPage(compileTemplate(template, "streamed.html"), streamedPage, { PUBLICATIONS: renderPublications(site.publications) });
+  assert.strictEqual(await streamPage(streamedPage, site), true);
+  assert.strictEqual(fs.readFileSync(streamedPath, "utf8"), expected);
+  assert.strictEqual(await streamPage(streamedPage, site), false);
+  assert.deepStrictEqual(fs.readdirSync(tempDir).filter((name) => name.endsWith(".tmp")), []);
+
+  const pubsTemplate = compileTemplate(fs.readFileSync(path.join(__dirname, "..", "publications", "index.html"), "utf8"), "publications");
+  const fragments = site.publications.map((pub) => renderPublications([pub]));
+  const shards = planPublicationShards(pubsTemplate, site.publications, fragments, { pageSize: 3, firstPageBytes: 1e6 }, { CITATIONS: "<b>metric</b>" });
+  assert(shards.every((shard) => shard.html.includes("<!-- CONTENT:CITATIONS:START -->\n<b>metric</b>")), "Other blocks repeat on every shard.");
+  const years = new Set(site.publications.map((pub) => pub.year + "/"));
+  assert.deepStrictEqual(shards.filter((shard) => shard.dir.startsWith("page/")).map((shard) => shard.dir),
+    Array.from({ length: Math.ceil(site.publications.length / 3) - 1 }, (_, index) => "page/" + (index + 2) + "/"));
+  assert.deepStrictEqual(new Set(shards.filter((shard) => /^\d{4}\/$/.test(shard.dir)).map((shard) => shard.dir)), years);
+  assert(shards[0].html.includes(fragments[0]) && !shards[0].html.includes(fragments[3]));
+  assert(shards[1].html.includes('href="../../../main.css"'), "Numbered pages must rewrite relative asset URLs.");
+  assert(shards[1].html.includes('href="../../index.html">1</a>'), "Numbered pages must link back to the first page.");
+  // The pager is windowed, so the nav on every page stays the same size with thousands of entries.
+  const manyPubs = Array.from({ length: 3000 }, (_, index) => ({ ...site.publications[index % site.publications.length], title: "Paper " + index }));
+  const manyShards = planPublicationShards(pubsTemplate, manyPubs, manyPubs.map(() => "<article></article>"), { pageSize: 10, firstPageBytes: 1e6 });
+  const pagerLinks = (shard) => shard.html.match(/<span class="pub-pages-label">Page<\/span>.*$/m)[0].match(/<a /g).length;
+  const page150 = manyShards.find((shard) => shard.dir === "page/150/");
+  assert.deepStrictEqual([pagerLinks(manyShards[0]), pagerLinks(page150)], [5, 9], "First, last, neighbours, previous and next only.");
+  assert(page150.html.includes('<a href="../149/index.html" rel="prev">Previous</a>') && page150.html.includes('<a href="../../index.html">1</a>'));
+  assert(page150.html.includes('<a href="../300/index.html">300</a>') && page150.html.includes('aria-current="page">150</a>'));
+  assert(Buffer.byteLength(manyShards[0].html) < Buffer.byteLength(shards[0].html) + 2048, "The first page does not grow with the page count.");
+  // Years are paginated like the main list, with their own pager.
+  const yearPages = manyShards.filter((shard) => shard.dir.startsWith(manyPubs[0].year + "/"));
+  assert(yearPages.length > 1 && yearPages.every((shard) => (shard.html.match(/<article><\/article>/g) || []).length <= 10), "Year pages hold at most pageSize entries.");
+  assert.deepStrictEqual(yearPages.slice(0, 2).map((shard) => shard.dir), [manyPubs[0].year + "/", manyPubs[0].year + "/page/2/"]);
+  assert(yearPages[1].html.includes('<a href="../../index.html" rel="prev">Previous</a>') && yearPages[1].html.includes('<a href="../../index.html" aria-current="page">' + manyPubs[0].year + "</a>"));
+  const capped = planPublicationShards(pubsTemplate, site.publications, fragments, { pageSize: 3, firstPageBytes: 1 });
+  assert.strictEqual((capped[0].html.match(/<article class="pub">/g) || []).length, 1, "The byte cap must shrink the first page.");
+
+  const shardRoot = path.join(tempDir, "publications");
+  for (const dir of ["2020", "2020/page/2", "page/2", "notes"]) {
+    fs.mkdirSync(path.join(shardRoot, dir), { recursive: true });
+    fs.writeFileSync(path.join(shardRoot, dir, "index.html"), "<!-- CONTENT:PUBLICATIONS:START -->", "utf8");
+  }
+  assert.strictEqual(removeStaleShards(shardRoot, new Set([path.join(shardRoot, "2020", "index.html")])).length, 2);
+  assert.deepStrictEqual(fs.readdirSync(shardRoot).sort(), ["2020", "notes"]);
+  assert.deepStrictEqual(fs.readdirSync(path.join(shardRoot, "2020")), ["index.html"]);
+
+  // Shard pages are listed in the sitemap after /publications/, and dropped when no longer built.
+  const sitemapPath = path.join(tempDir, "sitemap.xml");
+  const sitemap = fs.readFileSync(path.join(__dirname, "..", "sitemap.xml"), "utf8");
+  fs.writeFileSync(sitemapPath, sitemap);
+  assert.strictEqual(syncSitemap(sitemapPath, ["page/2/", "2024/", "2024/page/2/"]), true);
+  const listed = fs.readFileSync(sitemapPath, "utf8");
+  assert.deepStrictEqual([...listed.matchAll(/<loc>([^<]*)<\/loc>/g)].map((match) => match[1].replace(/^https:\/\/[^/]+/, "")),
+    ["/", "/publications/", "/publications/page/2/", "/publications/2024/", "/publications/2024/page/2/", "/cv/"]);
+  assert.strictEqual(syncSitemap(sitemapPath, ["page/2/", "2024/", "2024/page/2/"]), false);
+  syncSitemap(sitemapPath, []);
+  assert.strictEqual(fs.readFileSync(sitemapPath, "utf8"), sitemap);
+
+  const indexHtml = fs.readFileSync(path.join(__dirname, "..", "index.html"), "utf8");
+  const minified = minifyHtml(indexHtml);
+  assert(minified.length < indexHtml.length);
+  assert.strictEqual(minifyHtml(minified), minified, "Minification must be idempotent.");
+  assert(minified.includes("<!-- CONTENT:NEWS:START -->"), "Minification must keep CONTENT markers.");
+  assert(!minified.includes("<!-- Favicons"), "Minification must strip ordinary comments.");
+  for (const script of indexHtml.match(/<script\b[^>]*>[\s\S]*?<\/script>/g)) {
+    assert(minified.includes(script), "Minification must leave scripts untouched.");
+  }
+  assert.strictEqual(minifyHtml('<p>a  <b\n  class="x  y">b</b>\n\n  c</p>'), '<p>a <b class="x  y">b</b>\nc</p>\n');
+
+  const criticalHtml =
+    '<html><body><aside class="top"><a class="link">Intro</a><span class="label">A</span><a>B</a></aside>' +
+    "<main>" + "<p>" + "x".repeat(80) + "</p>" + '<p class="below">Later</p></main></body></html>';
+  const { critical, pruned } = extractCriticalCss(
+    criticalHtml,
+    [
+      ":root { --ink: #111; }",
+      ':root[data-theme="dark"] { --ink: #eee; }',
+      ".top .link { color: red; }",
+      ".link:hover { color: blue; }",
+      ".label + a { margin: 0; }",
+      ".below, .unused { content: \"a  b\"; }",
+      ".missing { color: green; }",
+      "@media (max-width: 600px) { .top { display: block; } .missing { display: none; } }",
+    ].join("\n"),
+    { foldTextChars: 40 }
+  );
+  assert.strictEqual(
+    critical,
+    ':root{--ink:#111}:root[data-theme="dark"]{--ink:#eee}.top .link{color:red}.label + a{margin:0}' +
+      "@media (max-width: 600px){.top{display:block}}"
+  );
+  assert(pruned.includes(".link:hover{color:blue}"), "Interaction rules must stay in the pruned stylesheet.");
+  assert(pruned.includes('.below{content:"a  b"}'), "Unused selectors must be dropped and strings kept.");
+  assert(!pruned.includes(".missing") && !pruned.includes(".unused"));
+
+  const profile = fs.readFileSync(path.join(__dirname, "..", "images", "profile.jpg"));
+  assert.deepStrictEqual(imageSize(profile), { format: "jpeg", width: 960, height: 959 });
+  const imageCacheDir = path.join(tempDir, "image-cache");
+  const encodes = [];
+  const fakeEncoder = { encode: async (input, width, format) => (encodes.push(format + width), Buffer.from(format + width)) };
+  const imageSite = createDistSite(path.join(__dirname, ".."), ["index.html", "main.css", "images/profile.jpg"]);
+  await responsiveImagesStage({ encoder: fakeEncoder, cacheDir: imageCacheDir }).run(imageSite);
+  assert.strictEqual(encodes.length, 12, "Four widths in three formats are encoded once each.");
+  const pictureHtml = imageSite.read("index.html");
+  assert(pictureHtml.includes('<source type="image/avif" srcset="images/profile-220.avif 220w, images/profile-330.avif 330w, images/profile-440.avif 440w, images/profile-660.avif 660w" sizes="(max-width:560px) 180px, 190px" />'), "sizes follows the CSS slot, mobile query first.");
+  assert(/<img class="about-photo" src="images\/profile-440\.jpg"[^>]* width="190" height="220"[^>]* fetchpriority="high"[^>]* sizes="\(max-width:560px\) 180px, 190px" \/>/.test(pictureHtml));
+  assert(!pictureHtml.includes("data-lcp"), "The LCP marker is dropped once the photo is prioritised.");
+  assert.strictEqual(imageSite.read("images/profile-660.webp"), "webp660");
+  const cachedSite = createDistSite(path.join(__dirname, ".."), ["index.html", "main.css", "images/profile.jpg"]);
+  await responsiveImagesStage({ encoder: null, cacheDir: imageCacheDir }).run(cachedSite);
+  assert.strictEqual(encodes.length, 12, "Cached variants must not be re-encoded.");
+  assert.strictEqual(cachedSite.read("index.html"), pictureHtml);
+  const lcpRoot = path.join(tempDir, "lcp");
+  fs.mkdirSync(lcpRoot);
+  fs.copyFileSync(path.join(__dirname, "..", "images", "profile.jpg"), path.join(lcpRoot, "a.jpg"));
+  const eagerImages = '<img src="a.jpg" width="100" alt="" /><img src="a.jpg" width="50" alt="" /><img src="a.jpg" width="40" loading="lazy" alt="" />';
+  fs.writeFileSync(path.join(lcpRoot, "first.html"), eagerImages);
+  fs.writeFileSync(path.join(lcpRoot, "marked.html"), eagerImages.replace('width="50"', 'width="50" data-lcp'));
+  const lcpSite = createDistSite(lcpRoot, ["a.jpg", "first.html", "marked.html"]);
+  await responsiveImagesStage({ encoder: fakeEncoder }).run(lcpSite);
+  const prioritised = (file) => lcpSite.read(file).split("<img ").slice(1).map((tag) => tag.includes('fetchpriority="high"'));
+  assert.deepStrictEqual(prioritised("first.html"), [true, false, false], "Only the first eager image is prioritised.");
+  assert.deepStrictEqual(prioritised("marked.html"), [false, true, false], "An explicit data-lcp image wins.");
+  assert(!lcpSite.read("marked.html").includes("data-lcp"));
+  const unencodedSite = createDistSite(lcpRoot, ["a.jpg", "first.html"]);
+  await responsiveImagesStage({ encoder: null }).run(unencodedSite);
+  assert.strictEqual(unencodedSite.read("first.html"), eagerImages, "Without an encoder the markup is left alone.");
+
+  const assetRoot = path.join(tempDir, "assets");
+  fs.mkdirSync(path.join(assetRoot, "img"), { recursive: true });
+  fs.mkdirSync(path.join(assetRoot, "sub"), { recursive: true });
+  fs.writeFileSync(path.join(assetRoot, "main.css"), ".a { background: url('img/icon.svg'); }\n");
+  fs.writeFileSync(path.join(assetRoot, "img", "icon.svg"), "<svg></svg>\n");
+  fs.writeFileSync(path.join(assetRoot, "site.webmanifest"), JSON.stringify({ icons: [{ src: "img/icon.svg" }] }));
+  fs.writeFileSync(path.join(assetRoot, "img", "data.json"), "{}\n");
+  fs.writeFileSync(
+    path.join(assetRoot, "sub", "index.html"),
+    '<link rel="stylesheet" href="../main.css" /><img src="/img/icon.svg?v=1" srcset="../img/icon.svg 1x, ../img/icon.svg 2x" />' +
+      '<style>.b { background: url(../img/icon.svg); }</style><a href="../missing.css">x</a>\n'
+  );
+  const fingerprint = async () => {
+    const assetSite = createDistSite(assetRoot, ["main.css", "img", "site.webmanifest", "sub"]);
+    await fingerprintStage().run(assetSite);
+    return assetSite;
+  };
+  const assetSite = await fingerprint();
+  const assetManifest = JSON.parse(assetSite.read("asset-manifest.json"));
+  const iconName = assetManifest["img/icon.svg"];
+  assert(/^img\/icon\.[0-9a-f]{8}\.svg$/.test(iconName));
+  assert.strictEqual(assetSite.read(assetManifest["main.css"]), ".a { background: url('" + iconName + "'); }\n");
+  assert.strictEqual(
+    assetSite.read("sub/index.html"),
+    '<link rel="stylesheet" href="../' + assetManifest["main.css"] + '" /><img src="/' + iconName + '?v=1" srcset="../' + iconName +
+      " 1x, ../" + iconName + ' 2x" /><style>.b { background: url(../' + iconName + '); }</style><a href="../missing.css">x</a>\n'
+  );
+  assert.strictEqual(JSON.parse(assetSite.read("site.webmanifest")).icons[0].src, iconName);
+  assert(/^img\/data\.[0-9a-f]{8}\.json$/.test(assetManifest["img/data.json"]) && assetSite.read("img/data.json") === "{}\n",
+    "JSON data gets a hashed copy beside the original.");
+  fs.writeFileSync(path.join(assetRoot, "img", "icon.svg"), "<svg><g/></svg>\n");
+  const changedManifest = JSON.parse((await fingerprint()).read("asset-manifest.json"));
+  assert.notStrictEqual(changedManifest["main.css"], assetManifest["main.css"], "A changed icon must rename the stylesheet using it.");
+
+  await checkCitationLoader();
+
+  const inlineSite = createDistSite(path.join(__dirname, ".."), ["index.html", "images/github-activity.svg"]);
+  inlineSvgStage().run(inlineSite);
+  const inlinedHtml = inlineSite.read("index.html");
+  assert(!inlinedHtml.includes("github-activity.svg") && !inlinedHtml.includes("<?xml"), "The activity calendar must be inlined.");
+  assert(/<svg xmlns="http:\/\/www\.w3\.org\/2000\/svg" class="gh-cal github-activity-image" width="782" height="148" viewBox="[^"]+" role="img" aria-label="GitHub contributions calendar">/.test(inlinedHtml));
+  const forcedSite = createDistSite(path.join(__dirname, ".."), ["index.html", "images/github-activity.svg"]);
+  inlineSvgStage({ maxBytes: 100 }).run(forcedSite);
+  assert.strictEqual(forcedSite.read("index.html"), inlinedHtml, "The data-inline calendar is inlined whatever its size.");
+  fs.writeFileSync(path.join(assetRoot, "img", "dot.svg"), '<?xml version="1.0"?>\n<svg width="8" height="8"><defs><clipPath id="c"/></defs><rect clip-path="url(#c)"/></svg>\n');
+  fs.writeFileSync(path.join(assetRoot, "sub", "index.html"), '<body class="x"><img class="i" src="../img/dot.svg" alt=""><img src="/img/dot.svg" alt="Dot" width="16"></body>\n');
+  const skippedSite = createDistSite(assetRoot, ["img", "sub"]);
+  inlineSvgStage({ maxBytes: 10 }).run(skippedSite);
+  assert.strictEqual(skippedSite.read("sub/index.html"), fs.readFileSync(path.join(assetRoot, "sub", "index.html"), "utf8"), "SVGs over the threshold stay external.");
+  const spriteSite = createDistSite(assetRoot, ["img", "sub"]);
+  inlineSvgStage().run(spriteSite);
+  assert.strictEqual(
+    spriteSite.read("sub/index.html"),
+    '<body class="x">\n<svg xmlns="http://www.w3.org/2000/svg" width="0" height="0" style="position:absolute" aria-hidden="true">' +
+      '<symbol id="svg-img-dot" viewBox="0 0 8 8"><defs><clipPath id="svg-img-dot-c"/></defs><rect clip-path="url(#svg-img-dot-c)"/></symbol></svg>' +
+      '<svg xmlns="http://www.w3.org/2000/svg" width="8" height="8" viewBox="0 0 8 8" class="i" aria-hidden="true"><use href="#svg-img-dot"/></svg>' +
+      '<svg xmlns="http://www.w3.org/2000/svg" width="16" height="8" viewBox="0 0 8 8" role="img" aria-label="Dot"><use href="#svg-img-dot"/></svg></body>\n',
+    "Repeated SVGs share one <symbol> and keep their accessible names."
+  );
+
+  const manyPublications = Array.from({ length: 500 }, (_, index) => ({ ...site.publications[index % site.publications.length], title: "Paper " + index }));
+  const pooledSections = [
+    { section: "news", entries: site.news },
+    { section: "publications", entries: manyPublications },
+  ];
+  const parallel = await renderSectionsInParallel(pooledSections, 2);
+  assert.strictEqual(parallel.stats.tasks, 2, "Small sections share a task instead of getting one each.");
+  assert.deepStrictEqual(parallel.html, [renderNews(site.news), renderPublications(manyPublications)],
+    "Parallel rendering must be byte-identical to the serial build.");
+  assert(!poolPaysOff(pooledSections, 4), "Builds below the work threshold render serially.");
+  assert(!poolPaysOff([{ section: "publications", entries: new Array(PARALLEL_MIN_ENTRIES) }], 1),
+    "A single core never starts a pool.");
+  assert(poolPaysOff([{ section: "publications", entries: new Array(PARALLEL_MIN_ENTRIES) }], 2));
+}
+
+main()
+  .then(() => console.log("Site build checks passed."))
+  .catch((error) => {
+    console.error(error);
+    process.exitCode = 1;
+  })
+  .finally(() => fs.rmSync(tempDir, { recursive: true, force: true }));
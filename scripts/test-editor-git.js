@@ -0,0 +1,120 @@
+#!/usr/bin/env node
+"use strict";
+
+// Runs the editor's Git steps against a local bare repository standing in for GitHub.
+
+const assert = require("assert");
+const fs = require("fs");
+const os = require("os");
+const path = require("path");
+const { execFileSync } = require("child_process");
+const { createGitSession } = require("./editor-git");
+
+const tempDir = fs.mkdtempSync(path.join(os.tmpdir(), "editor-git-test-"));
+const originDir = path.join(tempDir, "origin.git");
+Object.assign(process.env, {
+  GIT_AUTHOR_NAME: "Editor Test",
+  GIT_AUTHOR_EMAIL: "editor@example.org",
+  GIT_COMMITTER_NAME: "Editor Test",
+  GIT_COMMITTER_EMAIL: "editor@example.org",
+  GIT_CONFIG_NOSYSTEM: "1",
+});
+
+function git(cwd, ...args) {
+  return execFileSync("git", args, { cwd, encoding: "utf8", stdio: ["ignore", "pipe", "pipe"] }).trim();
+}
+
+function commitFile(cwd, file, text, message) {
+  fs.writeFileSync(path.join(cwd, file), text, "utf8");
+  git(cwd, "add", file);
+  git(cwd, "commit", "-q", "-m", message);
+}
+
+function cloneOrigin(name) {
+  const dir = path.join(tempDir, name);
+  git(tempDir, "clone", "-q", originDir, dir);
+  return dir;
+}
+
+function session(dir) {
+  const events = [];
+  const gitSession = createGitSession(dir, (event) => events.push(event));
+  return { git: gitSession, events, fetches: () => events.filter((event) => event.message === "Fetching origin/main...").length };
+}
+
+async function main() {
+  git(tempDir, "init", "-q", "--bare", "--initial-branch=main", originDir);
+  const seed = path.join(tempDir, "seed");
+  git(tempDir, "init", "-q", "--initial-branch=main", seed);
+  commitFile(seed, "site.json", "{}\n", "seed");
+  git(seed, "push", "-q", originDir, "main");
+  const editor = cloneOrigin("editor");
+  const collaborator = cloneOrigin("collaborator");
+
+  // The runner never blocks the event loop: timers keep firing while a command runs.
+  let ticks = 0;
+  const ticker = setInterval(() => (ticks += 1), 10);
+  await session(editor).git.run(process.execPath, ["-e", "setTimeout(() => {}, 200)"]);
+  clearInterval(ticker);
+  assert(ticks >= 5, "Only " + ticks + " timer ticks ran during a 200 ms command.");
+
+  const first = session(editor);
+  assert.strictEqual(first.git.currentBranch(), "main");
+  assert.strictEqual(await first.git.syncWithOrigin(), "up-to-date");
+  assert.deepStrictEqual(first.events[0], { phase: "fetch", message: "Fetching origin/main..." });
+
+  // A collaborator's commit is fetched and fast-forwarded, with Git's progress streamed.
+  commitFile(collaborator, "news.txt", "one\n", "collaborator: news");
+  git(collaborator, "push", "-q", "origin", "main");
+  const behind = session(editor);
+  assert.strictEqual(await behind.git.syncWithOrigin(), "fast-forwarded");
+  assert(behind.events.some((event) => event.phase === "fetch" && event.message !== "Fetching origin/main..."), "Fetch progress is reported.");
+  assert.strictEqual(fs.readFileSync(path.join(editor, "news.txt"), "utf8"), "one\n");
+
+  // Local and remote commits touching different files are rebased, then pushed without a second fetch.
+  commitFile(editor, "site.json", '{"edited":true}\n', "content: update portfolio");
+  commitFile(collaborator, "news.txt", "two\n", "collaborator: more news");
+  git(collaborator, "push", "-q", "origin", "main");
+  const diverged = session(editor);
+  assert.strictEqual(await diverged.git.syncWithOrigin(), "rebased");
+  await diverged.git.pushToOrigin("local");
+  assert.strictEqual(diverged.fetches(), 1, "The push reuses the publish's fetch.");
+  assert(diverged.events.some((event) => event.phase === "push"));
+  assert.strictEqual(git(originDir, "log", "-1", "--format=%s", "main"), "content: update portfolio");
+
+  // A push rejected because origin moved after the fetch syncs once and retries.
+  const stale = session(editor);
+  assert.strictEqual(await stale.git.syncWithOrigin(), "up-to-date");
+  commitFile(editor, "site.json", '{"edited":2}\n', "content: second update");
+  git(collaborator, "pull", "-q", "--rebase", "origin", "main");
+  commitFile(collaborator, "news.txt", "three\n", "collaborator: late news");
+  git(collaborator, "push", "-q", "origin", "main");
+  await stale.git.pushToOrigin("local");
+  assert.strictEqual(stale.fetches(), 2);
+  assert(stale.events.some((event) => event.message === "GitHub rejected the push; syncing and retrying..."));
+  assert.deepStrictEqual(git(originDir, "log", "-2", "--format=%s", "main").split("\n"), ["content: second update", "collaborator: late news"]);
+
+  // Conflicting edits abort the rebase and leave the checkout as it was.
+  git(collaborator, "pull", "-q", "--rebase", "origin", "main");
+  commitFile(editor, "news.txt", "editor\n", "content: conflicting");
+  commitFile(collaborator, "news.txt", "collaborator\n", "collaborator: conflicting");
+  git(collaborator, "push", "-q", "origin", "main");
+  const head = git(editor, "rev-parse", "HEAD");
+  await assert.rejects(session(editor).git.syncWithOrigin(), /could not automatically rebase/);
+  assert.strictEqual(git(editor, "rev-parse", "HEAD"), head);
+  assert(!fs.existsSync(path.join(editor, ".git", "rebase-merge")) && !fs.existsSync(path.join(editor, ".git", "rebase-apply")));
+
+  // Uncommitted work blocks syncing; failed commands report Git's message.
+  fs.writeFileSync(path.join(editor, "site.json"), "{}\n", "utf8");
+  await assert.rejects(session(editor).git.syncWithOrigin(), /working tree has uncommitted changes/);
+  assert.strictEqual(await session(editor).git.hasChanges(["site.json"]), true);
+  await assert.rejects(session(editor).git.run("git", ["rev-parse", "no-such-ref"]), /git rev-parse no-such-ref failed: .*no-such-ref/s);
+}
+
+main()
+  .then(() => console.log("Editor Git checks passed."))
+  .catch((error) => {
+    console.error(error);
+    process.exitCode = 1;
+  })
+  .finally(() => fs.rmSync(tempDir, { recursive: true, force: true }));
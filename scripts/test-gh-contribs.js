@@ -0,0 +1,146 @@
+#!/usr/bin/env node
+"use strict";
+
+const assert = require("assert");
+const fs = require("fs");
+const http = require("http");
+const os = require("os");
+const path = require("path");
+const { createClient, fixtureQuery, generate, generateAll, parseArgs } = require("./generate-gh-contribs");
+
+const tempDir = fs.mkdtempSync(path.join(os.tmpdir(), "gh-contribs-test-"));
+
+function calendarResponse(days) {
+  // A recorded contributionCalendar response covering the given days.
+  const weeks = [];
+  for (let index = 0; index < days.length; index += 7) {
+    weeks.push({ contributionDays: days.slice(index, index + 7).map(([date, contributionCount]) => ({ date, contributionCount })) });
+  }
+  return { data: { user: { contributionsCollection: { contributionCalendar: { weeks } } } } };
+}
+
+async function main() {
+  const fixtures = path.join(tempDir, "fixtures");
+  const outDir = path.join(tempDir, "images");
+  const storePath = path.join(tempDir, "gh-contributions.ndjson");
+  fs.mkdirSync(fixtures);
+  const yearDays = Array.from({ length: 371 }, (_, index) => [
+    new Date(Date.UTC(2025, 9, 10) + index * 86400000).toISOString().slice(0, 10),
+    index % 5 === 0 ? index % 13 : 0,
+  ]);
+  fs.writeFileSync(path.join(fixtures, "octo-year.json"), JSON.stringify(calendarResponse(yearDays)));
+  const trailingWeek = [["2026-10-10", 3], ["2026-10-11", 0], ["2026-10-12", 0], ["2026-10-13", 0], ["2026-10-14", 0], ["2026-10-15", 4], ["2026-10-16", 0], ["2026-10-17", 2]];
+  fs.writeFileSync(path.join(fixtures, "octo-2026-10-10.json"), JSON.stringify(calendarResponse(trailingWeek)));
+  const options = { login: "octo", outDir, storePath, query: fixtureQuery(fixtures), now: new Date("2026-10-17T12:00:00Z") };
+
+  const first = await generate(options);
+  const activeDays = yearDays.filter(([, count]) => count > 0);
+  assert.deepStrictEqual([first.from, first.fetchedDays, first.appended, first.written], [null, 371, activeDays.length, true]);
+  assert.strictEqual(fs.readFileSync(storePath, "utf8").split("\n").length - 1, activeDays.length, "Days without contributions are not stored.");
+  const firstSvg = fs.readFileSync(first.outPath, "utf8");
+  assert(firstSvg.includes("@octo — past year total: " + activeDays.reduce((sum, [, count]) => sum + count, 0)));
+
+  // The last stored day is 2026-10-15, but the trailing week from 2026-10-10 is queried again: a
+  // stored day GitHub credited late (10-10, 1 -> 3) is corrected, and only changed days are appended.
+  const second = await generate(options);
+  assert.deepStrictEqual([second.from, second.fetchedDays, second.appended, second.written], ["2026-10-10T00:00:00Z", 8, 3, true]);
+  assert.deepStrictEqual(fs.readFileSync(storePath, "utf8").trim().split("\n").slice(-3), [
+    '{"date":"2026-10-10","count":3}', '{"date":"2026-10-15","count":4}', '{"date":"2026-10-17","count":2}',
+  ]);
+
+  // Replaying the same response changes nothing, so neither file is touched.
+  const storeBefore = fs.readFileSync(storePath, "utf8");
+  const third = await generate(options);
+  assert.deepStrictEqual([third.appended, third.written], [0, false]);
+  assert.strictEqual(fs.readFileSync(storePath, "utf8"), storeBefore);
+
+  // Superseded lines are compacted away once they outnumber live ones.
+  fs.writeFileSync(storePath, [1, 3, 5, 7].map((count) => JSON.stringify({ date: "2026-10-17", count }) + "\n").join(""));
+  await generate(options);
+  assert.strictEqual(fs.readFileSync(storePath, "utf8"), '{"date":"2026-10-10","count":3}\n{"date":"2026-10-15","count":4}\n{"date":"2026-10-17","count":2}\n');
+
+  await assert.rejects(generate({ ...options, storePath: path.join(tempDir, "empty.ndjson"), login: "nobody" }), /No recorded response for nobody/);
+
+  assert.deepStrictEqual(parseArgs(["--login", "a,b", "--login=c", "--years", "2024", "--out", "x", "--concurrency=2"]), {
+    login: ["a", "b", "c"], years: ["2024"], out: "x", concurrency: 2,
+  });
+  assert.throws(() => parseArgs(["--light", "x"]), /Unknown argument --light/);
+  assert.throws(() => parseArgs(["--years", "24"]), /four-digit years/);
+
+  // Batch mode against a local stand-in for the GraphQL endpoint: the first "limited" query hits
+  // an exhausted rate limit, "denied" has no access.
+  const sockets = new Set();
+  const requests = [];
+  let inFlight = 0;
+  let maxInFlight = 0;
+  let throttled = false;
+  const server = http.createServer((request, reply) => {
+    sockets.add(request.socket);
+    inFlight += 1;
+    maxInFlight = Math.max(maxInFlight, inFlight);
+    let body = "";
+    request.on("data", (chunk) => (body += chunk));
+    request.on("end", () => {
+      const { variables } = JSON.parse(body);
+      requests.push(variables.login + " " + variables.from.slice(0, 4));
+      setTimeout(() => {
+        inFlight -= 1;
+        if (variables.login === "denied") {
+          reply.writeHead(401, { "content-type": "application/json" }).end('{"message":"Bad credentials"}');
+        } else if (variables.login === "limited" && !throttled) {
+          throttled = true;
+          const reset = Math.floor(Date.now() / 1000) + 60;
+          reply.writeHead(403, { "x-ratelimit-remaining": "0", "x-ratelimit-reset": String(reset) }).end('{"message":"API rate limit exceeded"}');
+        } else {
+          reply.writeHead(200, { "content-type": "application/json", "x-ratelimit-remaining": "4000" });
+          reply.end(JSON.stringify(calendarResponse([[variables.from.slice(0, 10), 3], [variables.from.slice(0, 4) + "-07-04", 1]])));
+        }
+      }, 15);
+    });
+  });
+  server.listen(0, "127.0.0.1");
+  await new Promise((resolve) => server.once("listening", resolve));
+  const sleeps = [];
+  const client = createClient({
+    api: `http://127.0.0.1:${server.address().port}/graphql`,
+    token: "test",
+    concurrency: 2,
+    sleep: async (ms) => sleeps.push(ms),
+  });
+  try {
+    const batchDir = path.join(tempDir, "batch");
+    const results = await generateAll({
+      logins: ["octo", "limited"],
+      years: [2024, 2025],
+      outDir: batchDir,
+      storePath: path.join(batchDir, "store.ndjson"),
+      title: "Activity",
+      query: client.query,
+    });
+    assert.deepStrictEqual(results.map((result) => path.basename(result.outPath)), [
+      "github-activity-octo-2024.svg", "github-activity-octo-2025.svg", "github-activity-limited-2024.svg", "github-activity-limited-2025.svg",
+    ]);
+    assert.strictEqual(requests.length, 5, "Four calendars plus one retry after the rate limit.");
+    assert.strictEqual(maxInFlight, 2, "At most --concurrency queries are in flight.");
+    assert(sockets.size <= 2, "Queries reuse pooled keep-alive connections.");
+    assert.deepStrictEqual([client.stats.requests, client.stats.retries], [5, 1]);
+    assert(sleeps[0] > 50000, "An exhausted rate limit waits for its reset.");
+    const svg = fs.readFileSync(path.join(batchDir, "github-activity-limited-2024.svg"), "utf8");
+    assert(svg.includes('aria-label="Activity (2024)"') && svg.includes("@limited — 2024 total: 4"));
+    assert.strictEqual(fs.readFileSync(path.join(batchDir, "store-octo.ndjson"), "utf8").trim().split("\n").length, 4);
+
+    await assert.rejects(client.query("{}", { login: "denied", from: "2024-01-01T00:00:00Z" }), /GitHub API error 401/);
+    assert.strictEqual(client.stats.retries, 1, "Errors other than rate limits are not retried.");
+  } finally {
+    client.close();
+    server.close();
+  }
+}
+
+main()
+  .then(() => console.log("GitHub activity checks passed."))
+  .catch((error) => {
+    console.error(error);
+    process.exitCode = 1;
+  })
+  .finally(() => fs.rmSync(tempDir, { recursive: true, force: true }));
@@ -2,7 +2,27 @@
 "use strict";
 
 const assert = require("assert");
-const { parseDirectScholarCitationCount, parseSerpApiCitationCount, normalizeCount } = require("./update-scholar-citations");
+const fs = require("fs");
+const http = require("http");
+const os = require("os");
+const path = require("path");
+const { createFixtureServer, createJsonClient, fetchDoiCitations, parseDoiCitations, publicationDoi } = require("./citation-providers");
+const { appendToHistory, compactPoints, drawSparklineSVG, historySeries, readHistory } = require("./citation-history");
+const { createScholarTokenizer, tokenizeScholarHtml } = require("./scholar-profile");
+const { buildArticleIndex, extractDoi, joinCitations, matchPublication, normalizeTitle } = require("./citation-match");
+const {
+  cacheTtlMs,
+  fetchDirectCitationCount,
+  fetchSerpApiCitationCount,
+  parseArgs,
+  parseDirectScholarArticles,
+  resolveCitations,
+  parseDirectScholarCitationCount,
+  parseSerpApiCitationCount,
+  normalizeCount,
+  nextCitations,
+  validateAgainstPrevious,
+} = require("./update-scholar-citations");
 
 assert.strictEqual(normalizeCount("1,234", "test count"), 1234);
 assert.throws(() => normalizeCount("not-a-number", "test count"), /invalid test count/);
@@ -17,6 +37,14 @@ assert.strictEqual(
   125
 );
 
+// An empty totals cell is not a total of 0: the article counts are summed instead, and with none
+// the page is reported as unparseable.
+assert.strictEqual(
+  parseDirectScholarCitationCount('<td class="gsc_rsb_std"></td><td class="gsc_rsb_std">200</td><a class="gsc_a_ac gs_ibl">12</a>'),
+  12
+);
+assert.throws(() => parseDirectScholarCitationCount('<title>Profile</title><td class="gsc_rsb_std"> </td>'), /Could not find citation counts/);
+
 assert.throws(
   () => parseDirectScholarCitationCount('<html><head><title>Sorry</title></head><body>unusual traffic</body></html>'),
   /anti-bot|unusual-traffic/
@@ -45,4 +73,471 @@ assert.throws(
   /cited_by.table/
 );
 
-console.log("Scholar citation parser checks passed.");
+assert.deepStrictEqual(
+  parseDirectScholarArticles(
+    '<tr class="gsc_a_tr"><td class="gsc_a_t"><a href="/x" class="gsc_a_at">Can protein expression be &#8216;solved&#8217;?</a></td>' +
+      '<td class="gsc_a_c"><a href="/y" class="gsc_a_ac gs_ibl">1,024</a></td><td class="gsc_a_y"><span class="gsc_a_h gsc_a_hc gs_ibl">2025</span></td></tr>' +
+      '<tr class="gsc_a_tr"><td class="gsc_a_t"><a href="/z" class="gsc_a_at">Genes &amp; circuits</a></td><td class="gsc_a_c"><a class="gsc_a_ac gs_ibl"></a></td></tr>'
+  ),
+  [
+    { title: "Can protein expression be ‘solved’?", citations: 1024, year: 2025 },
+    { title: "Genes & circuits", citations: 0, year: null },
+  ]
+);
+// A profile page in Scholar's markup: articles, the "Show more" button, then the totals table.
+function scholarPage(articles, options = {}) {
+  const rows = articles.map((article) =>
+    `<tr class="gsc_a_tr"><td class="gsc_a_t"><a href="/a" class="gsc_a_at">${article.title}</a></td>` +
+    `<td class="gsc_a_c"><a href="/c" class="gsc_a_ac gs_ibl">${article.citations || ""}</a></td>` +
+    `<td class="gsc_a_y"><span class="gsc_a_h gsc_a_hc gs_ibl">${article.year}</span></td></tr>`
+  ).join("");
+  return "<html><head><title>Profile</title><script>var cell = '<td class=\"gsc_rsb_std\">9</td>';</script></head><body>" +
+    `<table id="gsc_a_t"><tbody id="gsc_a_b">${rows}</tbody></table>` +
+    `<button type="button" id="gsc_bpf_more"${options.more === false ? " disabled" : ""}>Show more</button>` +
+    (options.totals ? `<table id="gsc_rsb_st"><tr><td class="gsc_rsb_std">${options.totals.toLocaleString("en-US")}</td><td class="gsc_rsb_std">90</td></tr></table>` : "") +
+    '<!-- <td class="gsc_rsb_std">1</td> --></body></html>';
+}
+
+// The tokenizer gives the same result however the page is split into chunks.
+const tokenizerHtml = scholarPage([
+  { title: "Growth <i>in vivo</i> &amp; a < b", citations: "1,024", year: 2025 },
+  { title: "Uncited", year: 2026 },
+], { totals: 1234, more: false });
+const whole = tokenizeScholarHtml(tokenizerHtml);
+assert.deepStrictEqual(
+  [whole.totals, whole.articles, whole.rows, whole.counted, whole.articleTableClosed, whole.moreDisabled],
+  [[1234, 90], [{ title: "Growth in vivo & a < b", citations: 1024, year: 2025 }, { title: "Uncited", citations: 0, year: 2026 }], 2, 1024, true, true]
+);
+for (const size of [1, 7, 64]) {
+  const tokenizer = createScholarTokenizer();
+  for (let offset = 0; offset < tokenizerHtml.length; offset += size) {
+    tokenizer.write(tokenizerHtml.slice(offset, offset + size));
+  }
+  assert.deepStrictEqual(tokenizer.end(), whole, "Chunks of " + size + " characters parse like the whole page.");
+}
+const partial = createScholarTokenizer();
+partial.write(tokenizerHtml.slice(0, tokenizerHtml.indexOf("<button")));
+assert.deepStrictEqual([partial.isComplete(false), partial.isComplete(true)], [true, false], "Totals come after the article table.");
+
+assert.deepStrictEqual(
+  parseSerpApiCitationCount({
+    cited_by: { table: [{ citations: { all: 30 } }] },
+    articles: [{ title: "A", cited_by: { value: 12 }, year: "2024" }, { title: "B", cited_by: { value: null } }],
+  }).articles,
+  [{ title: "A", citations: 12, year: 2024 }, { title: "B", citations: 0, year: null }]
+);
+
+// Publication matching: DOI, then normalised title, then trigram similarity.
+assert.strictEqual(normalizeTitle("Can protein expression be ‘solved’? Oyarzún &amp; co"), "can protein expression be solved oyarzun and co");
+assert.strictEqual(extractDoi("https://doi.org/10.1093%2Fnar%2Fgkab123."), "10.1093/nar/gkab123");
+const articleIndex = buildArticleIndex([
+  { title: "Learning the Koopman operator using attention free transformers", citations: 3 },
+  { title: "Prediction of cellular burden with host-circuit models", citations: 40, url: "https://doi.org/10.1000/burden" },
+  { title: "Growth defects and loss-of-function in synthetic gene circuits", citations: 25 },
+]);
+assert.strictEqual(matchPublication({ title: "Learning the Koopman Operator using Attention Free Transformers" }, articleIndex).by, "title");
+assert.strictEqual(matchPublication({ title: "Another title", url: "https://example.org/10.1000/BURDEN" }, articleIndex).article.citations, 40);
+const fuzzy = matchPublication({ title: "Growth defects and loss of function in synthetic gene-circuits." }, articleIndex);
+assert.strictEqual(fuzzy.by, "title", "Punctuation and hyphenation are normalised away.");
+const trigram = matchPublication({ title: "Growth defect and loss-of-function in synthetic gene circuit" }, articleIndex);
+assert.deepStrictEqual([trigram.by, trigram.article.citations], ["trigram", 25]);
+assert(trigram.similarity >= 0.8 && trigram.similarity < 1);
+assert.strictEqual(matchPublication({ title: "Growth of synthetic populations" }, articleIndex), null);
+const joined = joinCitations([{ title: "Prediction of cellular burden with host circuit models" }, { title: "Unlisted" }], articleIndex.articles);
+assert.deepStrictEqual([joined.matched, joined.publications[0].citations, "citations" in joined.publications[1]], [1, 40, false]);
+
+// Thousands of publications against thousands of articles stay well under a second.
+const words = "gene circuit burden growth koopman operator learning protein expression cell model host design control noise".split(" ");
+const manyArticles = Array.from({ length: 3000 }, (_, index) => ({
+  title: [0, 1, 2, 3, 4].map((offset) => words[(index * 7 + offset * 3) % words.length]).join(" ") + " study " + index,
+  citations: index,
+}));
+const manyPublications = manyArticles.map((article, index) => ({ title: article.title.replace("study", index % 2 ? "studies" : "Study") }));
+const matchStarted = process.hrtime.bigint();
+const bulk = joinCitations(manyPublications, manyArticles);
+const matchMs = Number(process.hrtime.bigint() - matchStarted) / 1e6;
+assert.strictEqual(bulk.matched, 3000);
+assert(bulk.publications.every((publication, index) => publication.citations === index), "Every publication keeps its own article.");
+assert(matchMs < 2000, "Matching 3000 x 3000 took " + matchMs.toFixed(0) + " ms.");
+
+const PROFILE_HTML = '<html><title>Profile</title><td class="gsc_rsb_std">247</td><td class="gsc_rsb_std">200</td></html>';
+const CAPTCHA_HTML = "<html><head><title>Sorry</title></head><body>unusual traffic</body></html>";
+
+async function startScholarMock(respond) {
+  // A stand-in Scholar host. Requests left unanswered count as hanging until the client gives up.
+  const server = http.createServer((request, response) => {
+    server.requests.push(request.headers["user-agent"]);
+    server.paths.push(request.url);
+    response.on("close", () => {
+      if (!response.writableEnded) {
+        server.abandoned += 1;
+      }
+    });
+    respond(request, response);
+  });
+  server.requests = [];
+  server.paths = [];
+  server.abandoned = 0;
+  await new Promise((resolve) => server.listen(0, "127.0.0.1", resolve));
+  server.url = "http://127.0.0.1:" + server.address().port + "/citations?user=test";
+  server.host = "127.0.0.1:" + server.address().port;
+  return server;
+}
+
+async function listenerWarnings(run) {
+  // Collects Node's "possible EventTarget memory leak" warnings raised while run() is pending.
+  const warnings = [];
+  const onWarning = (warning) => warning.name === "MaxListenersExceededWarning" && warnings.push(warning.message);
+  process.on("warning", onWarning);
+  try {
+    await run();
+    await new Promise((resolve) => setImmediate(resolve));
+  } finally {
+    process.off("warning", onWarning);
+  }
+  return warnings;
+}
+
+async function checkDirectFetching() {
+  const hanging = await startScholarMock(() => {});
+  const slowOk = await startScholarMock((request, response) => setTimeout(() => response.end(PROFILE_HTML), 40));
+  const captcha = await startScholarMock((request, response) => response.end(CAPTCHA_HTML));
+  const unavailable = await startScholarMock((request, response) => response.writeHead(503).end());
+  const fast = { staggerMs: 10, roundDelayMs: 10 };
+  try {
+    // The first parsed count wins; requests still hanging elsewhere are cancelled.
+    const started = Date.now();
+    const result = await fetchDirectCitationCount({ ...fast, urls: [hanging.url, slowOk.url], requestTimeoutMs: 5000 });
+    assert.deepStrictEqual([result.totalCitations, result.source, result.payload.pages.map((page) => page.totals)], [247, "direct:" + slowOk.host, [[247, 200]]]);
+    assert(Date.now() - started < 1000, "A hung host must not delay the result.");
+    await new Promise((resolve) => setTimeout(resolve, 50));
+    assert(hanging.requests.length > 0 && hanging.abandoned === hanging.requests.length, "Pending requests are aborted after the first success.");
+
+    // Every failure is reported against its host.
+    await assert.rejects(
+      fetchDirectCitationCount({ ...fast, urls: [captcha.url, hanging.url, unavailable.url], requestTimeoutMs: 100, rounds: 2 }),
+      (error) => {
+        assert(error.message.includes(captcha.host + ": Scholar returned an anti-bot or unusual-traffic page titled \"Sorry\"."));
+        assert(error.message.includes(hanging.host + ": timed out after 100 ms"));
+        assert(error.message.includes(unavailable.host + ": returned HTTP 503"));
+        return true;
+      }
+    );
+    assert.strictEqual(captcha.requests.length, 6, "Each round tries every request profile once per host.");
+    assert.strictEqual(new Set(captcha.requests).size, 3);
+
+    // Abort listeners on the run's signal are removed as each round and pause ends, so many
+    // rounds do not pile them up.
+    const leaks = await listenerWarnings(() => assert.rejects(
+      fetchDirectCitationCount({ ...fast, urls: [captcha.url], profiles: [{ "User-Agent": "retry" }], rounds: 12, roundDelayMs: 0 }),
+      /anti-bot/
+    ));
+    assert.deepStrictEqual(leaks, []);
+
+    // The overall deadline bounds the run even when single requests may take longer.
+    const deadlineStart = Date.now();
+    await assert.rejects(
+      fetchDirectCitationCount({ ...fast, urls: [hanging.url], requestTimeoutMs: 10000, deadlineMs: 150 }),
+      /deadline of 150 ms reached/
+    );
+    assert(Date.now() - deadlineStart < 1000);
+  } finally {
+    for (const server of [hanging, slowOk, captcha, unavailable]) {
+      server.closeAllConnections();
+      server.close();
+    }
+  }
+}
+
+async function checkDirectPagination() {
+  const articles = Array.from({ length: 230 }, (_, index) => ({ title: "Article " + index, citations: index, year: 2000 + (index % 25) }));
+  const servePages = (count, totals, trailing) => (request, response) => {
+    const url = new URL(request.url, "http://scholar.test");
+    const cstart = Number(url.searchParams.get("cstart") || 0);
+    const size = Number(url.searchParams.get("pagesize"));
+    const html = scholarPage(articles.slice(cstart, Math.min(cstart + size, count)), { totals: cstart === 0 && totals, more: cstart + size < count });
+    response.writeHead(200, { "Content-Type": "text/html; charset=utf-8" });
+    for (let offset = 0; offset < html.length; offset += 997) {
+      response.write(html.slice(offset, offset + 997));
+    }
+    if (!trailing) {
+      response.end();
+      return;
+    }
+    // The rest of the page keeps coming until the client hangs up.
+    const timer = setInterval(() => response.write("<div>" + "x".repeat(4096) + "</div>"), 5);
+    response.on("close", () => clearInterval(timer));
+  };
+  const withTotals = await startScholarMock(servePages(230, 5000, true));
+  const withoutTotals = await startScholarMock(servePages(200, null, false));
+  const cacheDir = fs.mkdtempSync(path.join(os.tmpdir(), "scholar-pages-test-"));
+  const options = { provider: "direct", cacheDir, profiles: [{ "User-Agent": "pager" }], pageDelayMs: 0, requestTimeoutMs: 2000 };
+  try {
+    // Every page is read up to its article table (the first up to its totals) and then dropped.
+    const fetched = await resolveCitations({ ...options, urls: [withTotals.url] });
+    assert.deepStrictEqual([fetched.provider, fetched.via, fetched.totalCitations, fetched.articles.length], ["direct", "fetch", 5000, 230]);
+    assert.deepStrictEqual(fetched.articles[229], { title: "Article 229", citations: 229, year: 2004 });
+    assert.strictEqual(nextCitations(fetched, null).articlesSource, "Google Scholar");
+    assert.deepStrictEqual(withTotals.paths.map((requestPath) => new URL(requestPath, "http://x").searchParams.get("cstart")), [null, "100", "200"]);
+    assert(withTotals.paths.every((requestPath) => requestPath.includes("pagesize=100")));
+    assert.deepStrictEqual(new Set(withTotals.requests), new Set(["pager"]), "Later pages reuse the winning request profile.");
+    await new Promise((resolve) => setTimeout(resolve, 50));
+    assert.strictEqual(withTotals.abandoned, 3, "No page is read past what the tokenizer needs.");
+
+    // The cache keeps the parsed pages, not their HTML, and replays to the same result.
+    const entry = JSON.parse(fs.readFileSync(fs.readdirSync(cacheDir).map((name) => path.join(cacheDir, name))[0], "utf8"));
+    assert.deepStrictEqual(entry.payload.pages.map((page) => [page.rows, "head" in page]), [[100, false], [100, false], [30, false]]);
+    const replayed = await resolveCitations({ ...options, offline: true });
+    assert.deepStrictEqual([replayed.provider, replayed.totalCitations, replayed.articles], ["direct", 5000, fetched.articles]);
+
+    // Without a totals table the article counts of every page are summed; a disabled "Show more"
+    // button ends the list even after a full page.
+    const summed = await resolveCitations({ ...options, urls: [withoutTotals.url], force: true });
+    assert.deepStrictEqual([summed.totalCitations, summed.articles.length], [(199 * 200) / 2, 200]);
+    assert.strictEqual(withoutTotals.paths.length, 2);
+    const pagedLeaks = await listenerWarnings(() => resolveCitations({ ...options, urls: [withoutTotals.url], force: true, pageSize: 10, maxPages: 15 }));
+    assert.deepStrictEqual(pagedLeaks, [], "Pauses between pages remove their abort listeners.");
+  } finally {
+    for (const server of [withTotals, withoutTotals]) {
+      server.closeAllConnections();
+      server.close();
+    }
+    fs.rmSync(cacheDir, { recursive: true, force: true });
+  }
+}
+
+async function checkSerpApiPagination() {
+  const articles = Array.from({ length: 250 }, (_, index) => ({ title: "Article " + index, cited_by: { value: 250 - index } }));
+  articles[160].title = "Host circuit models of cellular burden";
+  const serpApi = await startScholarMock((request, response) => {
+    const url = new URL(request.url, "http://serpapi.test");
+    const start = Number(url.searchParams.get("start"));
+    const page = articles.slice(start, start + Number(url.searchParams.get("num")));
+    response.writeHead(200, { "Content-Type": "application/json" });
+    response.end(JSON.stringify({ ...(start === 0 ? { cited_by: { table: [{ citations: { all: 9000 } }] } } : {}), articles: page }));
+  });
+  const options = { url: serpApi.url, apiKey: "test" };
+  const starts = () => serpApi.paths.splice(0).map((requestPath) => new URL(requestPath, "http://x").searchParams.get("start"));
+  try {
+    // Every publication matches an article on the first page, so no further search is spent.
+    const first = await fetchSerpApiCitationCount({ ...options, publications: [{ title: "Article 3" }, { title: "Article 99" }] });
+    assert.deepStrictEqual([first.totalCitations, first.articles.length, starts()], [9000, 100, ["0"]]);
+    // A publication further down the profile pulls in pages until it matches.
+    const deeper = await fetchSerpApiCitationCount({ ...options, publications: [{ title: "Article 3" }, { title: "Host circuit models of cellular burden" }] });
+    assert.deepStrictEqual([deeper.articles.length, starts()], [200, ["0", "100"]]);
+    // One that never matches reads to the short last page, and no further.
+    const unmatched = await fetchSerpApiCitationCount({ ...options, publications: [{ title: "Not on the profile" }] });
+    assert.deepStrictEqual([unmatched.articles.length, starts()], [250, ["0", "100", "200"]]);
+  } finally {
+    serpApi.close();
+  }
+}
+
+async function checkResponseCache() {
+  const cacheDir = fs.mkdtempSync(path.join(os.tmpdir(), "scholar-cache-test-"));
+  const hours = (count) => new Date(Date.UTC(2026, 9, 1) + count * 3600 * 1000);
+  let total = 247;
+  let calls = 0;
+  const providers = {
+    serpapi: {
+      fetch: async () => {
+        calls += 1;
+        return { totalCitations: total, source: "serpapi:test", payload: { cited_by: { table: [{ citations: { all: total } }] }, search_metadata: { id: calls } } };
+      },
+      parse: parseSerpApiCitationCount,
+    },
+  };
+  const resolve = (at, extra = {}) => resolveCitations({ provider: "serpapi", providers, cacheDir, now: hours(at), ...extra });
+  try {
+    const first = await resolve(0);
+    assert.deepStrictEqual([first.via, first.totalCitations, calls], ["fetch", 247, 1]);
+    assert.strictEqual(first.nextRefresh.toISOString(), hours(20).toISOString());
+    assert.strictEqual((await resolve(1)).via, "cache", "A fresh cached response skips the provider call.");
+    assert.strictEqual((await resolve(1)).source, "cache:serpapi");
+
+    // An unchanged result (despite different response metadata) doubles the refresh interval.
+    assert.strictEqual((await resolve(21)).via, "fetch");
+    assert.strictEqual((await resolve(21 + 39)).via, "cache");
+    assert.strictEqual((await resolve(21 + 41)).via, "fetch");
+    assert.strictEqual(calls, 3);
+    assert.strictEqual(cacheTtlMs({ unchangedRuns: 2 }), 80 * 3600 * 1000);
+    assert.strictEqual(cacheTtlMs({ unchangedRuns: 10 }), 168 * 3600 * 1000, "The interval is capped.");
+
+    total = 250;
+    const forced = await resolve(63, { force: true });
+    assert.deepStrictEqual([forced.via, forced.totalCitations], ["fetch", 250]);
+    assert.strictEqual((await resolve(63 + 21)).via, "fetch", "A changed count resets the interval.");
+
+    // Offline replay never calls the provider: the cache, a fixture, or a clear error.
+    const replayed = await resolve(1000, { offline: true });
+    assert.deepStrictEqual([replayed.via, replayed.totalCitations, replayed.fetchedAt], ["replay", 250, hours(84).toISOString()]);
+    const fixture = path.join(cacheDir, "serpapi-fixture.json");
+    fs.writeFileSync(fixture, JSON.stringify({ cited_by: { table: [{ citations: { all: "1,024" } }] } }));
+    const fromFixture = await resolveCitations({ provider: "serpapi", cacheDir, offline: true, fixture });
+    assert.deepStrictEqual([fromFixture.totalCitations, fromFixture.source], [1024, "fixture:serpapi-fixture.json"]);
+    const html = path.join(cacheDir, "profile.html");
+    fs.writeFileSync(html, PROFILE_HTML);
+    assert.strictEqual((await resolveCitations({ provider: "direct", cacheDir, offline: true, fixture: html })).totalCitations, 247);
+    await assert.rejects(resolveCitations({ provider: "direct", cacheDir, offline: true }), /--offline needs a cached direct response/);
+    assert.strictEqual(calls, 5);
+
+    assert.deepStrictEqual(parseArgs(["--offline", "--fixture", "x.json"]), { offline: true, force: false, fixture: path.resolve("x.json") });
+    assert.throws(() => parseArgs(["--fixture=x.json"]), /only applies with --offline/);
+    assert.throws(() => parseArgs(["--refresh"]), /Unknown argument --refresh/);
+  } finally {
+    fs.rmSync(cacheDir, { recursive: true, force: true });
+  }
+}
+
+function checkCitationHistory() {
+  const historyDir = fs.mkdtempSync(path.join(os.tmpdir(), "citation-history-test-"));
+  try {
+    // Two years of daily refreshes, each gaining a citation every third day.
+    const file = path.join(historyDir, "history.ndjson");
+    const history = readHistory(file);
+    const start = Date.UTC(2024, 9, 17);
+    const outcomes = { unchanged: 0, appended: 0, compacted: 0 };
+    for (let day = 0; day <= 730; day += 1) {
+      outcomes[appendToHistory(history, new Date(start + day * 86400000).toISOString().slice(0, 10), 100 + Math.floor(day / 3))] += 1;
+    }
+    assert.strictEqual(appendToHistory(history, "2026-10-17", 343), "unchanged");
+    assert(outcomes.compacted > 0 && outcomes.appended > outcomes.compacted);
+    const lines = fs.readFileSync(file, "utf8").trim().split("\n");
+    const series = historySeries(readHistory(file));
+    assert(lines.length <= 2 * series.length, "Superseded lines never outnumber live points.");
+    assert(series.length < 140, "Daily, then weekly, then monthly points: " + series.length);
+    assert.deepStrictEqual(series[series.length - 1], { date: "2026-10-17", total: 343 });
+    assert.deepStrictEqual(series.slice(-3).map((point) => point.date), ["2026-10-15", "2026-10-16", "2026-10-17"]);
+    assert(series.filter((point) => point.date.startsWith("2024-11")).length === 1, "Points over a year old are monthly.");
+    assert.deepStrictEqual(new Set(series.filter((point) => point.date.startsWith("2026-03")).map((point) => new Date(point.date).getUTCDay())), new Set([6]),
+      "Points between two months and a year old are weekly (the last day of each week).");
+
+    // A re-fetch of the same day replaces its total; buckets keep their latest point.
+    assert.deepStrictEqual(compactPoints(new Map([["2026-01-05", 1], ["2026-01-09", 2], ["2026-10-17", 3]]), "2026-10-17"),
+      [{ date: "2026-01-09", total: 2 }, { date: "2026-10-17", total: 3 }]);
+
+    assert.throws(() => validateAgainstPrevious(342, history), /decreased from 343 \(recorded 2026-10-17\) to 342/);
+    validateAgainstPrevious(343, history);
+    fs.writeFileSync(file, '{"date":"2026-10-17","total":5}\n{"date":"17 Oct","total":6}\n');
+    assert.throws(() => readHistory(file), /YYYY-MM-DD/);
+
+    const svg = drawSparklineSVG([{ date: "2026-01-01", total: 10 }, { date: "2026-01-03", total: 20 }, { date: "2026-01-11", total: 30 }], { width: 106, height: 26 });
+    assert(svg.includes('<path class="line" d="M3 23L23 13L103 3"/>'), "x follows the date and y spans the range.");
+    assert(svg.includes(':root[data-theme="dark"] .cite-spark{') && svg.includes('aria-hidden="true"'));
+    assert.strictEqual(drawSparklineSVG([{ date: "2026-01-01", total: 10 }]), "", "One point draws nothing.");
+  } finally {
+    fs.rmSync(historyDir, { recursive: true, force: true });
+  }
+}
+
+async function checkDoiProviders() {
+  const site = JSON.parse(fs.readFileSync(path.join(__dirname, "..", "content", "site.json"), "utf8"));
+  assert.deepStrictEqual(site.publications.map(publicationDoi), [
+    "10.48550/arxiv.2606.23957", null, "10.1101/2025.01.09.632034", null, null, "10.1007/978-1-0716-1032-9_13", "10.1021/acssynbio.8b00531",
+  ]);
+
+  // A stand-in for the three live APIs: publication n has n citations on OpenAlex, n + 1 on
+  // Crossref when n is even, and is unknown to Semantic Scholar when n is a multiple of three.
+  const publications = Array.from({ length: 60 }, (_, n) => ({ title: "Paper " + n, year: 2020, url: "https://doi.org/10.5555/test." + n }));
+  const number = (doi) => Number(doi.split(".").pop());
+  const sockets = new Set();
+  let inFlight = 0;
+  let maxInFlight = 0;
+  let throttled = false;
+  const live = http.createServer((request, reply) => {
+    sockets.add(request.socket);
+    inFlight += 1;
+    maxInFlight = Math.max(maxInFlight, inFlight);
+    let body = "";
+    request.on("data", (chunk) => (body += chunk));
+    request.on("end", () => setTimeout(() => {
+      inFlight -= 1;
+      const url = new URL(request.url, "http://stand-in");
+      const [, provider] = url.pathname.split("/");
+      const send = (json) => reply.writeHead(200, { "content-type": "application/json" }).end(JSON.stringify(json));
+      if (provider === "openalex") {
+        const dois = url.searchParams.get("filter").slice(4).split("|");
+        send({ results: dois.map((doi) => ({ doi: "https://doi.org/" + doi.toUpperCase(), cited_by_count: number(doi) })) });
+      } else if (provider === "crossref" && !throttled) {
+        throttled = true;
+        reply.writeHead(429, { "retry-after": "0" }).end("slow down");
+      } else if (provider === "crossref") {
+        const dois = url.searchParams.get("filter").split(",").map((filter) => filter.slice(4)).filter((doi) => number(doi) % 2 === 0);
+        send({ message: { items: dois.map((doi) => ({ DOI: doi, "is-referenced-by-count": number(doi) + 1 })) } });
+      } else {
+        send(JSON.parse(body).ids.map((id) => (number(id) % 3 === 0 ? null : { paperId: id, citationCount: number(id) })));
+      }
+    }, 5));
+  });
+  live.listen(0, "127.0.0.1");
+  await new Promise((resolve) => live.once("listening", resolve));
+  const recordDir = fs.mkdtempSync(path.join(os.tmpdir(), "citation-providers-test-"));
+  const endpointsAt = (server) => Object.fromEntries(["openalex", "crossref", "semanticscholar"].map((name) =>
+    [name, "http://127.0.0.1:" + server.address().port + "/" + name]));
+  const names = ["openalex", "crossref", "semanticscholar"];
+  const sleeps = [];
+  const client = createJsonClient({ concurrency: 2, sleep: async (ms) => sleeps.push(ms) });
+  let recorded;
+  try {
+    recorded = await fetchDoiCitations(names, publications, { client, endpoints: endpointsAt(live), record: recordDir });
+    assert.deepStrictEqual([client.stats.requests, client.stats.retries, sleeps], [7, 1, [0]], "Two OpenAlex, three Crossref and one Semantic Scholar batch, one retried.");
+    assert.strictEqual(maxInFlight, 2, "At most `concurrency` requests are in flight.");
+    assert(sockets.size <= 2, "Batches reuse keep-alive connections.");
+  } finally {
+    client.close();
+    live.close();
+  }
+
+  const replay = createFixtureServer(recordDir);
+  replay.listen(0, "127.0.0.1");
+  await new Promise((resolve) => replay.once("listening", resolve));
+  const cacheDir = fs.mkdtempSync(path.join(os.tmpdir(), "citation-providers-cache-"));
+  try {
+    assert.strictEqual(fs.readdirSync(recordDir).length, 6);
+    const options = { cacheDir, publications, endpoints: endpointsAt(replay), now: new Date("2026-10-17T00:00:00Z") };
+    const merged = await resolveCitations({ ...options, provider: "openalex+crossref+semanticscholar" });
+    assert.strictEqual(merged.via, "fetch");
+    assert.strictEqual(merged.source, "openalex+crossref+semanticscholar:60/60 DOIs");
+    assert.deepStrictEqual(merged.articles.slice(0, 3), [
+      { title: "Paper 0", doi: "10.5555/test.0", citations: 1, year: 2020 },
+      { title: "Paper 1", doi: "10.5555/test.1", citations: 1, year: 2020 },
+      { title: "Paper 2", doi: "10.5555/test.2", citations: 3, year: 2020 },
+    ]);
+    assert.strictEqual(merged.articles.reduce((sum, article) => sum + article.citations, 0), (59 * 60) / 2 + 30, "Counts merge per publication, taking the highest.");
+    assert(!("totalCitations" in merged), "A sum over DOI publications is not reported as the profile total.");
+    assert.deepStrictEqual(joinCitations([{ title: "Renamed", url: "https://doi.org/10.5555/TEST.2" }], merged.articles).publications[0].citations, 3);
+
+    const replayed = await resolveCitations({ ...options, provider: "openalex+crossref+semanticscholar", offline: true });
+    assert.deepStrictEqual([replayed.via, replayed.articles], ["replay", merged.articles]);
+
+    // Written to citations.json, DOI counts replace the articles and keep the Scholar total.
+    const stored = { totalCitations: 251, updatedAt: "2026-08-01", profileUrl: "https://example.org/", articles: [{ title: "Old", citations: 1 }] };
+    const articlesSource = "OpenAlex + Crossref + Semantic Scholar";
+    assert.deepStrictEqual(nextCitations(merged, { ...stored, articlesSource: "Google Scholar" }), { ...stored, articles: merged.articles, articlesSource });
+    assert.deepStrictEqual(nextCitations(merged, null), { articles: merged.articles, articlesSource });
+
+    // A provider without recorded responses is skipped while another answers; alone, it fails.
+    const endpoints = { ...options.endpoints, crossref: options.endpoints.crossref.replace("crossref", "unrecorded") };
+    const degraded = parseDoiCitations(await fetchDoiCitations(["openalex", "crossref"], publications, { ...options, endpoints }));
+    assert.deepStrictEqual([degraded.source, degraded.articles.reduce((sum, article) => sum + article.citations, 0)], ["openalex:60/60 DOIs (crossref failed)", (59 * 60) / 2]);
+    await assert.rejects(fetchDoiCitations(["crossref"], publications, { ...options, endpoints }),
+      /Every citation provider failed: crossref: 127\.0\.0\.1:\d+ returned HTTP 404/);
+    await assert.rejects(fetchDoiCitations(["openalex"], [{ title: "No DOI", url: "https://example.org/" }], options), /No publication in site\.json has a DOI/);
+  } finally {
+    replay.close();
+    fs.rmSync(recordDir, { recursive: true, force: true });
+    fs.rmSync(cacheDir, { recursive: true, force: true });
+  }
+}
+
+checkDirectFetching()
+  .then(checkDirectPagination)
+  .then(checkSerpApiPagination)
+  .then(checkResponseCache)
+  .then(checkCitationHistory)
+  .then(checkDoiProviders)
+  .then(() => console.log("Scholar citation parser checks passed."))
+  .catch((error) => {
+    console.error(error);
+    process.exitCode = 1;
+  });
@@ -1,18 +1,48 @@
 #!/usr/bin/env node
 "use strict";
 
+const crypto = require("crypto");
 const fs = require("fs");
 const path = require("path");
+const { appendToHistory, latestPoint, readHistory } = require("./citation-history");
+const { joinCitations } = require("./citation-match");
+const { DOI_PROVIDERS, doiProvider, parseProviderNames } = require("./citation-providers");
+const {
+  createScholarTokenizer,
+  normalizeCount,
+  parseDirectScholarArticles,
+  parseDirectScholarCitationCount,
+  summarizeScholarPages,
+  tokenizeScholarHtml,
+} = require("./scholar-profile");
 
 const ROOT = path.resolve(__dirname, "..");
 const OUTPUT_PATH = path.join(ROOT, "content", "citations.json");
+const SITE_DATA_PATH = path.join(ROOT, "content", "site.json");
+// Totals over time (one line per changed refresh, compacted as it ages); drawn as a sparkline.
+const HISTORY_PATH = process.env.SCHOLAR_HISTORY_PATH || path.join(ROOT, "content", "citations-history.ndjson");
+// Raw provider responses, reused while fresh so scheduled runs do not spend an API call each.
+const CACHE_DIR = process.env.SCHOLAR_CACHE_DIR || path.join(ROOT, ".cache", "scholar");
+const HOUR_MS = 60 * 60 * 1000;
+// Minimum refresh interval; it doubles for every fetch that returned the same result, up to the cap.
+const CACHE_TTL_HOURS = Number(process.env.SCHOLAR_CACHE_TTL_HOURS || 20);
+const CACHE_MAX_TTL_HOURS = Number(process.env.SCHOLAR_CACHE_MAX_TTL_HOURS || 168);
 const SCHOLAR_USER_ID = process.env.SCHOLAR_USER_ID || "H8fc2JgAAAAJ";
 const SERPAPI_KEY = process.env.SERPAPI_KEY || "";
 const PROVIDER = process.env.SCHOLAR_CITATION_PROVIDER || (SERPAPI_KEY ? "serpapi" : "direct");
 const ALLOW_STALE = process.env.ALLOW_STALE === "true";
 const ALLOW_CITATION_DECREASE = process.env.ALLOW_CITATION_DECREASE === "true";
 const PROFILE_URL = "https://scholar.google.com/citations?user=" + SCHOLAR_USER_ID;
-const PROFILE_PATH = "/citations?user=" + encodeURIComponent(SCHOLAR_USER_ID) + "&hl=en";
+// pagesize=100 lists up to 100 articles (with their counts) per page; cstart=N pages through the rest.
+const DIRECT_PAGE_SIZE = 100;
+const DIRECT_MAX_PAGES = 20;
+const DIRECT_PAGE_DELAY_MS = 1000;
+const PROFILE_PATH = "/citations?user=" + encodeURIComponent(SCHOLAR_USER_ID) + "&hl=en&pagesize=" + DIRECT_PAGE_SIZE;
+// SerpApi returns at most 100 articles per call; more pages cost one search each, so they are only
+// fetched while some site.json publication has no matching article yet.
+const SERPAPI_URL = "https://serpapi.com/search.json";
+const SERPAPI_PAGE_SIZE = 100;
+const SERPAPI_MAX_PAGES = 10;
 const DIRECT_PROFILE_URLS = [
   "https://scholar.google.com" + PROFILE_PATH,
   "https://scholar.google.co.uk" + PROFILE_PATH,
@@ -36,25 +66,29 @@ const REQUEST_PROFILES = [
     "Accept-Language": "en-GB,en;q=0.9",
   },
 ];
+// Direct fetching races every host/profile pair. Launches are staggered so a quick success
+// cancels the rest before they are sent, and a failure launches the next pair at once.
+const DIRECT_REQUEST_TIMEOUT_MS = 15000;
+const DIRECT_DEADLINE_MS = 60000;
+const DIRECT_STAGGER_MS = 400;
+const DIRECT_ROUNDS = 3;
+const DIRECT_ROUND_DELAY_MS = 2000;
 
-function delay(milliseconds) {
-  return new Promise((resolve) => setTimeout(resolve, milliseconds));
+function delay(milliseconds, signal) {
+  // Resolves early, without throwing, when the signal aborts.
+  return new Promise((resolve) => {
+    const done = () => {
+      clearTimeout(timer);
+      signal?.removeEventListener("abort", done);
+      resolve();
+    };
+    const timer = setTimeout(done, milliseconds);
+    signal?.addEventListener("abort", done, { once: true });
+  });
 }
 
 function readPreviousCitations() {
-  if (!fs.existsSync(OUTPUT_PATH)) {
-    return null;
-  }
-  const citations = JSON.parse(fs.readFileSync(OUTPUT_PATH, "utf8"));
-  return Number.isInteger(citations.totalCitations) ? citations.totalCitations : null;
-}
-
-function normalizeCount(value, label) {
-  const total = Number(String(value).replaceAll(",", ""));
-  if (!Number.isInteger(total) || total < 0) {
-    throw new Error("Provider returned an invalid " + label + ".");
-  }
-  return total;
+  return fs.existsSync(OUTPUT_PATH) ? JSON.parse(fs.readFileSync(OUTPUT_PATH, "utf8")) : null;
 }
 
 async function fetchJson(url, context) {
@@ -77,19 +111,48 @@ async function fetchJson(url, context) {
   return payload;
 }
 
-async function fetchSerpApiCitationCount() {
-  if (!SERPAPI_KEY) {
+async function fetchSerpApiCitationCount(options = {}) {
+  const settings = {
+    url: SERPAPI_URL,
+    apiKey: SERPAPI_KEY,
+    pageSize: SERPAPI_PAGE_SIZE,
+    maxPages: SERPAPI_MAX_PAGES,
+    ...options,
+  };
+  if (!settings.apiKey) {
     throw new Error("SERPAPI_KEY is required when SCHOLAR_CITATION_PROVIDER=serpapi. Add it as a GitHub Actions repository secret.");
   }
 
-  const url = new URL("https://serpapi.com/search.json");
-  url.searchParams.set("engine", "google_scholar_author");
-  url.searchParams.set("author_id", SCHOLAR_USER_ID);
-  url.searchParams.set("hl", "en");
-  url.searchParams.set("api_key", SERPAPI_KEY);
+  // The first page carries the cited_by table; later pages only add articles. The cached payload
+  // is the first page with every page's articles merged in. Articles come most-cited first, so the
+  // first page usually matches every publication on the site and is the only search spent.
+  const publications = settings.publications || readSitePublications();
+  let payload = null;
+  for (let page = 0; page < settings.maxPages; page += 1) {
+    const url = new URL(settings.url);
+    url.searchParams.set("engine", "google_scholar_author");
+    url.searchParams.set("author_id", SCHOLAR_USER_ID);
+    url.searchParams.set("hl", "en");
+    url.searchParams.set("num", String(settings.pageSize));
+    url.searchParams.set("start", String(page * settings.pageSize));
+    url.searchParams.set("api_key", settings.apiKey);
+
+    const response = await fetchJson(url, "SerpApi Google Scholar Author API");
+    const articles = Array.isArray(response.articles) ? response.articles : [];
+    payload = payload ? { ...payload, articles: payload.articles.concat(articles) } : { ...response, articles };
+    if (articles.length < settings.pageSize || joinCitations(publications, parseSerpApiArticles(payload)).matched === publications.length) {
+      break;
+    }
+  }
+  return { ...parseSerpApiCitationCount(payload), payload };
+}
 
-  const payload = await fetchJson(url, "SerpApi Google Scholar Author API");
-  return parseSerpApiCitationCount(payload);
+function parseSerpApiArticles(payload) {
+  return payload.articles.map((article) => ({
+    title: article.title,
+    citations: article.cited_by && article.cited_by.value != null ? normalizeCount(article.cited_by.value, "SerpApi article citation count") : 0,
+    year: article.year ? Number(article.year) : null,
+  }));
 }
 
 function parseSerpApiCitationCount(payload) {
@@ -106,102 +169,374 @@ function parseSerpApiCitationCount(payload) {
     return {
       totalCitations: normalizeCount(citationsRow.citations.all, "SerpApi total citation count"),
       source: "serpapi:cited_by.table.citations.all",
+      ...(Array.isArray(payload.articles) ? { articles: parseSerpApiArticles(payload) } : {}),
     };
   }
 
   throw new Error("SerpApi response did not include cited_by.table[].citations.all.");
 }
 
-async function fetchDirectCitationCount() {
-  const errors = [];
+async function streamScholarPage(pageUrl, headers, signal, timeoutMs, needTotals) {
+  // Feeds the body to the tokenizer as it arrives and stops reading once the article table (and,
+  // when needed, the totals table) has been seen; the rest of the page is never downloaded.
+  const controller = new AbortController();
+  const cancel = () => controller.abort(signal.reason);
+  signal.addEventListener("abort", cancel, { once: true });
+  const timer = setTimeout(() => controller.abort(new Error("timed out after " + timeoutMs + " ms")), timeoutMs);
+  try {
+    const response = await fetch(pageUrl, { headers, signal: controller.signal });
+    if (!response.ok) {
+      throw new Error("returned HTTP " + response.status);
+    }
+    const tokenizer = createScholarTokenizer();
+    const decoder = new TextDecoder();
+    for await (const chunk of response.body) {
+      tokenizer.write(decoder.decode(chunk, { stream: true }));
+      if (tokenizer.isComplete(needTotals)) {
+        // Leaving the loop cancels the response body.
+        tokenizer.page.endedEarly = true;
+        break;
+      }
+    }
+    if (!tokenizer.page.endedEarly) {
+      tokenizer.write(decoder.decode());
+    }
+    return tokenizer.end();
+  } catch (error) {
+    throw controller.signal.aborted && controller.signal.reason instanceof Error ? controller.signal.reason : error;
+  } finally {
+    clearTimeout(timer);
+    signal.removeEventListener("abort", cancel);
+  }
+}
 
-  for (let attempt = 1; attempt <= 3; attempt += 1) {
-    for (const profileUrl of DIRECT_PROFILE_URLS) {
-      for (const headers of REQUEST_PROFILES) {
-        try {
-          const response = await fetch(profileUrl, { headers });
+function scholarPageUrl(profileUrl, cstart, pageSize) {
+  const url = new URL(profileUrl);
+  url.searchParams.set("pagesize", String(pageSize));
+  if (cstart > 0) {
+    url.searchParams.set("cstart", String(cstart));
+  }
+  return url.toString();
+}
 
-          if (!response.ok) {
-            throw new Error(new URL(profileUrl).host + " returned HTTP " + response.status + ".");
-          }
+async function fetchScholarProfile(profileUrl, headers, signal, options) {
+  const page = await streamScholarPage(scholarPageUrl(profileUrl, 0, options.pageSize), headers, signal, options.requestTimeoutMs, true);
+  // Throws for anti-bot and consent pages, so the race moves on to the next candidate.
+  summarizeScholarPages([page]);
+  return { profileUrl, headers, pages: [page] };
+}
 
-          const html = await response.text();
-          return {
-            totalCitations: parseDirectScholarCitationCount(html),
-            source: "direct:" + new URL(profileUrl).host,
-          };
-        } catch (error) {
-          errors.push(new URL(profileUrl).host + ": " + error.message);
-        }
-      }
+async function readRemainingPages(profile, signal, settings) {
+  // Follows cstart pagination with the host and headers that won the race until a short page,
+  // a disabled "Show more" button or the page limit ends the article list.
+  const { pages } = profile;
+  const host = new URL(profile.profileUrl).host;
+  let page = pages[0];
+  while (page.rows >= settings.pageSize && page.moreDisabled !== true && pages.length < settings.maxPages) {
+    const cstart = pages.length * settings.pageSize;
+    try {
+      await delay(settings.pageDelayMs, signal);
+      signal.throwIfAborted();
+      page = await streamScholarPage(scholarPageUrl(profile.profileUrl, cstart, settings.pageSize), profile.headers, signal, settings.requestTimeoutMs, false);
+    } catch (error) {
+      throw new Error("Direct Scholar refresh failed: " + host + " page at cstart=" + cstart + ": " + error.message);
     }
+    pages.push(page);
+  }
+  return pages;
+}
+
+function directResult(pages, source) {
+  // The cached payload keeps the parsed pages rather than their HTML.
+  return {
+    ...summarizeScholarPages(pages),
+    source,
+    payload: { pages: pages.map(({ head, endedEarly, ...page }) => page) },
+  };
+}
+
+function raceDirectRound(candidates, signal, options, recordFailure) {
+  // Resolves with the first profile page that parsed, or null once every candidate has failed.
+  // The losers are cancelled as soon as there is a winner, before its later pages are read.
+  return new Promise((resolve) => {
+    const race = new AbortController();
+    let next = 0;
+    let settled = 0;
+    let done = false;
+    let timer = null;
+    const finish = (result) => {
+      if (!done) {
+        done = true;
+        clearTimeout(timer);
+        signal.removeEventListener("abort", onAbort);
+        race.abort();
+        resolve(result);
+      }
+    };
+    const onAbort = () => finish(null);
+    const launch = () => {
+      clearTimeout(timer);
+      if (done || next >= candidates.length) {
+        return;
+      }
+      const { profileUrl, headers } = candidates[next++];
+      timer = setTimeout(launch, options.staggerMs);
+      fetchScholarProfile(profileUrl, headers, race.signal, options)
+        .then(finish, (error) => {
+          if (!done && !signal.aborted) {
+            recordFailure(new URL(profileUrl).host, error.message);
+            launch();
+          }
+        })
+        .finally(() => {
+          settled += 1;
+          if (settled === candidates.length) {
+            finish(null);
+          }
+        });
+    };
+    signal.addEventListener("abort", onAbort, { once: true });
+    launch();
+  });
+}
+
+async function fetchDirectCitationCount(options = {}) {
+  const settings = {
+    urls: DIRECT_PROFILE_URLS,
+    profiles: REQUEST_PROFILES,
+    requestTimeoutMs: DIRECT_REQUEST_TIMEOUT_MS,
+    deadlineMs: DIRECT_DEADLINE_MS,
+    staggerMs: DIRECT_STAGGER_MS,
+    rounds: DIRECT_ROUNDS,
+    roundDelayMs: DIRECT_ROUND_DELAY_MS,
+    pageSize: DIRECT_PAGE_SIZE,
+    maxPages: DIRECT_MAX_PAGES,
+    pageDelayMs: DIRECT_PAGE_DELAY_MS,
+    ...options,
+  };
+  // Interleave hosts, so the first launches try every host with the most browser-like profile.
+  const candidates = settings.profiles.flatMap((headers) => settings.urls.map((profileUrl) => ({ profileUrl, headers })));
+  const failures = new Map();
+  const recordFailure = (host, message) => {
+    failures.set(host, (failures.get(host) || new Set()).add(message));
+  };
+  const run = new AbortController();
+  let deadlineReached = false;
+  const deadline = setTimeout(() => {
+    deadlineReached = true;
+    run.abort(new Error("overall deadline of " + settings.deadlineMs + " ms reached"));
+  }, settings.deadlineMs);
 
-    if (attempt < 3) {
-      await delay(attempt * 2000);
+  try {
+    for (let round = 1; round <= settings.rounds && !run.signal.aborted; round += 1) {
+      const profile = await raceDirectRound(candidates, run.signal, settings, recordFailure);
+      if (profile) {
+        const pages = await readRemainingPages(profile, run.signal, settings);
+        return directResult(pages, "direct:" + new URL(profile.profileUrl).host);
+      }
+      if (round < settings.rounds) {
+        await delay(round * settings.roundDelayMs, run.signal);
+      }
     }
+  } finally {
+    clearTimeout(deadline);
+    // Cancels whatever is still in flight after the first success.
+    run.abort();
   }
 
-  throw new Error("Direct Scholar refresh failed after retries: " + errors.slice(-6).join(" | "));
+  const perHost = [...failures].map(([host, messages]) => host + ": " + [...messages].join("; "));
+  throw new Error(
+    "Direct Scholar refresh failed" + (deadlineReached ? " (deadline of " + settings.deadlineMs + " ms reached)" : "") + ": " +
+    (perHost.length ? perHost.join(" | ") : "no response from any host.")
+  );
 }
 
-function parseDirectScholarCitationCount(html) {
-  const totalMatch = html.match(/<td[^>]*class="gsc_rsb_std"[^>]*>([0-9,]+)<\/td>/i);
-  if (totalMatch) {
-    return normalizeCount(totalMatch[1], "Scholar total citation count");
-  }
+function readSitePublications() {
+  return JSON.parse(fs.readFileSync(SITE_DATA_PATH, "utf8")).publications || [];
+}
 
-  const articleCitationCounts = [...html.matchAll(/<a[^>]*class="gsc_a_ac[^"']*"[^>]*>([0-9,]+)<\/a>/gi)]
-    .map((match) => normalizeCount(match[1], "article citation count"));
-  if (articleCitationCounts.length > 0) {
-    return articleCitationCounts.reduce((sum, count) => sum + count, 0);
-  }
+// Each provider fetches a raw payload (with its parsed result) and can re-parse a cached one.
+// Besides these, any "+"- or comma-separated list of openalex, crossref and semanticscholar
+// resolves per-publication counts by DOI (see citation-providers.js).
+const PROVIDERS = {
+  serpapi: {
+    fetch: fetchSerpApiCitationCount,
+    parse: parseSerpApiCitationCount,
+  },
+  direct: {
+    fetch: fetchDirectCitationCount,
+    // Fixtures and caches written before pagination hold the raw HTML of one page.
+    parse: (payload) => ({
+      ...summarizeScholarPages(typeof payload === "string" ? [tokenizeScholarHtml(payload)] : payload.pages),
+      source: "direct",
+    }),
+  },
+};
+
+function cachePath(cacheDir, provider) {
+  return path.join(cacheDir, provider + "-" + SCHOLAR_USER_ID + ".json");
+}
+
+function readCacheEntry(cacheDir, provider) {
+  const file = cachePath(cacheDir, provider);
+  return fs.existsSync(file) ? JSON.parse(fs.readFileSync(file, "utf8")) : null;
+}
+
+function resultHash(result) {
+  // Hashes what the site uses, not the raw payload, whose metadata changes on every call.
+  const { source, payload, ...data } = result;
+  return crypto.createHash("sha256").update(JSON.stringify(data)).digest("hex").slice(0, 16);
+}
+
+function cacheTtlMs(entry, options = {}) {
+  const ttlHours = options.ttlHours ?? CACHE_TTL_HOURS;
+  const maxTtlHours = options.maxTtlHours ?? CACHE_MAX_TTL_HOURS;
+  return Math.min(ttlHours * 2 ** (entry.unchangedRuns || 0), maxTtlHours) * HOUR_MS;
+}
+
+function readFixture(file, provider) {
+  const text = fs.readFileSync(file, "utf8");
+  return provider === "direct" ? text : JSON.parse(text);
+}
 
-  throw new Error(describeUnparseableScholarHtml(html));
+function providerHandlers(provider, providers) {
+  if (Object.hasOwn(providers, provider)) {
+    return providers[provider];
+  }
+  const names = parseProviderNames(provider);
+  return names ? doiProvider(names, readSitePublications) : null;
 }
 
-function describeUnparseableScholarHtml(html) {
-  const title = (html.match(/<title>(.*?)<\/title>/i) || [])[1];
-  if (/recaptcha|captcha|unusual traffic|sorry\/index/i.test(html)) {
-    return "Scholar returned an anti-bot or unusual-traffic page" + (title ? " titled " + JSON.stringify(title) : "") + ".";
+async function resolveCitations(options = {}) {
+  // Returns the parsed result, the provider it came from and how it was obtained: a fresh fetch, a
+  // cache hit within the refresh interval, or (with --offline) a replay of the cache or a fixture
+  // without any network.
+  const provider = options.provider || PROVIDER;
+  const handlers = providerHandlers(provider, options.providers || PROVIDERS);
+  if (!handlers) {
+    throw new Error(
+      "Unsupported SCHOLAR_CITATION_PROVIDER: " + provider + ". Use serpapi, direct, or a list of openalex, crossref and semanticscholar."
+    );
+  }
+  const cacheDir = options.cacheDir || CACHE_DIR;
+  const now = options.now || new Date();
+  const entry = readCacheEntry(cacheDir, provider);
+
+  if (options.offline) {
+    if (options.fixture) {
+      return { ...handlers.parse(readFixture(options.fixture, provider)), provider, source: "fixture:" + path.basename(options.fixture), fetchedAt: now.toISOString(), via: "replay" };
+    }
+    if (!entry) {
+      throw new Error("--offline needs a cached " + provider + " response in " + cacheDir + " or a --fixture file.");
+    }
+    return { ...handlers.parse(entry.payload), provider, source: "cache:" + provider, fetchedAt: entry.fetchedAt, via: "replay" };
   }
-  if (/consent\.google|Before you continue|cookies/i.test(html)) {
-    return "Scholar returned a consent page" + (title ? " titled " + JSON.stringify(title) : "") + ".";
+
+  if (entry && !options.force && now - Date.parse(entry.fetchedAt) < cacheTtlMs(entry, options)) {
+    return { ...handlers.parse(entry.payload), provider, source: "cache:" + provider, fetchedAt: entry.fetchedAt, via: "cache", nextRefresh: new Date(Date.parse(entry.fetchedAt) + cacheTtlMs(entry, options)) };
   }
-  return "Could not find citation counts in the Scholar profile" + (title ? " titled " + JSON.stringify(title) : "") + ".";
+
+  const fetched = await handlers.fetch(options);
+  const hash = resultHash(fetched);
+  const next = {
+    provider,
+    fetchedAt: now.toISOString(),
+    hash,
+    unchangedRuns: entry && entry.hash === hash ? (entry.unchangedRuns || 0) + 1 : 0,
+    payload: fetched.payload,
+  };
+  fs.mkdirSync(cacheDir, { recursive: true });
+  fs.writeFileSync(cachePath(cacheDir, provider), JSON.stringify(next) + "\n", "utf8");
+  const { payload, ...result } = fetched;
+  return { ...result, provider, fetchedAt: next.fetchedAt, via: "fetch", nextRefresh: new Date(now.getTime() + cacheTtlMs(next, options)) };
 }
 
-async function fetchCitationCount() {
-  if (PROVIDER === "serpapi") {
-    return fetchSerpApiCitationCount();
+function parseArgs(argv) {
+  const options = { offline: false, force: false, fixture: null };
+  for (let index = 0; index < argv.length; index += 1) {
+    const [name, inline] = argv[index].split(/=(.*)/s);
+    if (name === "--offline" || name === "--force") {
+      options[name.slice(2)] = true;
+    } else if (name === "--fixture") {
+      const value = inline ?? argv[++index];
+      if (!value) {
+        throw new Error("--fixture needs a file path.");
+      }
+      options.fixture = path.resolve(value);
+    } else {
+      throw new Error("Unknown argument " + argv[index] + ". Expected --offline, --force or --fixture <file>.");
+    }
   }
-  if (PROVIDER === "direct") {
-    return fetchDirectCitationCount();
+  if (options.fixture && !options.offline) {
+    throw new Error("--fixture only applies with --offline.");
   }
-  throw new Error("Unsupported SCHOLAR_CITATION_PROVIDER: " + PROVIDER + ". Use serpapi or direct.");
+  return options;
 }
 
-function validateAgainstPrevious(totalCitations) {
-  const previous = readPreviousCitations();
+function validateAgainstPrevious(totalCitations, history, stored = readPreviousCitations()) {
+  // The latest recorded point is the baseline; citations.json only stands in before the history
+  // has one.
+  const latest = history ? latestPoint(history) : null;
+  const previous = latest ? latest.total : stored && Number.isInteger(stored.totalCitations) ? stored.totalCitations : null;
   if (previous == null || ALLOW_CITATION_DECREASE || totalCitations >= previous) {
     return;
   }
-  throw new Error("Citation count decreased from " + previous + " to " + totalCitations + ". Refusing to overwrite without ALLOW_CITATION_DECREASE=true.");
+  throw new Error(
+    "Citation count decreased from " + previous + (latest ? " (recorded " + latest.date + ")" : "") + " to " + totalCitations +
+    ". Refusing to overwrite without ALLOW_CITATION_DECREASE=true."
+  );
+}
+
+function articlesSource(provider) {
+  // Where the per-article counts came from, as build-site.js names it beside each count.
+  const names = parseProviderNames(provider);
+  return names ? names.map((name) => DOI_PROVIDERS[name].label).join(" + ") : "Google Scholar";
+}
+
+function nextCitations(result, stored) {
+  // DOI providers only count the publications that have a DOI, which is not comparable to the
+  // profile total: they refresh the per-article counts and keep the last Scholar total as it was.
+  if (result.totalCitations === undefined) {
+    const { articles, ...summary } = stored || {};
+    return { ...summary, articles: result.articles, articlesSource: articlesSource(result.provider) };
+  }
+  return {
+    totalCitations: result.totalCitations,
+    updatedAt: result.fetchedAt.slice(0, 10),
+    profileUrl: PROFILE_URL,
+    // Per-article counts; build-site.js joins them to site.json publications by DOI or title.
+    ...(result.articles ? { articles: result.articles, articlesSource: articlesSource(result.provider) } : {}),
+  };
 }
 
 async function main() {
+  const args = parseArgs(process.argv.slice(2));
   try {
-    const result = await fetchCitationCount();
-    validateAgainstPrevious(result.totalCitations);
-    const payload = {
-      totalCitations: result.totalCitations,
-      updatedAt: new Date().toISOString().slice(0, 10),
-      profileUrl: PROFILE_URL,
-    };
+    const result = await resolveCitations(args);
+    const history = readHistory(HISTORY_PATH);
+    const stored = readPreviousCitations();
+    const hasTotal = result.totalCitations !== undefined;
+    if (hasTotal) {
+      validateAgainstPrevious(result.totalCitations, history, stored);
+    }
+    const payload = nextCitations(result, stored);
 
     fs.writeFileSync(OUTPUT_PATH, JSON.stringify(payload, null, 2) + "\n", "utf8");
-    console.log("Scholar citation provider: " + PROVIDER);
+    const recorded = hasTotal ? appendToHistory(history, payload.updatedAt, result.totalCitations) : null;
+    console.log("Scholar citation provider: " + result.provider);
     console.log("Scholar citation source: " + result.source);
-    console.log("Google Scholar total citations: " + result.totalCitations);
+    if (result.via === "cache") {
+      console.log("Skipped the provider call; cached response from " + result.fetchedAt + " is fresh until " + result.nextRefresh.toISOString() + ".");
+    } else if (result.nextRefresh) {
+      console.log("Next provider call after " + result.nextRefresh.toISOString() + ".");
+    }
+    if (!hasTotal) {
+      console.log("Per-article counts for " + result.articles.length + " publications; the Google Scholar total and history are unchanged.");
+      return;
+    }
+    console.log("Google Scholar total citations: " + result.totalCitations + (result.articles ? " across " + result.articles.length + " articles" : ""));
+    console.log("Citation history: " + (recorded === "unchanged" ? "already has " + payload.updatedAt : recorded + " " + payload.updatedAt) +
+      " (" + history.points.size + " points).");
   } catch (error) {
     if (ALLOW_STALE && fs.existsSync(OUTPUT_PATH)) {
       console.warn("::warning title=Scholar citation refresh kept stale data::" + error.message);
@@ -220,6 +555,14 @@ if (require.main === module) {
 }
 
 module.exports = {
+  cacheTtlMs,
+  fetchDirectCitationCount,
+  fetchSerpApiCitationCount,
+  nextCitations,
+  parseArgs,
+  resolveCitations,
+  validateAgainstPrevious,
+  parseDirectScholarArticles,
   parseDirectScholarCitationCount,
   parseSerpApiCitationCount,
   normalizeCount,